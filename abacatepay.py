@@ -1,19 +1,180 @@
 import requests
 import json
 import os
+import random
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Timeouts (segundos): conexão TCP/TLS e espera pela resposta
+ABACATE_TIMEOUT_CONEXAO = float(os.getenv('ABACATE_TIMEOUT_CONEXAO', '3.05'))
+ABACATE_TIMEOUT_LEITURA = float(os.getenv('ABACATE_TIMEOUT_LEITURA', '10'))
+
+# Novas tentativas só para falhas em que a cobrança com certeza não foi
+# criada (conexão recusada/sem resposta, 429, 503)
+ABACATE_TENTATIVAS = int(os.getenv('ABACATE_TENTATIVAS', '3'))
+ABACATE_BACKOFF_BASE = float(os.getenv('ABACATE_BACKOFF_BASE', '0.3'))
+ABACATE_BACKOFF_MAXIMO = float(os.getenv('ABACATE_BACKOFF_MAXIMO', '5'))
+STATUS_RETENTAVEIS = {429, 503}
+
+# Disjuntor: após N falhas seguidas, falha na hora por ESPERA segundos
+ABACATE_DISJUNTOR_FALHAS = int(os.getenv('ABACATE_DISJUNTOR_FALHAS', '5'))
+ABACATE_DISJUNTOR_ESPERA = float(os.getenv('ABACATE_DISJUNTOR_ESPERA', '30'))
+
+# Conexões keep-alive mantidas com a API (por processo)
+ABACATE_POOL_CONEXOES = int(os.getenv('ABACATE_POOL_CONEXOES', '10'))
+
+
+def _falhou_antes_do_envio(erro):
+    """A requisição não chegou ao AbacatePay (conexão recusada ou sem resposta ao conectar)"""
+    if isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    motivo = getattr(erro.args[0], 'reason', None) if erro.args else None
+    return isinstance(motivo, NewConnectionError)
+
+
+class CircuitoAberto(Exception):
+    """O AbacatePay está degradado e o disjuntor recusou a chamada"""
+
+
+class Disjuntor:
+    """Circuit breaker: fechado -> aberto (falha rápido) -> meio-aberto (uma tentativa)"""
+    
+    def __init__(self, limite_falhas=ABACATE_DISJUNTOR_FALHAS, espera=ABACATE_DISJUNTOR_ESPERA):
+        self.limite_falhas = limite_falhas
+        self.espera = espera
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self.aberto_em = 0.0
+        self.aberturas = 0
+        self._lock = threading.Lock()
+    
+    def permitir(self):
+        """True se a chamada pode seguir; no meio-aberto só passa uma por vez"""
+        with self._lock:
+            if self.estado == 'fechado':
+                return True
+            if self.estado == 'aberto' and time.monotonic() - self.aberto_em >= self.espera:
+                self.estado = 'meio_aberto'
+                return True
+            return False
+    
+    def sucesso(self):
+        with self._lock:
+            if self.estado != 'fechado':
+                print("🟢 Disjuntor AbacatePay fechado: API respondendo de novo")
+            self.estado = 'fechado'
+            self.falhas_seguidas = 0
+    
+    def falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == 'meio_aberto' or self.falhas_seguidas >= self.limite_falhas:
+                if self.estado != 'aberto':
+                    self.aberturas += 1
+                    print(f"🔴 Disjuntor AbacatePay aberto por {self.espera:g}s "
+                          f"({self.falhas_seguidas} falhas seguidas)")
+                self.estado = 'aberto'
+                self.aberto_em = time.monotonic()
+
 
 class AbacatePayClient:
     """Cliente para integração com a API do AbacatePay"""
     
-    def __init__(self, api_key, webhook_id=None):
+    def __init__(self, api_key, webhook_id=None, base_url=None,
+                 timeout_conexao=ABACATE_TIMEOUT_CONEXAO, timeout_leitura=ABACATE_TIMEOUT_LEITURA,
+                 tentativas=ABACATE_TENTATIVAS, disjuntor=None):
         self.api_key = api_key
         self.webhook_id = webhook_id or os.getenv('ABACATE_WEBHOOK_ID')
-        self.base_url = "https://api.abacatepay.com/v1"
+        self.base_url = base_url or os.getenv('ABACATE_API_URL', "https://api.abacatepay.com/v1")
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.tentativas = max(1, tentativas)
+        self.disjuntor = disjuntor or Disjuntor()
+        
+        # Sessão compartilhada: conexões TLS reaproveitadas entre cobranças
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=ABACATE_POOL_CONEXOES)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+        
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=1000)  # ms das últimas respostas
+        self._contadores = {
+            'requisicoes': 0,
+            'sucessos': 0,
+            'erros_http': 0,
+            'timeouts': 0,
+            'erros_conexao': 0,
+            'retentativas': 0,
+            'recusadas_disjuntor': 0
+        }
+    
+    def _contar(self, contador):
+        with self._lock:
+            self._contadores[contador] += 1
+    
+    def _espera_retentativa(self, tentativa, resposta=None):
+        """Backoff exponencial com jitter total; respeita Retry-After do 429"""
+        if resposta is not None:
+            try:
+                return min(float(resposta.headers.get('Retry-After', '')), ABACATE_BACKOFF_MAXIMO)
+            except ValueError:
+                pass
+        return random.uniform(0, min(ABACATE_BACKOFF_BASE * 2 ** tentativa, ABACATE_BACKOFF_MAXIMO))
+    
+    def _post(self, caminho, payload):
+        """
+        POST com timeouts, novas tentativas seguras e disjuntor.
+        Levanta CircuitoAberto ou a exceção do requests da última tentativa.
+        """
+        url = f"{self.base_url}{caminho}"
+        for tentativa in range(self.tentativas):
+            if not self.disjuntor.permitir():
+                self._contar('recusadas_disjuntor')
+                raise CircuitoAberto("AbacatePay indisponível (disjuntor aberto)")
+            
+            self._contar('requisicoes')
+            inicio = time.perf_counter()
+            try:
+                resposta = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                self._contar('timeouts' if isinstance(e, requests.exceptions.Timeout) else 'erros_conexao')
+                self.disjuntor.falha()
+                # Timeout de leitura ou conexão caída no meio: a cobrança pode
+                # ter sido criada, então só repete o que nem chegou à API
+                if _falhou_antes_do_envio(e) and tentativa + 1 < self.tentativas:
+                    self._contar('retentativas')
+                    time.sleep(self._espera_retentativa(tentativa))
+                    continue
+                raise
+            
+            with self._lock:
+                self._latencias.append((time.perf_counter() - inicio) * 1000)
+            
+            if resposta.status_code >= 500 or resposta.status_code == 429:
+                self._contar('erros_http')
+                self.disjuntor.falha()
+                if resposta.status_code in STATUS_RETENTAVEIS and tentativa + 1 < self.tentativas:
+                    self._contar('retentativas')
+                    time.sleep(self._espera_retentativa(tentativa, resposta))
+                    continue
+                return resposta
+            
+            # 2xx e 4xx: a API respondeu normalmente
+            self.disjuntor.sucesso()
+            if resposta.status_code >= 400:
+                self._contar('erros_http')
+            else:
+                self._contar('sucessos')
+            return resposta
     
     def criar_cobranca(self, email, nome, cpf, pacote, valor, creditos, usuario_id):
         """
@@ -36,8 +197,6 @@ class AbacatePayClient:
                 }
             
             # Caso contrário, cria nova cobrança
-            url = f"{self.base_url}/billing/create"
-            
             payload = {
                 "frequency": "ONE_TIME",
                 "methods": ["PIX", "CARD"],
@@ -66,7 +225,7 @@ class AbacatePayClient:
             
             print(f"📤 Enviando para AbacatePay: {json.dumps(payload, indent=2)}")
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._post("/billing/create", payload)
             
             if response.status_code == 200:
                 dados = response.json()
@@ -76,10 +235,26 @@ class AbacatePayClient:
                 print(f"❌ Erro AbacatePay: {response.status_code} - {response.text}")
                 return False, None, None
                 
+        except CircuitoAberto as e:
+            print(f"⛔ {e}")
+            return False, None, None
         except Exception as e:
             print(f"❌ Exceção AbacatePay: {str(e)}")
             return False, None, None
     
+    def estatisticas(self):
+        """Contadores, latência das respostas (ms) e estado do disjuntor"""
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            latencias = sorted(self._latencias)
+        if latencias:
+            estatisticas['latencia_p50_ms'] = round(latencias[len(latencias) // 2], 1)
+            estatisticas['latencia_p95_ms'] = round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))], 1)
+            estatisticas['latencia_max_ms'] = round(latencias[-1], 1)
+        estatisticas['disjuntor'] = self.disjuntor.estado
+        estatisticas['disjuntor_aberturas'] = self.disjuntor.aberturas
+        return estatisticas
+    
     def _nome_pacote(self, pacote):
         """Retorna nome formatado do pacote"""
         nomes = {
@@ -91,14 +266,17 @@ class AbacatePayClient:
 
 # Singleton para usar em toda a aplicação
 _abacate_client = None
+_abacate_client_lock = threading.Lock()
 
 def get_abacate_client():
     """Retorna instância do cliente AbacatePay"""
     global _abacate_client
     if _abacate_client is None:
-        api_key = os.getenv('ABACATE_API_KEY')
-        webhook_id = os.getenv('ABACATE_WEBHOOK_ID')
-        if not api_key:
-            raise ValueError("ABACATE_API_KEY não configurada")
-        _abacate_client = AbacatePayClient(api_key, webhook_id)
+        with _abacate_client_lock:
+            if _abacate_client is None:
+                api_key = os.getenv('ABACATE_API_KEY')
+                webhook_id = os.getenv('ABACATE_WEBHOOK_ID')
+                if not api_key:
+                    raise ValueError("ABACATE_API_KEY não configurada")
+                _abacate_client = AbacatePayClient(api_key, webhook_id)
     return _abacate_client
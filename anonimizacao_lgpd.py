@@ -0,0 +1,305 @@
+"""
+Anonimização LGPD em lotes, retomável.
+
+Pedidos de exclusão em massa e a varredura de retenção viram um job
+(`anonimizacao_jobs`) com a lista de usuários (`anonimizacao_fila`). O job
+processa a fila em lotes, cada um numa transação:
+
+    - `anonimizar_usuarios()` (migração 0009) faz um UPDATE por tabela
+      (users, login_history, audit_logs) para o lote inteiro, em vez de
+      três UPDATEs por usuário;
+    - os usuários do lote são marcados como processados na mesma transação
+      (checkpoint): se o job for interrompido, a próxima execução continua
+      do primeiro usuário não marcado, sem repetir nem pular ninguém;
+    - lotes são pegos com FOR UPDATE SKIP LOCKED: dois processos no mesmo
+      job dividem a fila em vez de disputá-la.
+
+Para não pesar na produção:
+
+    - o tamanho do lote se ajusta para que cada transação dure perto de
+      ANONIMIZACAO_TEMPO_ALVO segundos (locks de linha curtos);
+    - depois de cada lote o job pausa ANONIMIZACAO_PAUSA vezes a duração do
+      lote (1.0: no máximo metade do tempo trabalhando), e respeita
+      --max-linhas-por-segundo se informado;
+    - lock_timeout curto: se as linhas estiverem ocupadas, o lote é desfeito
+      e tentado de novo depois.
+
+Cada lote e o job inteiro informam as linhas processadas por segundo.
+
+Uso (como dono das tabelas):
+    python anonimizacao_lgpd.py --usuarios ids.txt --motivo "pedido 123"   # cria e executa
+    python anonimizacao_lgpd.py --retencao-dias 30                        # excluídos há 30+ dias
+    python anonimizacao_lgpd.py                                           # retoma jobs interrompidos
+    python anonimizacao_lgpd.py --job 7                                   # retoma um job (mesmo se falhou)
+    python anonimizacao_lgpd.py --status
+"""
+
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from database import conexao
+
+ANONIMIZACAO_LOTE = int(os.getenv('ANONIMIZACAO_LOTE', '500'))
+ANONIMIZACAO_LOTE_MAXIMO = int(os.getenv('ANONIMIZACAO_LOTE_MAXIMO', '5000'))
+ANONIMIZACAO_TEMPO_ALVO = float(os.getenv('ANONIMIZACAO_TEMPO_ALVO', '0.5'))
+ANONIMIZACAO_PAUSA = float(os.getenv('ANONIMIZACAO_PAUSA', '1.0'))
+ANONIMIZACAO_LOCK_TIMEOUT = os.getenv('ANONIMIZACAO_LOCK_TIMEOUT', '2s')
+# Tentativas seguidas de um lote que não conseguiu os locks
+TENTATIVAS_LOTE = 5
+# Usuários inseridos na fila por comando ao criar um job
+INSERCAO_FILA = 10000
+
+
+def criar_job(motivo: str, usuarios: Optional[List[str]] = None,
+              retencao_dias: Optional[int] = None) -> int:
+    """
+    Cria um job com os `usuarios` informados ou, com `retencao_dias`, com os
+    usuários excluídos (deleted_at) há mais tempo que isso e ainda não
+    anonimizados. Devolve o job_id. Tudo numa transação: interrompida no
+    meio, não sobra um job pendente com a fila pela metade.
+    """
+    with conexao() as conn:
+        try:
+            conn.run("BEGIN")
+            job_id = conn.run("INSERT INTO anonimizacao_jobs (motivo) VALUES (:motivo) RETURNING job_id",
+                              motivo=motivo)[0][0]
+            if retencao_dias is not None:
+                conn.run("""
+                    INSERT INTO anonimizacao_fila (job_id, user_id)
+                    SELECT :job_id, user_id FROM users
+                    WHERE deleted_at < NOW() - make_interval(days => :dias)
+                      AND email NOT LIKE 'deleted\\_%@anon.burocrata'
+                """, job_id=job_id, dias=retencao_dias)
+            for inicio in range(0, len(usuarios or []), INSERCAO_FILA):
+                conn.run("""
+                    INSERT INTO anonimizacao_fila (job_id, user_id)
+                    SELECT :job_id, user_id FROM unnest(CAST(:usuarios AS UUID[])) AS user_id
+                    ON CONFLICT DO NOTHING
+                """, job_id=job_id, usuarios=usuarios[inicio:inicio + INSERCAO_FILA])
+            conn.run("""
+                UPDATE anonimizacao_jobs
+                SET total_usuarios = (SELECT COUNT(*) FROM anonimizacao_fila WHERE job_id = :job_id)
+                WHERE job_id = :job_id
+            """, job_id=job_id)
+            conn.run("COMMIT")
+        except BaseException:
+            conn.run("ROLLBACK")
+            raise
+    return job_id
+
+
+def _processar_lote(job_id: int, tamanho: int) -> Optional[Dict[str, Any]]:
+    """Anonimiza e marca até `tamanho` usuários pendentes; None se não há pendentes"""
+    with conexao() as conn:
+        try:
+            conn.run("BEGIN")
+            conn.run(f"SET LOCAL lock_timeout = '{ANONIMIZACAO_LOCK_TIMEOUT}'")
+            inicio = time.perf_counter()
+            usuarios = conn.run("""
+                SELECT ARRAY_AGG(user_id) FROM (
+                    SELECT user_id FROM anonimizacao_fila
+                    WHERE job_id = :job_id AND processado_em IS NULL
+                    ORDER BY user_id
+                    LIMIT :tamanho
+                    FOR UPDATE SKIP LOCKED
+                ) lote
+            """, job_id=job_id, tamanho=tamanho)[0][0]
+            if not usuarios:
+                conn.run("COMMIT")
+                return None
+
+            linhas_users, linhas_login, linhas_auditoria = conn.run(
+                "SELECT * FROM anonimizar_usuarios(CAST(:usuarios AS UUID[]))", usuarios=usuarios)[0]
+            conn.run("""
+                UPDATE anonimizacao_fila SET processado_em = NOW()
+                WHERE job_id = :job_id AND user_id = ANY(CAST(:usuarios AS UUID[]))
+            """, job_id=job_id, usuarios=usuarios)
+            duracao = time.perf_counter() - inicio
+            conn.run("""
+                UPDATE anonimizacao_jobs SET
+                    estado = 'executando',
+                    erro = NULL,
+                    usuarios_processados = usuarios_processados + :usuarios,
+                    linhas_users = linhas_users + :linhas_users,
+                    linhas_login = linhas_login + :linhas_login,
+                    linhas_auditoria = linhas_auditoria + :linhas_auditoria,
+                    segundos_processando = segundos_processando + :duracao,
+                    atualizado_em = NOW()
+                WHERE job_id = :job_id
+            """, job_id=job_id, usuarios=len(usuarios), linhas_users=linhas_users,
+                 linhas_login=linhas_login, linhas_auditoria=linhas_auditoria, duracao=duracao)
+            conn.run("COMMIT")
+        except BaseException:
+            conn.run("ROLLBACK")
+            raise
+    return {
+        'usuarios': len(usuarios),
+        'linhas': linhas_users + linhas_login + linhas_auditoria,
+        'duracao': time.perf_counter() - inicio
+    }
+
+
+def _bloqueio(erro: Exception) -> bool:
+    """lock_timeout (55P03) ou deadlock (40P01): o lote pode ser tentado de novo"""
+    codigo = erro.args[0].get('C') if erro.args and isinstance(erro.args[0], dict) else None
+    return codigo in ('55P03', '40P01')
+
+
+def _finalizar(job_id: int, estado: str, erro: Optional[str] = None) -> None:
+    with conexao() as conn:
+        conn.run("""
+            UPDATE anonimizacao_jobs SET
+                estado = CAST(:estado AS VARCHAR(20)),
+                erro = :erro,
+                atualizado_em = NOW(),
+                concluido_em = CASE WHEN CAST(:estado AS VARCHAR(20)) = 'concluido' THEN NOW() END
+            WHERE job_id = :job_id
+        """, job_id=job_id, estado=estado, erro=erro)
+
+
+def processar_job(job_id: int, lote: int = ANONIMIZACAO_LOTE, pausa: float = ANONIMIZACAO_PAUSA,
+                  max_linhas_por_segundo: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Processa os usuários pendentes do job até a fila acabar. Devolve os
+    totais desta execução (usuários, linhas, segundos e linhas/s).
+    """
+    totais = {'usuarios': 0, 'linhas': 0, 'segundos': 0.0}
+    inicio_execucao = time.perf_counter()
+    tentativas = 0
+    numero = 0
+    while True:
+        try:
+            resultado = _processar_lote(job_id, lote)
+        except Exception as e:
+            if _bloqueio(e) and tentativas < TENTATIVAS_LOTE:
+                tentativas += 1
+                lote = max(1, lote // 2)
+                print(f"⏳ Job {job_id}: linhas ocupadas, lote desfeito; nova tentativa com {lote} usuários")
+                time.sleep(2 ** tentativas)
+                continue
+            _finalizar(job_id, 'falhou', str(e))
+            print(f"❌ Job {job_id} interrompido por erro (retome com --job {job_id}): {e}")
+            raise
+        tentativas = 0
+        if resultado is None:
+            break
+
+        numero += 1
+        totais['usuarios'] += resultado['usuarios']
+        totais['linhas'] += resultado['linhas']
+        totais['segundos'] += resultado['duracao']
+        print(f"🧹 Job {job_id}, lote {numero}: {resultado['usuarios']} usuários, "
+              f"{resultado['linhas']} linhas em {resultado['duracao'] * 1000:.0f} ms "
+              f"({resultado['linhas'] / max(resultado['duracao'], 1e-6):,.0f} linhas/s)")
+
+        # Aproxima a duração do lote do tempo alvo (no máximo dobrando ou dividindo por 2)
+        proporcao = ANONIMIZACAO_TEMPO_ALVO / max(resultado['duracao'], 1e-3)
+        lote = int(min(ANONIMIZACAO_LOTE_MAXIMO, max(1, lote * min(2.0, max(0.5, proporcao)))))
+
+        espera = resultado['duracao'] * pausa
+        if max_linhas_por_segundo:
+            espera = max(espera, resultado['linhas'] / max_linhas_por_segundo - resultado['duracao'])
+        time.sleep(espera)
+
+    # Outro processo pode ainda estar com um lote do mesmo job em andamento
+    with conexao() as conn:
+        pendentes = conn.run("""
+            SELECT COUNT(*) FROM anonimizacao_fila WHERE job_id = :job_id AND processado_em IS NULL
+        """, job_id=job_id)[0][0]
+    if not pendentes:
+        _finalizar(job_id, 'concluido')
+
+    totais['parede'] = time.perf_counter() - inicio_execucao
+    totais['linhas_por_segundo'] = totais['linhas'] / totais['segundos'] if totais['segundos'] else 0.0
+    print(f"✅ Job {job_id}: {totais['usuarios']} usuários e {totais['linhas']} linhas nesta execução; "
+          f"{totais['linhas_por_segundo']:,.0f} linhas/s processando, "
+          f"{totais['linhas'] / max(totais['parede'], 1e-6):,.0f} linhas/s com as pausas")
+    return totais
+
+
+def jobs_pendentes() -> List[int]:
+    """Jobs criados ou interrompidos no meio (os que falharam só com --job)"""
+    with conexao() as conn:
+        return [linha[0] for linha in conn.run("""
+            SELECT job_id FROM anonimizacao_jobs
+            WHERE estado IN ('pendente', 'executando')
+            ORDER BY job_id
+        """)]
+
+
+def status_jobs(limite: int = 20) -> List[Dict[str, Any]]:
+    with conexao() as conn:
+        linhas = conn.run("""
+            SELECT job_id, motivo, estado, total_usuarios, usuarios_processados,
+                   linhas_users + linhas_login + linhas_auditoria, segundos_processando,
+                   criado_em, concluido_em, erro
+            FROM anonimizacao_jobs
+            ORDER BY job_id DESC
+            LIMIT :limite
+        """, limite=limite)
+    return [{
+        'job_id': job_id,
+        'motivo': motivo,
+        'estado': estado,
+        'total_usuarios': total,
+        'usuarios_processados': processados,
+        'linhas': linhas_job,
+        'linhas_por_segundo': linhas_job / segundos if segundos else 0.0,
+        'criado_em': criado_em,
+        'concluido_em': concluido_em,
+        'erro': erro
+    } for job_id, motivo, estado, total, processados, linhas_job, segundos,
+          criado_em, concluido_em, erro in linhas]
+
+
+def _ler_usuarios(caminho: str) -> List[str]:
+    """Um user_id por linha; linhas vazias e comentários (#) são ignorados"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [linha.strip() for linha in arquivo if linha.strip() and not linha.startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--usuarios', metavar='ARQUIVO', help='cria um job com os user_ids do arquivo')
+    parser.add_argument('--retencao-dias', type=int, help='cria um job com os excluídos há mais dias que isso')
+    parser.add_argument('--motivo', help='descrição do pedido')
+    parser.add_argument('--job', type=int, help='retoma só este job')
+    parser.add_argument('--lote', type=int, default=ANONIMIZACAO_LOTE, help='usuários no primeiro lote')
+    parser.add_argument('--pausa', type=float, default=ANONIMIZACAO_PAUSA,
+                        help='pausa após cada lote, em múltiplos da duração do lote')
+    parser.add_argument('--max-linhas-por-segundo', type=float)
+    parser.add_argument('--status', action='store_true', help='lista os jobs recentes')
+    args = parser.parse_args()
+
+    if args.status:
+        for job in status_jobs():
+            print(f"#{job['job_id']:<5} {job['estado']:<11} {job['usuarios_processados']:>8}/"
+                  f"{job['total_usuarios']:<8} {job['linhas']:>10} linhas "
+                  f"{job['linhas_por_segundo']:>10,.0f} linhas/s  {job['motivo']}"
+                  + (f"  ⚠️ {job['erro']}" if job['erro'] else ''))
+        return
+
+    if args.usuarios or args.retencao_dias is not None:
+        motivo = args.motivo or (f"retenção de {args.retencao_dias} dias" if args.usuarios is None
+                                 else f"pedido em lote ({os.path.basename(args.usuarios)})")
+        job_id = criar_job(motivo, _ler_usuarios(args.usuarios) if args.usuarios else None,
+                           args.retencao_dias)
+        print(f"📝 Job {job_id} criado: {motivo}")
+        jobs = [job_id]
+    else:
+        jobs = [args.job] if args.job else jobs_pendentes()
+        if not jobs:
+            print("✅ Nenhum job de anonimização pendente")
+
+    try:
+        for job_id in jobs:
+            processar_job(job_id, args.lote, args.pausa, args.max_linhas_por_segundo)
+    except KeyboardInterrupt:
+        # O lote em andamento foi desfeito; os anteriores ficam no checkpoint
+        print("\n⏸️ Interrompido; rode de novo para continuar de onde parou")
+
+
+if __name__ == '__main__':
+    main()
@@ -293,6 +293,27 @@ INSERT INTO plans (plan_code, plan_name, plan_type, price_cent, billing_cycle, f
     ('premium', 'Burocrata Premium', 'paid', 29.90, 'monthly', '{"analises": 100, "historico": 365, "suporte": "prioritario", "api": true}', 1, 100),
     ('enterprise', 'Burocrata Enterprise', 'paid', 199.90, 'monthly', '{"analises": "ilimitado", "historico": "ilimitado", "suporte": "vip", "api": true, "multi_user": true, "auditoria": true}', 10, 1000);
 
+-- =====================================================
+-- 5.1 CACHE DE ANÁLISES (endereçado pelo conteúdo do PDF)
+-- =====================================================
+CREATE TABLE analises_cache (
+    -- SHA-256 dos bytes do documento + versão do pacote de regras
+    documento_sha256 CHAR(64) NOT NULL,
+    versao_regras VARCHAR(32) NOT NULL,
+    
+    resultado JSONB NOT NULL,
+    tamanho_bytes INTEGER NOT NULL,
+    
+    criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    acessado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    acessos INTEGER NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (documento_sha256, versao_regras)
+);
+
+-- Poda por bytes percorre do mais recente ao mais antigo
+CREATE INDEX idx_analises_cache_acesso ON analises_cache(acessado_em DESC);
+
 -- =====================================================
 -- 6. FUNÇÕES DE SEGURANÇA E MANUTENÇÃO
 -- =====================================================
@@ -411,6 +432,7 @@ GRANT SELECT, INSERT ON login_history TO app_user;
 GRANT SELECT, INSERT ON user_consents TO app_user;
 GRANT SELECT ON plans TO app_user;
 GRANT SELECT, INSERT, UPDATE ON subscriptions TO app_user;
+GRANT SELECT, INSERT, UPDATE, DELETE ON analises_cache TO app_user;
 
 -- Admin tem acesso total
 GRANT ALL ON ALL TABLES IN SCHEMA public TO app_admin;
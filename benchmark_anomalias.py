@@ -0,0 +1,227 @@
+"""
+Benchmark da detecção de anomalias de login a 10 mil logins por minuto.
+
+Gera um fluxo de tentativas com horários simulados (--taxa por minuto,
+--minutos minutos): usuários comuns, mais alguns padrões que devem virar
+anomalia (senha errada repetida, um IP testando várias contas, um usuário
+trocando de IP e um trocando de país). Mede:
+
+    1. detector: custo por tentativa do DetectorAnomalias (em memória),
+       minuto a minuto (deve ficar constante), e as anomalias encontradas;
+    2. --sql: o modelo antigo num schema temporário, com o trigger
+       `check_suspicious_login` a cada INSERT e o agrupamento de
+       `detect_anomalies()` ao fim de cada minuto, para comparar como o
+       custo cresce com o histórico (usa --minutos-sql minutos do fluxo).
+
+Uso:
+    python benchmark_anomalias.py --taxa 10000 --minutos 30
+    DATABASE_URL=postgres://... python benchmark_anomalias.py --sql --minutos-sql 3
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from database import conexao
+from detector_anomalias import DetectorAnomalias
+
+SCHEMA = 'benchmark_anomalias'
+
+DDL_MODELO_ANTIGO = f"""
+    CREATE TABLE {SCHEMA}.login_history (
+        login_id BIGSERIAL PRIMARY KEY,
+        user_id UUID NOT NULL,
+        login_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        ip_address INET NOT NULL,
+        geo_location JSONB,
+        login_success BOOLEAN NOT NULL DEFAULT true,
+        is_suspicious BOOLEAN DEFAULT false,
+        suspicion_score INTEGER DEFAULT 0,
+        suspicion_reason TEXT
+    );
+    CREATE INDEX ON {SCHEMA}.login_history (user_id, login_time DESC);
+    CREATE INDEX ON {SCHEMA}.login_history (ip_address);
+    CREATE INDEX ON {SCHEMA}.login_history (is_suspicious) WHERE is_suspicious;
+
+    -- Corpo de check_suspicious_login() de bancodedados.sql
+    CREATE FUNCTION {SCHEMA}.check_suspicious_login() RETURNS TRIGGER AS $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM {SCHEMA}.login_history
+            WHERE user_id = NEW.user_id
+            AND login_time > NOW() - INTERVAL '1 hour'
+            AND ip_address != NEW.ip_address
+            GROUP BY user_id HAVING COUNT(DISTINCT ip_address) > 3
+        ) THEN
+            NEW.is_suspicious := true;
+            NEW.suspicion_score := 70;
+            NEW.suspicion_reason := 'Múltiplos IPs em curto período';
+        END IF;
+        IF EXISTS (
+            SELECT 1 FROM {SCHEMA}.login_history
+            WHERE user_id = NEW.user_id
+            AND login_time > NOW() - INTERVAL '2 hours'
+            AND geo_location->>'country' != NEW.geo_location->>'country'
+        ) THEN
+            NEW.is_suspicious := true;
+            NEW.suspicion_score := 90;
+            NEW.suspicion_reason := 'Viagem impossível entre países';
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER trigger_check_suspicious_login
+        BEFORE INSERT ON {SCHEMA}.login_history
+        FOR EACH ROW EXECUTE FUNCTION {SCHEMA}.check_suspicious_login();
+"""
+
+# Agrupamentos de detect_anomalies() (auditoria.sql)
+SQL_DETECT_ANTIGO = f"""
+    SELECT 'multiple_failed_logins', user_id, COUNT(*)
+    FROM {SCHEMA}.login_history
+    WHERE login_success = false AND login_time > NOW() - INTERVAL '5 minutes'
+    GROUP BY user_id HAVING COUNT(*) > 5
+    UNION ALL
+    SELECT 'suspicious_location', user_id, 1
+    FROM {SCHEMA}.login_history
+    WHERE is_suspicious = true AND login_time > NOW() - INTERVAL '1 hour'
+"""
+
+
+def gerar_fluxo(taxa, minutos, usuarios, semente=42):
+    """
+    Tentativas (segundo, usuario_id, ip, sucesso, país) em ordem de tempo e
+    o conjunto de anomalias plantadas {(tipo, chave)}
+    """
+    aleatorio = random.Random(semente)
+    populacao = [str(uuid.UUID(int=aleatorio.getrandbits(128))) for _ in range(usuarios)]
+    # Cada usuário comum usa sempre o mesmo IP e país
+    ip_de = {usuario: f"10.{aleatorio.randrange(256)}.{aleatorio.randrange(256)}.{aleatorio.randrange(1, 255)}"
+             for usuario in populacao}
+
+    fluxo = []
+    total = int(taxa * minutos)
+    for numero in range(total):
+        segundo = numero * 60.0 / taxa
+        usuario = aleatorio.choice(populacao)
+        fluxo.append((segundo, usuario, ip_de[usuario], aleatorio.random() > 0.03, 'BR'))
+
+    esperadas = set()
+    for minuto in range(0, minutos, 5):
+        inicio = minuto * 60.0 + 30
+        # Senha errada repetida: 8 falhas em 40 s
+        vitima = aleatorio.choice(populacao)
+        fluxo += [(inicio + 5 * i, vitima, ip_de[vitima], False, 'BR') for i in range(8)]
+        esperadas.add(('multiple_failed_logins', vitima))
+        # Um IP testando 30 contas diferentes em 60 s
+        ip_ataque = f"203.0.113.{minuto % 250 + 1}"
+        fluxo += [(inicio + 2 * i, aleatorio.choice(populacao), ip_ataque, False, 'BR') for i in range(30)]
+        esperadas.add(('multiple_failed_logins_ip', ip_ataque))
+        # Usuário entrando de 5 IPs em 10 minutos
+        nomade = aleatorio.choice(populacao)
+        fluxo += [(inicio + 120 * i, nomade, f"198.51.100.{i + 1}", True, 'BR') for i in range(5)]
+        esperadas.add(('suspicious_location', nomade))
+        # Usuário no Brasil e, 20 minutos depois, em Portugal
+        viajante = aleatorio.choice(populacao)
+        fluxo += [(inicio, viajante, ip_de[viajante], True, 'BR'),
+                  (inicio + 1200, viajante, ip_de[viajante], True, 'PT')]
+        esperadas.add(('suspicious_location', viajante))
+
+    fluxo.sort(key=lambda tentativa: tentativa[0])
+    return fluxo, esperadas
+
+
+def _percentil(tempos, p):
+    if len(tempos) < 2:
+        return tempos[0] if tempos else 0.0
+    return statistics.quantiles(tempos, n=100)[p - 1]
+
+
+def medir_detector(fluxo, esperadas, minutos):
+    detector = DetectorAnomalias()
+    base = time.time()
+    por_minuto = [[] for _ in range(minutos + 1)]
+    encontradas = set()
+
+    inicio_total = time.perf_counter()
+    for segundo, usuario, ip, sucesso, pais in fluxo:
+        inicio = time.perf_counter()
+        avaliacao = detector.registrar_login(usuario, ip, sucesso, pais, agora=base + segundo)
+        por_minuto[min(int(segundo // 60), minutos)].append((time.perf_counter() - inicio) * 1e6)
+        for anomalia in avaliacao.anomalias:
+            encontradas.add((anomalia.tipo, anomalia.ip if anomalia.tipo == 'multiple_failed_logins_ip'
+                             else anomalia.usuario_id))
+    duracao = time.perf_counter() - inicio_total
+
+    print(f"\n🧠 Detector em memória: {len(fluxo)} tentativas em {duracao:.2f} s "
+          f"({len(fluxo) / duracao * 60:,.0f} tentativas/min de capacidade)")
+    print(f"{'minuto':>7} {'tentativas':>11} {'p50 µs':>8} {'p99 µs':>8}")
+    for minuto, tempos in enumerate(por_minuto):
+        if tempos and (minuto < 3 or minuto % 5 == 0 or minuto == minutos - 1):
+            print(f"{minuto:>7} {len(tempos):>11} {_percentil(tempos, 50):>8.1f} {_percentil(tempos, 99):>8.1f}")
+
+    estatisticas = detector.estatisticas()
+    print(f"   {estatisticas['usuarios_em_memoria']} usuários e {estatisticas['ips_em_memoria']} IPs em memória")
+    plantadas = len(esperadas & encontradas)
+    print(f"   anomalias plantadas detectadas: {plantadas}/{len(esperadas)}; "
+          f"outras: {len(encontradas - esperadas)} (coincidências do fluxo aleatório)")
+
+
+def medir_sql(fluxo, minutos_sql):
+    limite = minutos_sql * 60.0
+    with conexao() as conn:
+        conn.run(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.run(f"CREATE SCHEMA {SCHEMA}")
+        conn.run(DDL_MODELO_ANTIGO)
+        try:
+            print(f"\n🐘 Modelo antigo (trigger + detect_anomalies), {minutos_sql} minutos do fluxo")
+            print(f"{'minuto':>7} {'linhas':>8} {'INSERT p50 ms':>14} {'INSERT p99 ms':>14} {'detect ms':>10}")
+            def fechar_minuto(minuto, tempos):
+                inicio = time.perf_counter()
+                conn.run(SQL_DETECT_ANTIGO)
+                detect = (time.perf_counter() - inicio) * 1000
+                linhas = conn.run(f"SELECT COUNT(*) FROM {SCHEMA}.login_history")[0][0]
+                print(f"{minuto:>7} {linhas:>8} {_percentil(tempos, 50):>14.2f} "
+                      f"{_percentil(tempos, 99):>14.2f} {detect:>10.1f}")
+
+            minuto, tempos = 0, []
+            for segundo, usuario, ip, sucesso, pais in fluxo:
+                if segundo >= limite:
+                    break
+                if int(segundo // 60) != minuto:
+                    fechar_minuto(minuto, tempos)
+                    minuto, tempos = int(segundo // 60), []
+                inicio = time.perf_counter()
+                # Horário real (o trigger compara com NOW()): todo o histórico está na janela
+                conn.run(f"""
+                    INSERT INTO {SCHEMA}.login_history (user_id, ip_address, login_success, geo_location)
+                    VALUES (CAST(:usuario AS UUID), CAST(:ip AS INET), :sucesso, jsonb_build_object('country', CAST(:pais AS TEXT)))
+                """, usuario=usuario, ip=ip, sucesso=sucesso, pais=pais)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            if tempos:
+                fechar_minuto(minuto, tempos)
+        finally:
+            conn.run(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--taxa', type=int, default=10000, help='tentativas de login por minuto')
+    parser.add_argument('--minutos', type=int, default=30, help='minutos simulados')
+    parser.add_argument('--usuarios', type=int, default=50000)
+    parser.add_argument('--sql', action='store_true', help='compara com o trigger e detect_anomalies() no banco')
+    parser.add_argument('--minutos-sql', type=int, default=3)
+    args = parser.parse_args()
+
+    fluxo, esperadas = gerar_fluxo(args.taxa, args.minutos, args.usuarios)
+    print(f"🔐 {len(fluxo)} tentativas simuladas ({args.taxa}/min por {args.minutos} min, {args.usuarios} usuários)")
+    medir_detector(fluxo, esperadas, args.minutos)
+    if args.sql:
+        medir_sql(fluxo, args.minutos_sql)
+
+
+if __name__ == '__main__':
+    main()
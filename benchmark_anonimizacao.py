@@ -0,0 +1,96 @@
+"""
+Benchmark da anonimização LGPD: anonimize_user() em laço x job em lotes.
+
+Cria --usuarios usuários sintéticos, cada um com --logins linhas em
+login_history e --eventos em audit_logs, e anonimiza metade deles:
+
+    1. laço: uma chamada de `anonimize_user()` por usuário, cada uma na
+       sua transação (como um script de exclusão em massa faria);
+    2. job: a outra metade num job de anonimizacao_lgpd.py (lotes com
+       checkpoint, sem pausa entre lotes para medir só o processamento).
+
+Mostra usuários/s e linhas/s de cada um. Os usuários e eventos sintéticos
+são removidos no fim.
+
+Uso (como dono das tabelas):
+    DATABASE_URL=postgres://... python benchmark_anonimizacao.py --usuarios 4000
+"""
+
+import argparse
+import time
+
+from anonimizacao_lgpd import criar_job, processar_job
+from database import conexao
+
+MARCA = 'benchmark_anonimizacao'
+
+
+def _criar_usuarios(quantidade, logins, eventos):
+    with conexao() as conn:
+        usuarios = [linha[0] for linha in conn.run("""
+            INSERT INTO users (email, full_name, password_hash, document_number, phone)
+            SELECT 'bench-anon-' || n || '-' || gen_random_uuid() || '@exemplo.invalid',
+                   'Usuário ' || n, md5(n::text), lpad(n::text, 11, '0'), '+5511' || lpad(n::text, 9, '0')
+            FROM generate_series(1, :quantidade) n
+            RETURNING user_id
+        """, quantidade=quantidade)]
+        conn.run("""
+            INSERT INTO login_history (user_id, login_time, ip_address, user_agent, device_fingerprint)
+            SELECT u, NOW() - n * INTERVAL '1 hour', '10.0.0.1', 'Mozilla/5.0 (benchmark)', md5(u::text)
+            FROM unnest(CAST(:usuarios AS UUID[])) u, generate_series(1, :logins) n
+        """, usuarios=usuarios, logins=logins)
+        conn.run("""
+            INSERT INTO audit_logs (event_time, user_id, ip_address, user_agent, event_type,
+                                    event_action, audit_metadata)
+            SELECT NOW() - n * INTERVAL '1 hour', u, '10.0.0.1', 'Mozilla/5.0 (benchmark)', 'login',
+                   'login_sucesso', jsonb_build_object('benchmark', CAST(:marca AS TEXT))
+            FROM unnest(CAST(:usuarios AS UUID[])) u, generate_series(1, :eventos) n
+        """, usuarios=usuarios, eventos=eventos, marca=MARCA)
+    return usuarios
+
+
+def _remover(usuarios, job_id):
+    with conexao() as conn:
+        conn.run("DELETE FROM audit_logs WHERE audit_metadata->>'benchmark' = :marca", marca=MARCA)
+        conn.run("DELETE FROM users WHERE user_id = ANY(CAST(:usuarios AS UUID[]))", usuarios=usuarios)
+        if job_id is not None:
+            conn.run("DELETE FROM anonimizacao_jobs WHERE job_id = :job_id", job_id=job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--usuarios', type=int, default=4000)
+    parser.add_argument('--logins', type=int, default=10, help='linhas de login_history por usuário')
+    parser.add_argument('--eventos', type=int, default=10, help='linhas de audit_logs por usuário')
+    parser.add_argument('--lote', type=int, default=500)
+    args = parser.parse_args()
+
+    linhas_por_usuario = 1 + args.logins + args.eventos
+    print(f"🧪 {args.usuarios} usuários sintéticos, {linhas_por_usuario} linhas cada")
+    usuarios = _criar_usuarios(args.usuarios, args.logins, args.eventos)
+    metade = len(usuarios) // 2
+    job_id = None
+
+    try:
+        inicio = time.perf_counter()
+        for usuario in usuarios[:metade]:
+            with conexao() as conn:
+                conn.run("SELECT anonimize_user(CAST(:usuario AS UUID))", usuario=usuario)
+        duracao_laco = time.perf_counter() - inicio
+
+        job_id = criar_job(MARCA, [str(usuario) for usuario in usuarios[metade:]])
+        inicio = time.perf_counter()
+        processar_job(job_id, lote=args.lote, pausa=0)
+        duracao_job = time.perf_counter() - inicio
+
+        print(f"\n{'modo':<8} {'usuários':>9} {'segundos':>9} {'usuários/s':>11} {'linhas/s':>10}")
+        for modo, quantidade, duracao in (('laço', metade, duracao_laco),
+                                          ('job', len(usuarios) - metade, duracao_job)):
+            print(f"{modo:<8} {quantidade:>9} {duracao:>9.2f} {quantidade / duracao:>11,.0f} "
+                  f"{quantidade * linhas_por_usuario / duracao:>10,.0f}")
+    finally:
+        _remover(usuarios, job_id)
+
+
+if __name__ == '__main__':
+    main()
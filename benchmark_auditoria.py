@@ -0,0 +1,113 @@
+"""
+Benchmark da gravação de auditoria: INSERT por evento x fila em lotes.
+
+Simula rotas concorrentes registrando eventos em audit_logs e compara:
+
+    1. direto: cada evento é um INSERT na hora (uma ida ao banco por evento,
+       com a requisição esperando);
+    2. fila: cada evento vai para o EscritorAuditoria (fila_auditoria.py)
+       e a thread de fundo grava em lotes.
+
+Mede o tempo que a "requisição" gasta registrando o evento (p50/p99), a
+vazão até todos os eventos estarem no banco e quantos comandos o banco
+recebeu. Os eventos gravados são removidos no fim (event_type 'benchmark').
+
+Uso:
+    DATABASE_URL=postgres://... python benchmark_auditoria.py --eventos 20000 --threads 16
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database import conexao
+from fila_auditoria import EscritorAuditoria
+
+EVENT_TYPE = 'benchmark'
+
+
+def _evento(numero):
+    return {
+        'ip_address': f"10.0.{numero % 250}.{numero % 200 + 1}",
+        'user_agent': 'benchmark-auditoria',
+        'http_method': 'POST',
+        'endpoint': '/login',
+        'status_code': 200,
+        'audit_metadata': {'numero': numero}
+    }
+
+
+def _inserir_direto(numero):
+    evento = _evento(numero)
+    with conexao() as conn:
+        conn.run("""
+            INSERT INTO audit_logs (ip_address, user_agent, event_type, event_action,
+                                    http_method, endpoint, status_code, audit_metadata)
+            VALUES (CAST(:ip_address AS INET), :user_agent, :event_type, 'direto',
+                    :http_method, :endpoint, :status_code, CAST(:audit_metadata AS JSONB))
+        """, event_type=EVENT_TYPE, **dict(evento, audit_metadata=json.dumps(evento['audit_metadata'])))
+
+
+def _percentil(tempos, p):
+    if len(tempos) < 2:
+        return tempos[0] if tempos else 0.0
+    return statistics.quantiles(tempos, n=100)[p - 1]
+
+
+def _rodar(nome, registrar, eventos, threads, esperar_gravacao=None):
+    latencias = []
+    lock = threading.Lock()
+
+    def requisicao(numero):
+        inicio = time.perf_counter()
+        registrar(numero)
+        latencia = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.append(latencia)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(requisicao, range(eventos)))
+    enfileirado = time.perf_counter() - inicio
+    if esperar_gravacao:
+        esperar_gravacao()
+    duracao = time.perf_counter() - inicio
+
+    print(f"{nome:<8} {_percentil(latencias, 50):>9.3f} {_percentil(latencias, 99):>9.3f} "
+          f"{enfileirado:>11.2f} {eventos / duracao:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--eventos', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16, help='requisições simultâneas')
+    parser.add_argument('--lote', type=int, default=200)
+    parser.add_argument('--intervalo', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"📝 {args.eventos} eventos de auditoria, {args.threads} threads\n")
+    print(f"{'modo':<8} {'p50 ms':>9} {'p99 ms':>9} {'rotas s':>11} {'eventos/s':>11}")
+
+    _rodar('direto', _inserir_direto, args.eventos, args.threads)
+
+    escritor = EscritorAuditoria(lote=args.lote, intervalo=args.intervalo, fila_max=args.eventos)
+    escritor.iniciar()
+    sessao = str(uuid.uuid4())
+    _rodar('fila', lambda numero: escritor.registrar(EVENT_TYPE, 'fila', session_id=sessao, **_evento(numero)),
+           args.eventos, args.threads, esperar_gravacao=escritor.encerrar)
+
+    estatisticas = escritor.estatisticas()
+    print(f"\n📦 Fila: {estatisticas['gravados']} eventos em {estatisticas['lotes']} comandos "
+          f"({estatisticas['eventos_por_lote']} por lote, {estatisticas['descartados_fila_cheia']} descartados); "
+          f"direto: {args.eventos} comandos")
+
+    with conexao() as conn:
+        conn.run("DELETE FROM audit_logs WHERE event_type = :event_type", event_type=EVENT_TYPE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark das consultas frequentes: texto (`conn.run`) x preparadas.
+
+Executa cada consulta registrada com `registrar_consulta()` nos caminhos de
+login, status e pagamento das duas formas, na mesma conexão:
+
+    - texto: `conn.run(sql, ...)`, como antes (PARSE + plano a cada chamada);
+    - preparada: `conn.executar(nome, ...)` (PREPARE uma vez, depois só
+      BIND/EXECUTE).
+
+Tudo roda dentro de uma transação com um usuário temporário e termina em
+ROLLBACK, então pode ser usado contra o banco de produção.
+
+Uso:
+    DATABASE_URL=postgres://... python benchmark_consultas.py [--repeticoes 500]
+"""
+
+import argparse
+import hashlib
+import os
+import statistics
+import time
+import uuid
+
+from database import PoolConexoes, consultas_registradas
+
+
+def _fixtura(conn):
+    """Cria (na transação corrente) um usuário e devolve os parâmetros de cada consulta"""
+    user_id = str(uuid.uuid4())
+    email = f"benchmark-{user_id}@exemplo.com"
+    senha_hash = hashlib.sha256(b'benchmark').hexdigest()
+    conn.run("""
+        INSERT INTO users (user_id, email, full_name, password_hash, account_status)
+        VALUES (:user_id, :email, 'Benchmark', :password_hash, 'active')
+    """, user_id=user_id, email=email, password_hash=senha_hash)
+    conn.run("""
+        INSERT INTO user_roles (user_id, role_id)
+        SELECT :user_id, role_id FROM roles WHERE role_name = 'free_user'
+    """, user_id=user_id)
+
+    return {
+        'autenticar_usuario': {'email': email, 'password_hash': senha_hash},
+        'status_usuario': {'user_id': user_id},
+        'salvar_cobranca': {
+            'bill_id': f"bill_benchmark_{user_id}", 'usuario_id': user_id,
+            'pacote': 'bronze', 'valor': 9.90, 'creditos': '30',
+            'url_pagamento': 'https://exemplo.com/pagar'
+        },
+        'cobranca_confirmada': {'bill_id': f"bill_benchmark_{user_id}", 'usuario_id': user_id},
+        'processar_pagamento': {
+            'usuario_id': user_id, 'email': None, 'bill_id': f"bill_benchmark_{user_id}",
+            'pro': False, 'creditos': 30, 'conta_especial': '', 'new_data': '{}'
+        },
+    }
+
+
+def _medir(funcao, repeticoes):
+    """Latências (µs) de cada chamada"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    return tempos
+
+
+def _p95(tempos):
+    return statistics.quantiles(tempos, n=20)[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeticoes', type=int, default=500)
+    parser.add_argument('--url', default=os.getenv('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.url:
+        raise SystemExit("❌ Defina DATABASE_URL ou use --url")
+
+    # Os módulos registram suas consultas no import
+    import backend  # noqa: F401
+    import webhook_abacate  # noqa: F401
+    consultas = consultas_registradas()
+
+    pool = PoolConexoes(args.url, max_conexoes=1)
+    conn = pool.obter()
+    try:
+        conn.run("BEGIN")
+        parametros = _fixtura(conn)
+
+        print(f"\n🔬 {args.repeticoes} execuções por consulta (latência em µs)\n")
+        print(f"{'consulta':<22} {'texto p50':>10} {'prep p50':>10} {'texto p95':>10} {'prep p95':>10} {'ganho':>7}")
+        for nome, sql in consultas.items():
+            if nome not in parametros:
+                print(f"{nome:<22} ⚠️ sem parâmetros de benchmark")
+                continue
+            valores = parametros[nome]
+
+            # Consultas que não se aplicam ao schema/dados atuais são puladas
+            conn.run("SAVEPOINT benchmark")
+            try:
+                conn.run(sql, **valores)
+            except Exception as e:
+                conn.run("ROLLBACK TO SAVEPOINT benchmark")
+                erro = e.args[0] if e.args else e
+                print(f"{nome:<22} ⚠️ ignorada: {erro.get('M', erro) if isinstance(erro, dict) else erro}")
+                continue
+
+            # Leituras precisam devolver exatamente as mesmas linhas
+            if sql.upper().startswith('SELECT') and conn.executar(nome, **valores) != conn.run(sql, **valores):
+                raise SystemExit(f"❌ Resultado divergente em {nome}")
+
+            # Aquecimento dos dois caminhos (inclui o PREPARE)
+            for _ in range(20):
+                conn.run(sql, **valores)
+                conn.executar(nome, **valores)
+
+            texto = _medir(lambda: conn.run(sql, **valores), args.repeticoes)
+            preparada = _medir(lambda: conn.executar(nome, **valores), args.repeticoes)
+            p50_texto, p50_prep = statistics.median(texto), statistics.median(preparada)
+            print(f"{nome:<22} {p50_texto:>10.0f} {p50_prep:>10.0f} "
+                  f"{_p95(texto):>10.0f} {_p95(preparada):>10.0f} {p50_texto / p50_prep:>6.2f}x")
+    finally:
+        conn.run("ROLLBACK")
+        conn.close()
+        pool.fechar_ociosas()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark da extração de texto de PDFs por número de páginas.
+
+Compara, para documentos sintéticos de tamanhos crescentes (ou um PDF real
+com --pdf), a extração sequencial no próprio processo (como era feita antes:
+página a página com `texto +=`) com o pool de extração, que divide os
+documentos longos em intervalos de páginas processados em paralelo.
+
+Uso:
+    python benchmark_extracao.py [--paginas 10 50 100 200] [--workers 4] [--pdf contrato.pdf]
+
+A última coluna é o pico de memória virtual dos trabalhadores (o que o
+limite EXTRACAO_PDF_MEMORIA_MB restringe), acumulado desde que subiram.
+
+O ganho depende do número de núcleos disponíveis: com um único núcleo a
+divisão em intervalos só acrescenta o custo de reabrir o PDF em cada
+trabalhador.
+"""
+
+import argparse
+import io
+import os
+import time
+from typing import Optional
+
+import pdfplumber
+
+from extracao_pdf import EXTRACAO_PDF_PAGINAS_POR_PARTE, PoolExtracao
+
+LINHAS_MODELO = [
+    "CLÁUSULA {n} - DAS OBRIGAÇÕES DAS PARTES",
+    "O LOCATÁRIO pagará o aluguel mensal de R$ 1.500,00 até o dia 5 de cada mês,",
+    "mediante depósito em conta indicada pelo LOCADOR, sob pena de multa de 10%",
+    "e juros de mora de 1% ao mês, com correção monetária pelo IGP-M/FGV.",
+    "Parágrafo único. O reajuste será anual, conforme legislação aplicável, e",
+    "eventuais benfeitorias dependerão de autorização prévia e por escrito.",
+]
+
+
+def _escapar(texto: str) -> str:
+    return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def gerar_pdf(paginas: int, linhas_por_pagina: int = 60) -> bytes:
+    """PDF mínimo (Helvetica, WinAnsi) com texto contratual em todas as páginas"""
+    objetos = [b'<< /Type /Catalog /Pages 2 0 R >>']
+    filhos = ' '.join(f'{3 + 2 * i} 0 R' for i in range(paginas))
+    objetos.append(f'<< /Type /Pages /Kids [{filhos}] /Count {paginas} >>'.encode())
+    fonte = 3 + 2 * paginas
+    for i in range(paginas):
+        linhas = [LINHAS_MODELO[j % len(LINHAS_MODELO)].format(n=i * linhas_por_pagina + j)
+                  for j in range(linhas_por_pagina)]
+        conteudo = ('BT /F1 9 Tf 40 810 Td 12 TL '
+                    + ' '.join(f"({_escapar(linha)}) '" for linha in linhas)
+                    + ' ET').encode('cp1252')
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R '
+            f'/Resources << /Font << /F1 {fonte} 0 R >> >> >>'.encode()
+        )
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(conteudo) + conteudo + b'\nendstream')
+    objetos.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, 1):
+        posicoes.append(len(pdf))
+        pdf += b'%d 0 obj\n' % numero + objeto + b'\nendobj\n'
+    inicio_xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % posicao for posicao in posicoes)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(pdf)
+
+
+def extrair_sequencial(conteudo: bytes):
+    """Extração antiga: no próprio processo, página a página com `texto +=`"""
+    with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+        texto = ""
+        for pagina in pdf.pages:
+            texto_pagina = pagina.extract_text()
+            if texto_pagina:
+                texto += texto_pagina + "\n"
+        return texto if texto.strip() else None
+
+
+def medir(funcao, conteudo: bytes, repeticoes: int):
+    """Menor tempo entre as repetições e o último resultado"""
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(conteudo)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def pico_memoria_mb(pool: PoolExtracao) -> Optional[float]:
+    """Maior pico de memória virtual (VmPeak) entre os trabalhadores vivos; só no Linux"""
+    picos = []
+    for trabalhador in list(pool._todos):
+        try:
+            with open(f'/proc/{trabalhador.processo.pid}/status') as status:
+                picos += [int(linha.split()[1]) / 1024 for linha in status if linha.startswith('VmPeak:')]
+        except OSError:
+            pass
+    return max(picos) if picos else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--paginas', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--repeticoes', type=int, default=2)
+    parser.add_argument('--pdf', help='mede um PDF real em vez dos documentos sintéticos')
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, 'rb') as arquivo:
+            documentos = [arquivo.read()]
+    else:
+        documentos = [gerar_pdf(paginas) for paginas in args.paginas]
+
+    pool = PoolExtracao(workers=args.workers, timeout=600)
+    try:
+        # Sobe todos os trabalhadores antes de medir
+        aquecimento = gerar_pdf(args.workers * EXTRACAO_PDF_PAGINAS_POR_PARTE)
+        pool.extrair_texto(aquecimento)
+
+        print(f"🧵 {args.workers} trabalhadores, {os.cpu_count()} núcleos, "
+              f"{EXTRACAO_PDF_PAGINAS_POR_PARTE} páginas mínimas por intervalo\n")
+        print(f"{'páginas':>8} {'sequencial':>11} {'pool':>9} {'ganho':>7} {'pico MB':>8}")
+        for conteudo in documentos:
+            paginas = pool.executar('contar_paginas', conteudo)
+            sequencial, esperado = medir(extrair_sequencial, conteudo, args.repeticoes)
+            paralelo, obtido = medir(pool.extrair_texto, conteudo, args.repeticoes)
+            if obtido != esperado:
+                raise SystemExit(f"❌ Texto divergente para {paginas} páginas")
+            pico = pico_memoria_mb(pool)
+            print(f"{paginas:>8} {sequencial:>10.2f}s {paralelo:>8.2f}s {sequencial / paralelo:>6.2f}x "
+                  f"{pico if pico is None else f'{pico:.0f}':>8}")
+    finally:
+        pool.encerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Benchmark de carga do fluxo de pagamento, de ponta a ponta.
+
+Dispara fluxos a uma taxa fixa (carga em malha aberta: um fluxo novo começa
+no horário marcado mesmo que os anteriores estejam atrasados) e mede cada
+etapa separadamente:
+
+    1. criar_pagamento: POST /criar-pagamento no backend (que chama o
+       /v1/billing/create do stub_abacatepay.py);
+    2. webhook: o stub envia o `billing.paid` assinado ao webhook_abacate.py
+       (latência até o 200 do webhook);
+    3. status: cada GET /status-pagamento/<usuario_id>, do checkout até os
+       créditos aparecerem (com --aguardar, o único GET ao long-poll
+       /aguardar-pagamento/<usuario_id>, que responde na confirmação);
+    4. confirmacao: do 200 do webhook até o cliente ver os créditos
+       (tempo da fila de webhooks creditar o pagamento).
+
+`--atraso-pagamento` simula o tempo que o usuário leva para pagar: é quando
+o polling multiplica as consultas ao banco.
+
+Cada fluxo em andamento usa um usuário próprio, criado via /criar-conta no
+início, para que a confirmação possa ser verificada pelo saldo.
+
+Uso (três terminais + este):
+    ABACATE_WEBHOOK_SECRET=segredo python stub_abacatepay.py --porta 5002
+    ABACATE_API_KEY=stub ABACATE_API_URL=http://127.0.0.1:5002/v1 python backend.py
+    ABACATE_WEBHOOK_SECRET=segredo python webhook_abacate.py
+    python benchmark_pagamentos.py --taxa 20 --duracao 30 [--latencia-api 0.2 --taxa-erro-api 0.05]
+"""
+
+import argparse
+import queue
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ETAPAS = ('criar_pagamento', 'webhook', 'status', 'confirmacao')
+
+# Pacote sem link fixo: força a criação da cobrança via API
+PACOTE = 'avulso'
+CREDITOS = 10
+VALOR = 9.90
+
+_local = threading.local()
+
+
+def _sessao():
+    # Uma sessão (keep-alive) por thread
+    if not hasattr(_local, 'sessao'):
+        _local.sessao = requests.Session()
+    return _local.sessao
+
+
+class Medicoes:
+    """Latências (ms) e erros de cada etapa, compartilhados entre as threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {etapa: [] for etapa in ETAPAS}
+        self.erros = {etapa: 0 for etapa in ETAPAS}
+
+    def registrar(self, etapa, inicio=None, latencia_ms=None):
+        if latencia_ms is None:
+            latencia_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.latencias[etapa].append(latencia_ms)
+
+    def falhar(self, etapa):
+        with self._lock:
+            self.erros[etapa] += 1
+
+
+def _criar_usuarios(backend, quantidade):
+    """Contas do benchmark; devolve uma fila de (usuario_id, email)"""
+    usuarios = queue.Queue()
+    lote = uuid.uuid4().hex[:8]
+    for numero in range(quantidade):
+        email = f"benchmark-pagamento-{lote}-{numero}@exemplo.com"
+        resposta = _sessao().post(f"{backend}/criar-conta", json={
+            'nome': f"Benchmark {numero}", 'email': email, 'senha': 'benchmark'
+        }, timeout=30).json()
+        if not resposta.get('success'):
+            raise SystemExit(f"❌ Não foi possível criar {email}: {resposta.get('error')}")
+        usuarios.put((resposta['usuario']['id'], email))
+    return usuarios
+
+
+def _creditos(backend, usuario_id, medicoes):
+    inicio = time.perf_counter()
+    resposta = _sessao().get(f"{backend}/status-pagamento/{usuario_id}", timeout=30)
+    medicoes.registrar('status', inicio)
+    return resposta.json().get('burocreditos') or 0
+
+
+def _confirmar(args, usuario_id, bill_id, antes, medicoes, resultado):
+    """Espera os créditos como o frontend: consultando o status ou no long-poll"""
+    try:
+        if args.aguardar:
+            inicio = time.perf_counter()
+            resposta = _sessao().get(f"{args.backend}/aguardar-pagamento/{usuario_id}", params={
+                'bill_id': bill_id, 'timeout': args.timeout_confirmacao
+            }, timeout=args.timeout_confirmacao + 10)
+            medicoes.registrar('status', inicio)
+            if resposta.json().get('confirmado'):
+                resultado['confirmado_em'] = time.perf_counter()
+            return
+
+        limite = time.perf_counter() + args.timeout_confirmacao
+        while time.perf_counter() < limite:
+            if _creditos(args.backend, usuario_id, medicoes) >= antes + CREDITOS:
+                resultado['confirmado_em'] = time.perf_counter()
+                return
+            time.sleep(args.intervalo_status)
+    except (requests.exceptions.RequestException, ValueError):
+        medicoes.falhar('status')
+
+
+def fluxo(args, usuarios, medicoes):
+    """Um pagamento completo: cobrança, webhook e confirmação pelo status"""
+    usuario_id, email = usuarios.get()
+    try:
+        antes = _creditos(args.backend, usuario_id, medicoes)
+
+        inicio = time.perf_counter()
+        try:
+            resposta = _sessao().post(f"{args.backend}/criar-pagamento", json={
+                'pacote': PACOTE, 'valor': VALOR, 'creditos': str(CREDITOS),
+                'usuario_id': usuario_id, 'usuario_email': email, 'usuario_nome': 'Benchmark'
+            }, timeout=30)
+            dados = resposta.json()
+        except (requests.exceptions.RequestException, ValueError):
+            dados = {}
+        if not dados.get('success'):
+            medicoes.falhar('criar_pagamento')
+            return
+        medicoes.registrar('criar_pagamento', inicio)
+
+        # O cliente passa a aguardar logo após o checkout, enquanto o usuário paga
+        resultado = {}
+        espera = threading.Thread(target=_confirmar, args=(
+            args, usuario_id, dados['bill_id'], antes, medicoes, resultado))
+        espera.start()
+        time.sleep(args.atraso_pagamento)
+
+        # O stub mede a entrega do webhook (do envio ao 200)
+        pagamento = _sessao().post(f"{args.stub}/stub/pagar", json={'bill_id': dados['bill_id']}, timeout=30).json()
+        if pagamento.get('status_webhook') == 200:
+            medicoes.registrar('webhook', latencia_ms=pagamento['latencia_ms'])
+        else:
+            medicoes.falhar('webhook')
+        pago_em = time.perf_counter()
+
+        espera.join()
+        if 'confirmado_em' in resultado:
+            medicoes.registrar('confirmacao', latencia_ms=max(resultado['confirmado_em'] - pago_em, 0) * 1000)
+        else:
+            medicoes.falhar('confirmacao')
+    except (requests.exceptions.RequestException, ValueError):
+        medicoes.falhar('status')
+    finally:
+        usuarios.put((usuario_id, email))
+
+
+def _percentil(tempos, p):
+    if len(tempos) < 2:
+        return tempos[0] if tempos else 0.0
+    return statistics.quantiles(tempos, n=100)[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backend', default='http://127.0.0.1:5000')
+    parser.add_argument('--stub', default='http://127.0.0.1:5002')
+    parser.add_argument('--taxa', type=float, default=10, help='fluxos iniciados por segundo')
+    parser.add_argument('--duracao', type=float, default=30, help='segundos de carga')
+    parser.add_argument('--concorrencia', type=int, default=64, help='fluxos simultâneos (e usuários)')
+    parser.add_argument('--intervalo-status', type=float, default=0.05, help='segundos entre consultas de status')
+    parser.add_argument('--timeout-confirmacao', type=float, default=20)
+    parser.add_argument('--aguardar', action='store_true', help='confirma pelo long-poll em vez de consultar o status')
+    parser.add_argument('--atraso-pagamento', type=float, default=0.0, help='segundos entre o checkout e o pagamento')
+    parser.add_argument('--latencia-api', type=float, help='latência do stub no /billing/create')
+    parser.add_argument('--taxa-erro-api', type=float, help='fração de erros do stub no /billing/create')
+    args = parser.parse_args()
+
+    configuracao = {chave: valor for chave, valor in (
+        ('latencia', args.latencia_api), ('taxa_erro', args.taxa_erro_api)) if valor is not None}
+    # O benchmark comanda os webhooks; o envio automático duplicaria eventos
+    configuracao['webhook_automatico'] = False
+    requests.post(f"{args.stub}/stub/config", json=configuracao, timeout=10).raise_for_status()
+
+    print(f"👥 Criando {args.concorrencia} usuários de benchmark...")
+    usuarios = _criar_usuarios(args.backend, args.concorrencia)
+
+    medicoes = Medicoes()
+    total = int(args.taxa * args.duracao)
+    print(f"🚀 {total} fluxos a {args.taxa:g}/s ({PACOTE}, {CREDITOS} créditos cada)")
+
+    atraso_maximo = 0.0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        for numero in range(total):
+            horario = inicio + numero / args.taxa
+            espera = horario - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                atraso_maximo = max(atraso_maximo, -espera)
+            executor.submit(fluxo, args, usuarios, medicoes)
+    duracao = time.perf_counter() - inicio
+
+    confirmados = len(medicoes.latencias['confirmacao'])
+    print(f"\n📊 {confirmados}/{total} fluxos confirmados em {duracao:.1f} s "
+          f"({confirmados / duracao:.1f} fluxos/s)")
+    if atraso_maximo > 0.1:
+        print(f"⚠️ O gerador atrasou até {atraso_maximo * 1000:.0f} ms: aumente --concorrencia")
+    print(f"\n{'etapa':<16} {'ok':>6} {'erros':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'vazão/s':>8}")
+    for etapa in ETAPAS:
+        tempos = medicoes.latencias[etapa]
+        print(f"{etapa:<16} {len(tempos):>6} {medicoes.erros[etapa]:>6} "
+              f"{_percentil(tempos, 50):>9.1f} {_percentil(tempos, 95):>9.1f} {_percentil(tempos, 99):>9.1f} "
+              f"{len(tempos) / duracao:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
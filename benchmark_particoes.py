@@ -0,0 +1,205 @@
+"""
+Benchmark de escrita: audit_logs no layout antigo x particionado por mês.
+
+Cria num schema temporário (`benchmark_particoes`) as duas versões da tabela:
+
+    1. atual: tabela única com os seis índices B-tree de bancodedados.sql
+       (horário, usuário, tipo, recurso, IP e severidade);
+    2. particionada: partições mensais com BRIN no horário e só os B-tree
+       seletivos (migração 0006).
+
+Insere as mesmas linhas nas duas, em lotes como o EscritorAuditoria
+(`INSERT ... SELECT FROM jsonb_to_recordset`), com horários crescentes
+espalhados por --meses meses, e mostra linhas/s, latência por lote e o
+tamanho final de dados e índices. O schema é removido no fim.
+
+Uso (como dono do banco):
+    DATABASE_URL=postgres://... python benchmark_particoes.py --linhas 200000 --threads 4
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from database import conexao
+
+SCHEMA = 'benchmark_particoes'
+
+COLUNAS = """
+    log_id BIGSERIAL,
+    event_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    user_id UUID,
+    session_id UUID,
+    ip_address INET,
+    user_agent TEXT,
+    event_type VARCHAR(50) NOT NULL,
+    event_action VARCHAR(100) NOT NULL,
+    resource_type VARCHAR(50),
+    resource_id UUID,
+    old_data JSONB,
+    new_data JSONB,
+    changes JSONB,
+    http_method VARCHAR(10),
+    endpoint VARCHAR(255),
+    status_code INTEGER,
+    severity VARCHAR(20) DEFAULT 'info' CHECK (severity IN ('info', 'warning', 'critical')),
+    audit_metadata JSONB DEFAULT '{}'::jsonb
+"""
+
+LAYOUTS = {
+    'atual': f"""
+        CREATE TABLE {SCHEMA}.atual ({COLUNAS}, PRIMARY KEY (log_id));
+        CREATE INDEX ON {SCHEMA}.atual (user_id, event_time DESC);
+        CREATE INDEX ON {SCHEMA}.atual (event_time DESC);
+        CREATE INDEX ON {SCHEMA}.atual (event_type);
+        CREATE INDEX ON {SCHEMA}.atual (resource_type, resource_id);
+        CREATE INDEX ON {SCHEMA}.atual (ip_address);
+        CREATE INDEX ON {SCHEMA}.atual (severity);
+    """,
+    'particionada': f"""
+        CREATE TABLE {SCHEMA}.particionada ({COLUNAS}, PRIMARY KEY (log_id, event_time))
+            PARTITION BY RANGE (event_time);
+        CREATE INDEX ON {SCHEMA}.particionada USING BRIN (event_time);
+        CREATE INDEX ON {SCHEMA}.particionada (user_id, event_time DESC) WHERE user_id IS NOT NULL;
+        CREATE INDEX ON {SCHEMA}.particionada (resource_type, resource_id) WHERE resource_id IS NOT NULL;
+        CREATE TABLE {SCHEMA}.particionada_padrao PARTITION OF {SCHEMA}.particionada DEFAULT;
+    """
+}
+
+SQL_INSERIR = """
+    INSERT INTO {tabela} (event_time, user_id, ip_address, user_agent, event_type, event_action,
+                          resource_type, resource_id, http_method, endpoint, status_code,
+                          severity, audit_metadata)
+    SELECT event_time, user_id, ip_address, user_agent, event_type, event_action,
+           resource_type, resource_id, http_method, endpoint, status_code,
+           severity, audit_metadata
+    FROM jsonb_to_recordset(CAST(:eventos AS JSONB)) AS e(
+        event_time TIMESTAMPTZ, user_id UUID, ip_address INET, user_agent TEXT,
+        event_type VARCHAR(50), event_action VARCHAR(100), resource_type VARCHAR(50),
+        resource_id UUID, http_method VARCHAR(10), endpoint VARCHAR(255),
+        status_code INTEGER, severity VARCHAR(20), audit_metadata JSONB
+    )
+"""
+
+
+def _gerar_lotes(linhas, lote, meses):
+    """Lotes (JSON) com horários crescentes do mês mais antigo até agora"""
+    fim = datetime.now(timezone.utc)
+    inicio = fim - timedelta(days=30 * meses)
+    passo = (fim - inicio) / linhas
+    usuarios = [str(uuid.uuid4()) for _ in range(2000)]
+    acoes = [('login', 'login_sucesso', 'info'), ('login', 'login_falhou', 'warning'),
+             ('analise', 'analisar_documento', 'info'), ('data_change', 'criar_conta', 'info')]
+    lotes = []
+    for base in range(0, linhas, lote):
+        eventos = []
+        for numero in range(base, min(base + lote, linhas)):
+            event_type, event_action, severity = random.choice(acoes)
+            eventos.append({
+                'event_time': (inicio + passo * numero).isoformat(),
+                'user_id': random.choice(usuarios),
+                'ip_address': f"10.{random.randrange(256)}.{random.randrange(256)}.{random.randrange(1, 255)}",
+                'user_agent': 'Mozilla/5.0 (benchmark)',
+                'event_type': event_type,
+                'event_action': event_action,
+                'resource_type': 'documento' if event_type == 'analise' else None,
+                'resource_id': str(uuid.uuid4()) if event_type == 'analise' else None,
+                'http_method': 'POST',
+                'endpoint': '/login',
+                'status_code': 200,
+                'severity': severity,
+                'audit_metadata': {'numero': numero}
+            })
+        lotes.append(json.dumps(eventos))
+    return lotes
+
+
+def _criar_layouts(meses):
+    with conexao() as conn:
+        conn.run(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.run(f"CREATE SCHEMA {SCHEMA}")
+        for ddl in LAYOUTS.values():
+            conn.run(ddl)
+        # Partições mensais cobrindo o período gerado
+        agora = datetime.now(timezone.utc)
+        mes = datetime(agora.year, agora.month, 1, tzinfo=timezone.utc)
+        for _ in range(meses + 2):
+            proximo = datetime(mes.year + mes.month // 12, mes.month % 12 + 1, 1, tzinfo=timezone.utc)
+            conn.run(f"""
+                CREATE TABLE {SCHEMA}.particionada_{mes:%Y_%m} PARTITION OF {SCHEMA}.particionada
+                FOR VALUES FROM ('{mes.isoformat()}') TO ('{proximo.isoformat()}')
+            """)
+            mes = datetime(mes.year - (mes.month == 1), (mes.month - 2) % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _percentil(tempos, p):
+    if len(tempos) < 2:
+        return tempos[0] if tempos else 0.0
+    return statistics.quantiles(tempos, n=100)[p - 1]
+
+
+def _inserir(layout, lotes, threads):
+    sql = SQL_INSERIR.format(tabela=f"{SCHEMA}.{layout}")
+    latencias = []
+    lock = threading.Lock()
+
+    def gravar(eventos):
+        inicio = time.perf_counter()
+        with conexao() as conn:
+            conn.run(sql, eventos=eventos)
+        with lock:
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(gravar, lotes))
+    return time.perf_counter() - inicio, latencias
+
+
+def _tamanhos(layout):
+    """(MB de dados, MB de índices) somando as partições"""
+    with conexao() as conn:
+        dados, indices = conn.run("""
+            SELECT COALESCE(SUM(pg_table_size(relid)), 0), COALESCE(SUM(pg_indexes_size(relid)), 0)
+            FROM (
+                -- pg_partition_tree não lista tabelas comuns
+                SELECT relid FROM pg_partition_tree(to_regclass(:tabela))
+                UNION
+                SELECT to_regclass(:tabela)
+            ) tabelas
+        """, tabela=f"{SCHEMA}.{layout}")[0]
+    return dados / 1024 / 1024, indices / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--linhas', type=int, default=200000)
+    parser.add_argument('--lote', type=int, default=200, help='linhas por INSERT')
+    parser.add_argument('--threads', type=int, default=4, help='INSERTs simultâneos')
+    parser.add_argument('--meses', type=int, default=6, help='meses cobertos pelos horários')
+    args = parser.parse_args()
+
+    print(f"🧪 {args.linhas} linhas em lotes de {args.lote}, {args.threads} threads, {args.meses} meses")
+    lotes = _gerar_lotes(args.linhas, args.lote, args.meses)
+    _criar_layouts(args.meses)
+
+    try:
+        print(f"\n{'layout':<14} {'linhas/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'dados MB':>9} {'índices MB':>11}")
+        for layout in LAYOUTS:
+            duracao, latencias = _inserir(layout, lotes, args.threads)
+            dados, indices = _tamanhos(layout)
+            print(f"{layout:<14} {args.linhas / duracao:>10.0f} {_percentil(latencias, 50):>8.1f} "
+                  f"{_percentil(latencias, 99):>8.1f} {dados:>9.1f} {indices:>11.1f}")
+    finally:
+        with conexao() as conn:
+            conn.run(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark de entradas adversariais para as regras do CoreEngineJuridico.
+
+Para cada padrão do pacote de regras monta um documento (5 MB por padrão,
+por omissão) que repete a âncora e os termos intermediários do padrão sem
+nunca completar a sequência -- o pior caso para lacunas `.*?` -- e coloca o
+último termo apenas no final do texto, para que o pré-filtro de literais não
+descarte a regra. Cada regra precisa terminar dentro do orçamento de tempo
+(em segundos por MB) e as regras mais lentas são medidas de novo com um
+quinto do tamanho para confirmar que o custo cresce linearmente.
+
+Uso:
+    python benchmark_regras.py [--tamanho-mb 5] [--orcamento 2.0] [--regra multa]
+
+Sai com código 1 se alguma regra estourar o orçamento ou crescer mais que
+linearmente.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from core_juridico import (
+    CoreEngineJuridico, MotorVarredura, get_pacote_regras, _literais_obrigatorios
+)
+
+# Usado quando o padrão não tem literais (ex.: horários, valores em R$)
+TRECHO_GENERICO = "08H AS 2 23:00 22H 05 R$ 9 15 DIAS "
+
+# Crescimento linear dá razão ~5 entre 5x e 1x o tamanho; quadrático daria ~25
+RAZAO_MAXIMA_CRESCIMENTO = 10.0
+
+
+def montar_texto_adversarial(padrao, tamanho: int) -> str:
+    """Repete os termos iniciais do padrão e deixa o último só no final"""
+    _, literais, _ = _literais_obrigatorios(padrao)
+    literais = [literal.upper() for literal in literais]
+    if len(literais) >= 2:
+        unidade = " ".join(literais[:-1]) + " "
+        final = " " + literais[-1]
+    else:
+        unidade = (literais[0] + " " if literais else "") + TRECHO_GENERICO
+        final = ""
+    repeticoes = max(1, tamanho // len(unidade))
+    return unidade * repeticoes + final
+
+
+def medir_padrao(padrao, tamanho: int) -> float:
+    """Tempo de varredura de um único padrão sobre o seu texto adversarial"""
+    texto = montar_texto_adversarial(padrao, tamanho)
+    motor = MotorVarredura([padrao])
+    inicio = time.perf_counter()
+    motor.varrer(texto)
+    return time.perf_counter() - inicio
+
+
+def medir_regras(tamanho: int, orcamento: float, filtro: str = "") -> list:
+    """Mede cada padrão isoladamente; retorna [(segundos, regra, padrão)]"""
+    pacote = get_pacote_regras()
+    medicoes = []
+    for vid, config in pacote.violacoes.items():
+        if filtro and filtro not in vid:
+            continue
+        for padrao in config['padroes']:
+            decorrido = medir_padrao(padrao, tamanho)
+            medicoes.append((decorrido, vid, padrao))
+            marcador = "❌" if decorrido > orcamento else "✅"
+            print(f"{marcador} {decorrido:7.3f}s  {vid:40s} {padrao.pattern[:60]}")
+    return medicoes
+
+
+def verificar_linearidade(medicoes: list, tamanho: int) -> list:
+    """Mede de novo as regras mais lentas com 1/5 do tamanho; retorna as super-lineares"""
+    super_lineares = []
+    print("\n📈 Crescimento (5x o tamanho):")
+    for decorrido, vid, padrao in medicoes:
+        menor = medir_padrao(padrao, tamanho // 5)
+        razao = decorrido / max(menor, 1e-6)
+        marcador = "❌" if razao > RAZAO_MAXIMA_CRESCIMENTO else "✅"
+        print(f"   {marcador} {razao:5.1f}x  {vid}  {padrao.pattern[:60]}")
+        if razao > RAZAO_MAXIMA_CRESCIMENTO:
+            super_lineares.append((razao, vid, padrao))
+    return super_lineares
+
+
+def medir_documento_completo(tamanho: int) -> None:
+    """Análise completa de um documento que mistura os trechos de todas as regras"""
+    pacote = get_pacote_regras()
+    unidades = []
+    for config in pacote.violacoes.values():
+        for padrao in config['padroes']:
+            unidades.append(montar_texto_adversarial(padrao, 200))
+    bloco = " ".join(unidades)
+    texto = (bloco + " ") * max(1, tamanho // len(bloco))
+
+    detector = CoreEngineJuridico(pacote)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = detector.analisar_documento_completo(texto)
+    decorrido = time.perf_counter() - inicio
+    print(f"\n📄 Documento completo ({len(texto) / 1e6:.1f} MB): {decorrido:.2f}s, "
+          f"{len(resultado['violacoes'])} violações")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tamanho-mb', type=float, default=5.0)
+    parser.add_argument('--orcamento', type=float, default=2.0,
+                        help='tempo máximo por regra, em segundos por MB de texto')
+    parser.add_argument('--regra', default='', help='mede só as regras cujo id contém este texto')
+    parser.add_argument('--sem-documento', action='store_true',
+                        help='não executa a análise completa do documento misto')
+    args = parser.parse_args()
+
+    tamanho = int(args.tamanho_mb * 1_000_000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_pacote_regras()
+
+    orcamento = args.orcamento * args.tamanho_mb
+    print(f"⏱️ Orçamento: {orcamento:.2f}s por regra em textos de {args.tamanho_mb} MB\n")
+    medicoes = medir_regras(tamanho, orcamento, args.regra)
+    estouros = [m for m in medicoes if m[0] > orcamento]
+
+    medicoes.sort(key=lambda medicao: medicao[0], reverse=True)
+    print("\n🐢 Regras mais lentas:")
+    for decorrido, vid, padrao in medicoes[:5]:
+        print(f"   {decorrido:7.3f}s  {vid}  {padrao.pattern[:60]}")
+    super_lineares = verificar_linearidade(medicoes[:5], tamanho)
+
+    if not args.sem_documento:
+        medir_documento_completo(tamanho)
+
+    if estouros or super_lineares:
+        print(f"\n❌ {len(estouros)} regra(s) acima do orçamento, "
+              f"{len(super_lineares)} com crescimento super-linear")
+        sys.exit(1)
+    print(f"\n✅ Todos os {len(medicoes)} padrões dentro do orçamento e com custo linear")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,4 @@
 import streamlit as st
-import pdfplumber
 import re
 import unicodedata
 from datetime import datetime
@@ -12,6 +11,8 @@ import json
 
 # IMPORTAR o Core Engine Jurídico do arquivo separado
 from core_juridico import CoreEngineJuridico
+from cache_analises import get_cache_analises, hash_documento
+from extracao_pdf import get_pool_extracao, ErroExtracao
 
 # --------------------------------------------------
 # CONFIGURAÇÃO DO MODO ESPECIALISTA
@@ -28,16 +29,10 @@ st.set_page_config(
 # --------------------------------------------------
 
 def extrair_texto_pdf(arquivo):
-    """Extrai texto de PDF com tratamento robusto"""
+    """Extrai texto de PDF com tratamento robusto (páginas em paralelo)"""
     try:
-        with pdfplumber.open(arquivo) as pdf:
-            texto = ""
-            for pagina in pdf.pages:
-                texto_pagina = pagina.extract_text()
-                if texto_pagina:
-                    texto += texto_pagina + "\n"
-            return texto if texto.strip() else None
-    except Exception as e:
+        return get_pool_extracao().extrair_texto(arquivo.getvalue())
+    except ErroExtracao as e:
         st.error(f"❌ Erro ao processar PDF: {str(e)}")
         return None
 
@@ -118,11 +113,18 @@ def main():
     
     if arquivo:
         with st.spinner("🔍 MODO ESPECIALISTA ATIVADO - Escaneando estruturas jurídicas..."):
-            texto = extrair_texto_pdf(arquivo)
+            # O Streamlit re-executa o script a cada interação: o mesmo PDF
+            # reaproveita a análise guardada em memória
+            cache_analises = get_cache_analises()
+            documento = hash_documento(arquivo.getvalue())
+            resultado = cache_analises.obter(documento)
+            texto = None if resultado else extrair_texto_pdf(arquivo)
             
-            if texto:
+            if resultado or texto:
                 # Análise completa
-                resultado = detector.analisar_documento_completo(texto)
+                if resultado is None:
+                    resultado = detector.analisar_documento_completo(texto)
+                    cache_analises.guardar(documento, resultado)
                 
                 # Métricas principais
                 col1, col2, col3, col4 = st.columns(4)
@@ -0,0 +1,254 @@
+"""
+Cache de resultados de análise endereçado pelo conteúdo do documento.
+
+A chave é o SHA-256 dos bytes enviados mais a versão do pacote de regras
+(`PacoteRegras.versao`): o mesmo PDF reenviado (após login, após comprar
+créditos, do celular e do computador) reaproveita o resultado sem rodar
+pdfplumber nem o CoreEngineJuridico de novo, e qualquer mudança nas regras
+gera chaves novas automaticamente.
+
+Dois níveis:
+    1. Memória do processo: LRU limitado por número de itens e por bytes
+       (tamanho do resultado serializado), com despejo do menos usado.
+    2. PostgreSQL (tabela analises_cache): compartilhado por todos os workers
+       do gunicorn, podado periodicamente pelo total de bytes.
+
+Resultados de outras versões das regras não são removidos pelos workers:
+durante um deploy gradual, workers antigos e novos convivem, cada um com
+suas chaves. A remoção é um passo de manutenção, depois do deploy, e só
+alcança versões sem acesso há CACHE_VERSOES_ANTIGAS_HORAS horas (as que
+nenhum worker ainda usa):
+
+    python cache_analises.py --versoes-antigas
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core_juridico import get_pacote_regras
+from database import get_db_connection
+
+# Limites do nível em memória (por processo)
+CACHE_MEMORIA_MAX_BYTES = int(os.getenv('CACHE_ANALISES_MEMORIA_MB', '64')) * 1024 * 1024
+CACHE_MEMORIA_MAX_ITENS = int(os.getenv('CACHE_ANALISES_MEMORIA_ITENS', '2000'))
+
+# Resultados maiores que esta fração do limite não entram na memória, para que
+# um único documento gigante não despeje o cache inteiro
+FRACAO_MAXIMA_ITEM = 8
+
+# Limite do nível PostgreSQL e frequência da poda (em gravações)
+CACHE_BANCO_MAX_BYTES = int(os.getenv('CACHE_ANALISES_BANCO_MB', '1024')) * 1024 * 1024
+PODAR_BANCO_A_CADA = 100
+# Versões de regras sem acesso há mais que isso saem na manutenção
+CACHE_VERSOES_ANTIGAS_HORAS = float(os.getenv('CACHE_ANALISES_VERSOES_ANTIGAS_HORAS', '24'))
+
+
+def hash_documento(conteudo: bytes) -> str:
+    """SHA-256 (hex) dos bytes do documento enviado"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class CacheAnalises:
+    """Cache em dois níveis (memória LRU + PostgreSQL) de resultados de análise"""
+
+    def __init__(self, conectar: Optional[Callable[[], Any]] = None,
+                 max_bytes: int = CACHE_MEMORIA_MAX_BYTES,
+                 max_itens: int = CACHE_MEMORIA_MAX_ITENS):
+        # `conectar` devolve uma conexão pg8000.native (ou None); sem ela o
+        # cache funciona só em memória
+        self.conectar = conectar
+        self.max_bytes = max_bytes
+        self.max_itens = max_itens
+        self.versao = get_pacote_regras().versao
+
+        # documento -> (resultado serializado, tamanho em bytes)
+        self._memoria: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._bytes = 0
+        self._gravacoes_desde_poda = 0
+        self._lock = threading.Lock()
+        self._contadores = {
+            'hits_memoria': 0,
+            'hits_banco': 0,
+            'misses': 0,
+            'gravacoes': 0,
+            'despejos': 0,
+            'erros_banco': 0
+        }
+
+    def _contar(self, contador: str) -> None:
+        with self._lock:
+            self._contadores[contador] += 1
+
+    # ----- nível em memória -----
+
+    def _guardar_memoria(self, documento: str, serializado: str) -> None:
+        tamanho = len(serializado.encode('utf-8'))
+        if tamanho > self.max_bytes // FRACAO_MAXIMA_ITEM:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(documento, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._memoria[documento] = (serializado, tamanho)
+            self._bytes += tamanho
+            while self._memoria and (self._bytes > self.max_bytes or len(self._memoria) > self.max_itens):
+                _, (_, despejado) = self._memoria.popitem(last=False)
+                self._bytes -= despejado
+                self._contadores['despejos'] += 1
+
+    # ----- nível PostgreSQL -----
+
+    def _executar_banco(self, sql: str, **parametros) -> Optional[list]:
+        if not self.conectar:
+            return None
+        conn = None
+        try:
+            conn = self.conectar()
+            if not conn:
+                return None
+            return conn.run(sql, **parametros)
+        except Exception as e:
+            self._contar('erros_banco')
+            print(f"⚠️ Cache de análises (banco) indisponível: {e}")
+            return None
+        finally:
+            if conn:
+                conn.close()
+
+    def remover_versoes_antigas(self, horas: float = CACHE_VERSOES_ANTIGAS_HORAS) -> int:
+        """
+        Remove do banco os resultados de outras versões das regras sem acesso
+        há mais de `horas` horas; devolve quantos removeu. Passo de
+        manutenção: versões ainda em uso por algum worker continuam sendo
+        acessadas e ficam.
+        """
+        removidos = self._executar_banco("""
+            WITH removidos AS (
+                DELETE FROM analises_cache
+                WHERE versao_regras <> :versao
+                  AND acessado_em < NOW() - make_interval(secs => CAST(:segundos AS DOUBLE PRECISION))
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM removidos
+        """, versao=self.versao, segundos=horas * 3600)
+        return removidos[0][0] if removidos else 0
+
+    def _podar_banco(self) -> None:
+        """Mantém a tabela abaixo do limite de bytes, removendo os menos acessados"""
+        self._executar_banco("""
+            DELETE FROM analises_cache
+            WHERE (documento_sha256, versao_regras) IN (
+                SELECT documento_sha256, versao_regras FROM (
+                    SELECT documento_sha256, versao_regras,
+                           SUM(tamanho_bytes) OVER (ORDER BY acessado_em DESC) AS acumulado
+                    FROM analises_cache
+                ) t
+                WHERE acumulado > :limite
+            )
+        """, limite=CACHE_BANCO_MAX_BYTES)
+
+    # ----- API pública -----
+
+    def obter(self, documento: str) -> Optional[Dict]:
+        """Resultado da análise do documento (hash SHA-256) ou None"""
+        with self._lock:
+            item = self._memoria.get(documento)
+            if item is not None:
+                self._memoria.move_to_end(documento)
+                self._contadores['hits_memoria'] += 1
+        if item is not None:
+            # Cada chamador recebe sua própria cópia
+            return json.loads(item[0])
+
+        linhas = self._executar_banco("""
+            UPDATE analises_cache
+            SET acessado_em = NOW(), acessos = acessos + 1
+            WHERE documento_sha256 = :documento AND versao_regras = :versao
+            RETURNING resultado
+        """, documento=documento, versao=self.versao)
+        if linhas:
+            resultado = linhas[0][0]
+            if isinstance(resultado, str):
+                resultado = json.loads(resultado)
+            self._guardar_memoria(documento, json.dumps(resultado, ensure_ascii=False))
+            self._contar('hits_banco')
+            return resultado
+
+        self._contar('misses')
+        return None
+
+    def guardar(self, documento: str, resultado: Dict) -> None:
+        """Guarda o resultado da análise do documento nos dois níveis"""
+        serializado = json.dumps(resultado, ensure_ascii=False)
+        self._guardar_memoria(documento, serializado)
+        self._contar('gravacoes')
+
+        self._executar_banco("""
+            INSERT INTO analises_cache (documento_sha256, versao_regras, resultado, tamanho_bytes)
+            VALUES (:documento, :versao, CAST(:resultado AS JSONB), :tamanho)
+            ON CONFLICT (documento_sha256, versao_regras) DO UPDATE
+            SET resultado = EXCLUDED.resultado, acessado_em = NOW()
+        """, documento=documento, versao=self.versao, resultado=serializado,
+            tamanho=len(serializado.encode('utf-8')))
+
+        with self._lock:
+            self._gravacoes_desde_poda += 1
+            podar = self._gravacoes_desde_poda >= PODAR_BANCO_A_CADA
+            if podar:
+                self._gravacoes_desde_poda = 0
+        if podar:
+            self._podar_banco()
+
+    def limpar(self) -> None:
+        """Esvazia o nível em memória deste processo"""
+        with self._lock:
+            self._memoria.clear()
+            self._bytes = 0
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores de acerto/erro e ocupação do nível em memória"""
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas['itens_memoria'] = len(self._memoria)
+            estatisticas['bytes_memoria'] = self._bytes
+        consultas = estatisticas['hits_memoria'] + estatisticas['hits_banco'] + estatisticas['misses']
+        acertos = estatisticas['hits_memoria'] + estatisticas['hits_banco']
+        estatisticas['taxa_acerto'] = round(acertos / consultas, 4) if consultas else 0.0
+        estatisticas['versao_regras'] = self.versao
+        return estatisticas
+
+
+_cache_analises: Optional[CacheAnalises] = None
+_cache_analises_lock = threading.Lock()
+
+def get_cache_analises(conectar: Optional[Callable[[], Any]] = None) -> CacheAnalises:
+    """Retorna o cache de análises do processo, criando-o na primeira chamada"""
+    global _cache_analises
+    if _cache_analises is None:
+        with _cache_analises_lock:
+            if _cache_analises is None:
+                _cache_analises = CacheAnalises(conectar)
+    return _cache_analises
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--versoes-antigas', action='store_true',
+                        help='remove resultados de outras versões das regras sem acesso recente')
+    parser.add_argument('--horas', type=float, default=CACHE_VERSOES_ANTIGAS_HORAS)
+    args = parser.parse_args()
+
+    cache = CacheAnalises(get_db_connection)
+    print(f"📦 Versão atual das regras: {cache.versao}")
+    if args.versoes_antigas:
+        removidos = cache.remover_versoes_antigas(args.horas)
+        print(f"🧹 {removidos} análises em cache de regras antigas removidas")
+
+
+if __name__ == '__main__':
+    main()
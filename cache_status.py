@@ -0,0 +1,122 @@
+"""
+Cache em memória do status (burocréditos e plano) de cada usuário.
+
+O saldo e o plano só mudam quando um pagamento é creditado (ou créditos são
+debitados), mas /status-pagamento e o login consultavam o banco a cada
+chamada. Aqui cada processo guarda o status por usuário:
+
+    - leitura com carga sob demanda (`obter(usuario_id, carregar)`), com
+      TTL curto (CACHE_STATUS_TTL) como rede de segurança;
+    - quem altera créditos emite `pg_notify('status_usuario', user_id)` no
+      próprio comando que altera o saldo (crédito da compra em
+      webhook_abacate.py, reserva e devolução em creditos.py); todos os
+      processos escutam o canal (conexão do notificacoes_pagamento) e
+      descartam a entrada assim que a transação é confirmada;
+    - se a escuta cair ou recomeçar, o cache inteiro é descartado;
+    - uma carga que começou antes de uma invalidação não é guardada, para
+      não repor um valor já desatualizado;
+    - LRU limitado por CACHE_STATUS_MAX_ITENS e taxa de acerto em
+      `estatisticas()`.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from notificacoes_pagamento import get_ouvinte_pagamentos
+
+CANAL_STATUS = 'status_usuario'
+CACHE_STATUS_TTL = float(os.getenv('CACHE_STATUS_TTL', '30'))
+CACHE_STATUS_MAX_ITENS = int(os.getenv('CACHE_STATUS_MAX_ITENS', '10000'))
+
+
+class CacheStatusUsuarios:
+    """Status por usuário com TTL, invalidado por notificação"""
+
+    def __init__(self, ttl: float = CACHE_STATUS_TTL, max_itens: int = CACHE_STATUS_MAX_ITENS):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        # usuario_id -> (expira_em, status)
+        self._itens: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        # Muda a cada invalidação: cargas iniciadas antes dela não são guardadas
+        self._geracao = 0
+        self._lock = threading.Lock()
+        self._contadores = {
+            'hits': 0,
+            'misses': 0,
+            'expirados': 0,
+            'invalidacoes': 0,
+            'descartes_totais': 0,
+            'despejos': 0
+        }
+
+    def obter(self, usuario_id: str, carregar: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Status do usuário, da memória ou de `carregar()` (que consulta o
+        banco). None (usuário inexistente) não é guardado; exceções de
+        `carregar` passam para o chamador.
+        """
+        chave = str(usuario_id)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                if item[0] > agora:
+                    self._itens.move_to_end(chave)
+                    self._contadores['hits'] += 1
+                    return dict(item[1])
+                del self._itens[chave]
+                self._contadores['expirados'] += 1
+            self._contadores['misses'] += 1
+            geracao = self._geracao
+
+        status = carregar()
+        if status is None:
+            return None
+
+        with self._lock:
+            if self._geracao == geracao:
+                self._itens[chave] = (time.monotonic() + self.ttl, dict(status))
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+                    self._contadores['despejos'] += 1
+        return status
+
+    def invalidar(self, usuario_id: Optional[str]) -> None:
+        """Descarta o status do usuário; None descarta tudo"""
+        with self._lock:
+            self._geracao += 1
+            if usuario_id is None:
+                self._itens.clear()
+                self._contadores['descartes_totais'] += 1
+            elif self._itens.pop(str(usuario_id), None) is not None:
+                self._contadores['invalidacoes'] += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas['itens'] = len(self._itens)
+        consultas = estatisticas['hits'] + estatisticas['misses']
+        estatisticas['taxa_acerto'] = round(estatisticas['hits'] / consultas, 4) if consultas else 0.0
+        estatisticas['ttl_s'] = self.ttl
+        return estatisticas
+
+
+_cache_status: Optional[CacheStatusUsuarios] = None
+_cache_status_lock = threading.Lock()
+
+def get_cache_status() -> CacheStatusUsuarios:
+    """Cache do processo, inscrito nas notificações de status quando há banco"""
+    global _cache_status
+    if _cache_status is None:
+        with _cache_status_lock:
+            if _cache_status is None:
+                cache = CacheStatusUsuarios()
+                ouvinte = get_ouvinte_pagamentos()
+                if ouvinte:
+                    ouvinte.assinar(CANAL_STATUS, cache.invalidar)
+                _cache_status = cache
+    return _cache_status
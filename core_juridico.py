@@ -1,6 +1,21 @@
 import re
+import json
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
 import unicodedata
-from typing import Dict, List, Tuple, Any
+from types import MappingProxyType
+from typing import Dict, List, Tuple, Any, Optional, Iterable
+
+# Requer Python 3.11+: grupos atômicos `(?>...)` nas janelas de proximidade.
+# O analisador de regex do CPython (módulo privado, `sre_parse` antes do 3.11)
+# só alimenta o pré-filtro do MotorVarredura; sem ele, ou se a sua interface
+# mudar, os padrões são executados sem pré-filtro, com o mesmo resultado.
+try:
+    from re import _parser as _sre_parse
+except ImportError:
+    _sre_parse = None
 
 # --------------------------------------------------
 # CORE ENGINE JURÍDICO - VERSÃO CORRIGIDA
@@ -16,15 +31,19 @@ class CoreEngineJuridico:
     ╚═════╝  ╚═════╝ ╚═╝  ╚═╝ ╚═════╝  ╚═════╝╚═╝  ╚═╝╚═╝  ╚═╝   ╚═╝   ╚═╝  ╚═╝
     """
     
-    def __init__(self):
-        print("⚖️ Inicializando CoreEngineJuridico...")
-        self.base_legal = self._carregar_base_legal_completa()
-        self.palavras_ambiguas = self._carregar_termos_ambiguos()
-        self.omissoes_criticas = self._carregar_omissoes()
-        self.violacoes = self._carregar_violacoes_especialista()
-        print(f"✅ CoreEngineJuridico inicializado com {len(self.violacoes)} padrões de violação")
+    def __init__(self, pacote: Optional['PacoteRegras'] = None):
+        # As regras são compiladas uma única vez por processo e compartilhadas
+        # (somente leitura) entre todas as instâncias e threads.
+        self.pacote = pacote or get_pacote_regras()
+        self.base_legal = self.pacote.base_legal
+        self.palavras_ambiguas = self.pacote.palavras_ambiguas
+        self.omissoes_criticas = self.pacote.omissoes_criticas
+        self.violacoes = self.pacote.violacoes
+        self.padroes_leoninos = self.pacote.padroes_leoninos
+        self.motor = self.pacote.motor
         
-    def _carregar_base_legal_completa(self) -> Dict:
+    @staticmethod
+    def _carregar_base_legal_completa() -> Dict:
         """Base de dados jurídica completa para cross-reference"""
         return {
             'CLT': {
@@ -148,7 +167,8 @@ class CoreEngineJuridico:
             }
         }
     
-    def _carregar_termos_ambiguos(self) -> Dict[str, List[str]]:
+    @staticmethod
+    def _carregar_termos_ambiguos() -> Dict[str, List[str]]:
         """Termos que geram ambiguidade jurídica"""
         print("📚 Carregando termos ambíguos...")
         termos = {
@@ -209,7 +229,8 @@ class CoreEngineJuridico:
         print(f"✅ {len(termos)} categorias de termos ambíguos carregadas")
         return termos
     
-    def _carregar_omissoes(self) -> Dict[str, Dict[str, List[str]]]:
+    @staticmethod
+    def _carregar_omissoes() -> Dict[str, Dict[str, List[str]]]:
         """Detecta omissões críticas no contrato"""
         print("📋 Carregando padrões de omissão...")
         omissoes = {
@@ -310,7 +331,8 @@ class CoreEngineJuridico:
         print(f"✅ {len(omissoes)} categorias de omissão carregadas")
         return omissoes
     
-    def _carregar_violacoes_especialista(self) -> Dict:
+    @staticmethod
+    def _carregar_violacoes_especialista(palavras_ambiguas: Dict[str, List[str]]) -> Dict:
         """Base expandida com todas as violações e referências legais"""
         print("🚨 Carregando violações...")
         
@@ -786,7 +808,7 @@ class CoreEngineJuridico:
         }
         
         # Adicionar padrões de ambiguidade como violações
-        for nome, padroes in self.palavras_ambiguas.items():
+        for nome, padroes in palavras_ambiguas.items():
             violacoes_base[f'ambiguidade_{nome}'] = {
                 'nome': f'⚠️ TERMO AMBÍGUO: {nome.upper()}',
                 'tipo': 'AMBIGUIDADE',
@@ -803,41 +825,69 @@ class CoreEngineJuridico:
         print(f"✅ {len(violacoes_base)} padrões de violação carregados")
         return violacoes_base
     
+    @staticmethod
+    def _carregar_padroes_leoninos() -> List[Tuple[str, str]]:
+        """Padrões de desequilíbrio contratual (cláusulas leoninas)"""
+        return [
+            (r'única.*?responsabilidade', 'Responsabilidade unilateral'),
+            (r'todos.*?ônus.*?para', 'Concentração de ônus'),
+            (r'todos.*?direitos.*?para', 'Concentração de direitos'),
+            (r'não.*?cabe.*?contestação', 'Vedação de contestação'),
+            (r'renuncia.*?antecipada', 'Renúncia antecipada de direitos'),
+            (r'sem.*?direito.*?de.*?arrependimento', 'Vedação de arrependimento'),
+            (r'sem.*?possibilidade.*?de.*?revisão', 'Vedação de revisão')
+        ]
+    
     def _normalizar_texto(self, texto: str) -> str:
         """Normalização avançada para análise jurídica"""
         if not texto:
             return ""
         
-        # Versão normalizada para busca
-        texto = texto.upper()
-        texto = unicodedata.normalize('NFKD', texto)
-        texto = ''.join([c for c in texto if not unicodedata.combining(c)])
-        texto = re.sub(r'\s+', ' ', texto)
-        
-        return texto
+        # Versão normalizada para busca (tabela de tradução pré-calculada)
+        return _ESPACOS_REPETIDOS.sub(' ', texto.translate(_TABELA_NORMALIZACAO))
+    
+    def _localizar_trecho(self, normalizado: 'TextoNormalizado', match: re.Match) -> Dict:
+        """
+        Trecho encontrado e o contexto ao redor dele. `inicio`/`fim` são
+        posições dentro de `contexto` (o cliente não recebe o texto extraído),
+        prontas para destacar o trecho.
+        """
+        inicio, fim = normalizado.intervalo_original(match.start(), match.end())
+        original = normalizado.original
+        comeco = max(0, inicio - TAMANHO_CONTEXTO)
+        contexto = original[comeco:fim + TAMANHO_CONTEXTO]
+        if len(contexto) > LIMITE_CONTEXTO:
+            contexto = contexto[:LIMITE_CONTEXTO] + '...'
+        return {
+            'inicio': inicio - comeco,
+            'fim': min(fim - comeco, LIMITE_CONTEXTO),
+            'trecho': original[inicio:fim],
+            'contexto': contexto
+        }
     
-    def _analisar_ambiguidade(self, texto_normalizado: str) -> List[Dict]:
+    def _analisar_ambiguidade(self, ocorrencias: Dict[re.Pattern, List[re.Match]],
+                              normalizado: 'TextoNormalizado') -> List[Dict]:
         """Parsing de Ambiguidade - identifica termos vagos"""
         violacoes = []
         
         for nome_termo, padroes in self.palavras_ambiguas.items():
             for padrao in padroes:
-                matches = re.finditer(padrao, texto_normalizado, re.IGNORECASE)
-                for match in matches:
+                for match in ocorrencias[padrao]:
+                    local = self._localizar_trecho(normalizado, match)
                     violacoes.append({
                         'tipo': 'AMBIGUIDADE',
                         'nome': f'Termo ambíguo: {nome_termo}',
-                        'descricao': f'Expressão vaga "{match.group()}" encontrada. Gera risco de interpretação divergente.',
+                        'descricao': f'Expressão vaga "{local["trecho"]}" encontrada. Gera risco de interpretação divergente.',
                         'gravidade': 'MÉDIA',
                         'cor': '#ffaa44',
-                        'contexto': match.group(),
                         'lei': 'Art. 112 CC - Interpretação dos negócios jurídicos',
-                        'solucao': 'Defina objetivamente prazos, valores e condições.'
+                        'solucao': 'Defina objetivamente prazos, valores e condições.',
+                        **local
                     })
         
         return violacoes
     
-    def _analisar_omissoes(self, texto_normalizado: str, tipo_documento: str) -> List[Dict]:
+    def _analisar_omissoes(self, ocorrencias: Dict[re.Pattern, List[re.Match]], tipo_documento: str) -> List[Dict]:
         """Shadow Analysis - identifica o que não foi dito"""
         violacoes = []
         
@@ -847,7 +897,7 @@ class CoreEngineJuridico:
         for clausula, padroes in self.omissoes_criticas[tipo_documento].items():
             encontrou = False
             for padrao in padroes:
-                if re.search(padrao, texto_normalizado, re.IGNORECASE):
+                if ocorrencias[padrao]:
                     encontrou = True
                     break
             
@@ -865,22 +915,13 @@ class CoreEngineJuridico:
         
         return violacoes
     
-    def _detectar_clausulas_leoninas(self, texto_normalizado: str) -> List[Dict]:
+    def _detectar_clausulas_leoninas(self, ocorrencias: Dict[re.Pattern, List[re.Match]],
+                                     normalizado: 'TextoNormalizado') -> List[Dict]:
         """Detecta desequilíbrios contratuais"""
         violacoes = []
         
-        padroes_leoninos = [
-            (r'única.*?responsabilidade', 'Responsabilidade unilateral'),
-            (r'todos.*?ônus.*?para', 'Concentração de ônus'),
-            (r'todos.*?direitos.*?para', 'Concentração de direitos'),
-            (r'não.*?cabe.*?contestação', 'Vedação de contestação'),
-            (r'renuncia.*?antecipada', 'Renúncia antecipada de direitos'),
-            (r'sem.*?direito.*?de.*?arrependimento', 'Vedação de arrependimento'),
-            (r'sem.*?possibilidade.*?de.*?revisão', 'Vedação de revisão')
-        ]
-        
-        for padrao, descricao in padroes_leoninos:
-            if re.search(padrao, texto_normalizado, re.IGNORECASE):
+        for padrao, descricao in self.padroes_leoninos:
+            if ocorrencias[padrao]:
                 violacoes.append({
                     'tipo': 'LEONINA',
                     'nome': f'CLÁUSULA LEONINA: {descricao}',
@@ -888,7 +929,8 @@ class CoreEngineJuridico:
                     'gravidade': 'CRÍTICA',
                     'cor': '#ff0000',
                     'lei': 'Art. 51, CDC e Art. 157 CC',
-                    'solucao': 'Cláusula leonina é nula de pleno direito.'
+                    'solucao': 'Cláusula leonina é nula de pleno direito.',
+                    **self._localizar_trecho(normalizado, ocorrencias[padrao][0])
                 })
         
         return violacoes
@@ -952,28 +994,29 @@ class CoreEngineJuridico:
             }
             return resultado
         
-        # Normalizar texto
-        texto_normalizado = self._normalizar_texto(texto_original)
+        # Normalizar texto (com mapa de posições para o texto original)
+        normalizado = TextoNormalizado(texto_original)
+        texto_normalizado = normalizado.texto
         
         # Detectar tipo de documento
         tipo_doc = self._detectar_tipo_por_palavras_chave(texto_normalizado)
         resultado['tipo_documento'] = tipo_doc
         print(f"📋 Tipo de documento detectado: {tipo_doc}")
         
+        # Varredura única: todas as ocorrências de todos os padrões do pacote
+        ocorrencias, executados = self.motor.varrer(texto_normalizado)
+        print(f"⚡ Pré-filtro: {executados} de {len(self.motor.padroes)} padrões executados")
+        
         # Módulo 1: Detecção de violações conhecidas
         print("🔍 Buscando violações conhecidas...")
         ids_encontrados = set()
         for vid, config in self.violacoes.items():
             for padrao in config.get('padroes', []):
                 try:
-                    if re.search(padrao, texto_normalizado, re.IGNORECASE):
+                    if ocorrencias[padrao]:
                         if vid not in ids_encontrados:
                             ids_encontrados.add(vid)
                             
-                            # Extrair contexto
-                            pos = texto_normalizado.find(padrao[:20].upper())
-                            contexto = texto_original[max(0, pos-100):min(len(texto_original), pos+200)] if pos > 0 else texto_original[:300]
-                            
                             violacao = {
                                 'id': vid,
                                 'nome': config['nome'],
@@ -983,7 +1026,8 @@ class CoreEngineJuridico:
                                 'lei': config['lei'],
                                 'solucao': config['solucao'],
                                 'cor': config['cor'],
-                                'contexto': contexto[:200] + '...' if len(contexto) > 200 else contexto
+                                # Posição e contexto vêm direto da primeira ocorrência
+                                **self._localizar_trecho(normalizado, ocorrencias[padrao][0])
                             }
                             
                             # Adicionar campos extras se existirem
@@ -1001,17 +1045,17 @@ class CoreEngineJuridico:
         print(f"✅ {len(ids_encontrados)} violações conhecidas encontradas")
         
         # Módulo 2: Análise de ambiguidade
-        ambiguidades = self._analisar_ambiguidade(texto_normalizado)
+        ambiguidades = self._analisar_ambiguidade(ocorrencias, normalizado)
         resultado['violacoes'].extend(ambiguidades)
         print(f"🔍 {len(ambiguidades)} termos ambíguos encontrados")
         
         # Módulo 3: Análise de omissões
-        omissoes = self._analisar_omissoes(texto_normalizado, tipo_doc)
+        omissoes = self._analisar_omissoes(ocorrencias, tipo_doc)
         resultado['violacoes'].extend(omissoes)
         print(f"📋 {len(omissoes)} omissões críticas encontradas")
         
         # Módulo 4: Detecção de cláusulas leoninas
-        leoninas = self._detectar_clausulas_leoninas(texto_normalizado)
+        leoninas = self._detectar_clausulas_leoninas(ocorrencias, normalizado)
         resultado['violacoes'].extend(leoninas)
         print(f"🦁 {len(leoninas)} cláusulas leoninas encontradas")
         
@@ -1101,3 +1145,566 @@ class CoreEngineJuridico:
         if max_score >= 3:
             return max(scores, key=scores.get)
         return 'INDEFINIDO'
+
+
+# --------------------------------------------------
+# NORMALIZAÇÃO DE TEXTO
+# --------------------------------------------------
+
+def _normalizar_caractere(caractere: str) -> str:
+    """Maiúsculas, NFKD e remoção de acentos para um único caractere"""
+    decomposto = unicodedata.normalize('NFKD', caractere.upper())
+    normalizado = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    # Qualquer espaço (inclusive os que surgem da decomposição) vira ' '
+    return re.sub(r'\s', ' ', normalizado)
+
+
+class _TabelaNormalizacao(dict):
+    """
+    Tabela para `str.translate`. Latin-1, Latin Extended-A/B e pontuação geral
+    são pré-calculados; os demais caracteres são calculados no primeiro uso e
+    guardados. Como maiúsculas e NFKD são definidos caractere a caractere (e
+    todas as marcas reordenadas pela forma canônica são descartadas), traduzir
+    o texto inteiro equivale a normalizá-lo de uma vez.
+    """
+
+    FAIXAS_PRE_CALCULADAS = ((0x0000, 0x0250), (0x1E00, 0x1F00), (0x2000, 0x2070))
+
+    def __init__(self):
+        super().__init__()
+        for inicio, fim in self.FAIXAS_PRE_CALCULADAS:
+            for codigo in range(inicio, fim):
+                self[codigo] = _normalizar_caractere(chr(codigo))
+
+    def __missing__(self, codigo: int) -> str:
+        normalizado = _normalizar_caractere(chr(codigo))
+        self[codigo] = normalizado
+        return normalizado
+
+
+_TABELA_NORMALIZACAO = _TabelaNormalizacao()
+
+# Caracteres que não viram exatamente um caractere (acentos combinantes,
+# ligaduras, 'ß' -> 'SS'...) ou que estão fora das faixas pré-calculadas.
+# Se nenhum aparecer no texto, a tradução preserva as posições.
+_CARACTERES_DESALINHADOS = re.compile('[{}{}]'.format(
+    ''.join(re.escape(chr(codigo)) for codigo, valor in _TABELA_NORMALIZACAO.items()
+            if len(valor) != 1),
+    ''.join(f'\\u{fim:04x}-\\u{inicio - 1:04x}' for (_, fim), (inicio, _)
+            in zip(_TabelaNormalizacao.FAIXAS_PRE_CALCULADAS,
+                   _TabelaNormalizacao.FAIXAS_PRE_CALCULADAS[1:]))
+    + f'\\u{_TabelaNormalizacao.FAIXAS_PRE_CALCULADAS[-1][1]:04x}-\\U0010ffff'
+))
+
+_ESPACOS_REPETIDOS = re.compile(' {2,}')
+
+# Contexto devolvido com cada detecção: caracteres do texto original antes e
+# depois do trecho encontrado, e tamanho máximo exibido
+TAMANHO_CONTEXTO = 100
+LIMITE_CONTEXTO = 300
+
+
+class _MapaDeslocamentos:
+    """
+    Mapa de posições por trechos: a partir de `inicios[k]` toda posição p do
+    texto de destino corresponde a p + deslocamentos[k] no texto de origem.
+    Só guarda um par por ponto de quebra (espaço colapsado, acento removido,
+    ligadura expandida), não um inteiro por caractere.
+    """
+
+    __slots__ = ('inicios', 'deslocamentos')
+
+    def __init__(self):
+        self.inicios = array('I')
+        self.deslocamentos = array('q')
+
+    def definir(self, inicio: int, deslocamento: int) -> None:
+        if self.inicios and self.inicios[-1] == inicio:
+            self.deslocamentos[-1] = deslocamento
+        else:
+            self.inicios.append(inicio)
+            self.deslocamentos.append(deslocamento)
+
+    def converter(self, posicao: int) -> int:
+        k = bisect_right(self.inicios, posicao) - 1
+        return posicao + self.deslocamentos[k] if k >= 0 else posicao
+
+
+class TextoNormalizado:
+    """
+    Texto normalizado para busca (maiúsculas, sem acentos, espaços colapsados)
+    junto com o mapa de volta para as posições do texto original, para que
+    qualquer trecho encontrado vire o trecho original exato sem nova busca.
+    """
+
+    __slots__ = ('original', 'texto', '_mapa_traducao', '_mapa_espacos')
+
+    def __init__(self, original: str):
+        self.original = original
+        traduzido = original.translate(_TABELA_NORMALIZACAO)
+
+        # Passo 1: caracteres que a tradução remove ou expande
+        self._mapa_traducao = _MapaDeslocamentos()
+        acumulado = 0  # tamanho traduzido - tamanho original até aqui
+        for match in _CARACTERES_DESALINHADOS.finditer(original):
+            posicao = match.start()
+            tamanho = len(_TABELA_NORMALIZACAO[ord(match.group())])
+            if tamanho == 1:
+                continue
+            destino = posicao + acumulado
+            # Todos os caracteres gerados apontam para o caractere de origem
+            for i in range(1, tamanho):
+                self._mapa_traducao.definir(destino + i, -acumulado - i)
+            acumulado += tamanho - 1
+            self._mapa_traducao.definir(destino + tamanho, -acumulado)
+
+        # Passo 2: sequências de espaços colapsadas (fica só o primeiro)
+        self._mapa_espacos = _MapaDeslocamentos()
+        removidos = 0
+        for match in _ESPACOS_REPETIDOS.finditer(traduzido):
+            removidos += match.end() - match.start() - 1
+            self._mapa_espacos.definir(match.end() - removidos, removidos)
+
+        self.texto = _ESPACOS_REPETIDOS.sub(' ', traduzido) if removidos else traduzido
+
+    def __len__(self) -> int:
+        return len(self.texto)
+
+    def posicao_original(self, posicao: int) -> int:
+        """Posição, no texto original, do caractere que gerou `posicao`"""
+        if posicao >= len(self.texto):
+            return len(self.original)
+        return self._mapa_traducao.converter(self._mapa_espacos.converter(posicao))
+
+    def intervalo_original(self, inicio: int, fim: int) -> Tuple[int, int]:
+        """Converte [inicio, fim) do texto normalizado para o texto original"""
+        inicio_original = self.posicao_original(inicio)
+        if fim <= inicio or inicio >= len(self.texto):
+            return inicio_original, inicio_original
+        return inicio_original, self.posicao_original(min(fim, len(self.texto)) - 1) + 1
+
+    def trecho_original(self, inicio: int, fim: int) -> str:
+        """Trecho do texto original que gerou [inicio, fim) do texto normalizado"""
+        inicio_original, fim_original = self.intervalo_original(inicio, fim)
+        return self.original[inicio_original:fim_original]
+
+
+# --------------------------------------------------
+# MOTOR DE VARREDURA MULTI-PADRÃO
+# --------------------------------------------------
+
+# Literais obrigatórios mais curtos que isso não entram no pré-filtro: estão
+# presentes em praticamente qualquer texto e só gerariam posições inúteis
+TAMANHO_MINIMO_LITERAL = 3
+
+# Distância máxima (em caracteres) entre termos consecutivos de uma regra.
+# Substitui as lacunas ilimitadas `.*?`, que num texto longo onde o primeiro
+# termo se repete e o último nunca aparece custam tempo quadrático.
+JANELA_PROXIMIDADE = 200
+
+
+# Trechos da sintaxe de regex que não são literais e não podem ser
+# normalizados: escapes (`\s`, `\d`, `\$`...), prefixos de grupo (`(?:`,
+# `(?P<nome>`) e quantificadores (`{0,200}`)
+_SINTAXE_PADRAO = re.compile(
+    r'\\(?:N\{[^}]*\}|x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)'
+    r'|\(\?(?:P<\w+>|P=\w+\)|[aiLmsux-]*[:)]|<?[=!])'
+    r'|\{\d*,?\d*\}',
+    re.DOTALL
+)
+
+
+def _normalizar_literais(trecho: str) -> str:
+    return ''.join(
+        caractere.translate(_TABELA_NORMALIZACAO) if caractere.isascii()
+        else re.escape(caractere.translate(_TABELA_NORMALIZACAO))
+        for caractere in trecho
+    )
+
+
+def _normalizar_padrao(padrao: str) -> str:
+    """
+    Aplica aos literais do padrão a mesma normalização do texto (maiúsculas,
+    sem acentos), preservando a sintaxe de regex. Assim `r'prazo\\s*razoável'`
+    vira `r'PRAZO\\s*RAZOAVEL'` e casa com o texto normalizado sem IGNORECASE.
+    """
+    partes = []
+    ultimo = 0
+    for match in _SINTAXE_PADRAO.finditer(padrao):
+        partes.append(_normalizar_literais(padrao[ultimo:match.start()]))
+        partes.append(match.group())
+        ultimo = match.end()
+    partes.append(_normalizar_literais(padrao[ultimo:]))
+    return ''.join(partes)
+
+
+def _lacunas_no_nivel_superior(padrao: str) -> int:
+    """
+    Quantas lacunas `.*?` do padrão estão fora de grupos e classes, ou -1 se
+    houver alternância `|` no nível superior (aí nenhuma pode ser reescrita)
+    """
+    lacunas = 0
+    profundidade = 0
+    em_classe = False
+    i = 0
+    while i < len(padrao):
+        caractere = padrao[i]
+        if caractere == '\\':
+            i += 2
+            continue
+        if em_classe:
+            em_classe = caractere != ']'
+        elif caractere == '[':
+            em_classe = True
+            # `]` logo após `[` ou `[^` é literal
+            if padrao[i + 1:i + 2] == '^':
+                i += 1
+            if padrao[i + 1:i + 2] == ']':
+                i += 1
+        elif caractere == '(':
+            profundidade += 1
+        elif caractere == ')':
+            profundidade -= 1
+        elif profundidade == 0:
+            if caractere == '|':
+                return -1
+            if padrao.startswith('.*?', i):
+                lacunas += 1
+                i += 3
+                continue
+        i += 1
+    return lacunas
+
+
+def _limitar_lacunas(padrao: str) -> str:
+    """
+    Reescreve cada lacuna `.*?` do padrão como uma janela de proximidade atômica:
+    `A.*?B.*?C` vira `A(?>.{0,N}?(?:B))(?>.{0,N}?(?:C))`.
+
+    Cada grupo atômico se compromete com a primeira ocorrência do termo dentro
+    da janela e nunca é revisitado, então o custo por posição inicial fica
+    limitado a (termos × N), independente do tamanho do documento.
+    """
+    partes = padrao.split('.*?')
+    if len(partes) == 1:
+        return padrao
+    if _lacunas_no_nivel_superior(padrao) != len(partes) - 1:
+        # `.*?` dentro de grupo/alternância: não dá para reescrever por texto
+        print(f"⚠️ Lacunas aninhadas não limitadas no padrão '{padrao}'")
+        return padrao
+    janela = f'.{{0,{JANELA_PROXIMIDADE}}}?'
+    return partes[0] + ''.join(f'(?>{janela}(?:{parte}))' for parte in partes[1:])
+
+
+def _literais_obrigatorios(padrao: re.Pattern) -> Tuple[str, List[str], Optional[int]]:
+    """
+    Extrai os trechos literais que toda ocorrência do padrão precisa conter.
+
+    Retorna (prefixo, literais, largura): o prefixo literal com que o padrão
+    começa ('' se começar com classe/grupo), a lista de sequências literais
+    da expressão (incluindo as de grupos obrigatórios), na ordem em que
+    aparecem, e a largura máxima de uma ocorrência (None se ilimitada).
+    Sem o analisador do CPython: ('', [], None), ou seja, sem pré-filtro.
+    """
+    if _sre_parse is None:
+        return '', [], None
+    try:
+        return _decompor_padrao(padrao)
+    except Exception as e:
+        print(f"⚠️ Padrão '{padrao.pattern}' sem pré-filtro: {type(e).__name__}: {e}")
+        return '', [], None
+
+
+def _decompor_padrao(padrao: re.Pattern) -> Tuple[str, List[str], Optional[int]]:
+    literais: List[str] = []
+    atual: List[str] = []
+    prefixo = None
+    
+    def percorrer(itens):
+        nonlocal prefixo
+        for op, av in itens:
+            if op == _sre_parse.LITERAL:
+                atual.append(chr(av))
+            elif op == _sre_parse.ATOMIC_GROUP:
+                percorrer(av)
+            elif op == _sre_parse.SUBPATTERN:
+                percorrer(av[-1])
+            else:
+                if prefixo is None:
+                    prefixo = ''.join(atual)
+                if atual:
+                    literais.append(''.join(atual))
+                    atual.clear()
+    
+    arvore = _sre_parse.parse(padrao.pattern, padrao.flags)
+    percorrer(arvore)
+    if prefixo is None:
+        prefixo = ''.join(atual)
+    if atual:
+        literais.append(''.join(atual))
+    largura = arvore.getwidth()[1]
+    return prefixo, literais, largura if largura < _sre_parse.MAXREPEAT - 1 else None
+
+
+class MotorVarredura:
+    """
+    Encontra as ocorrências de todos os padrões do pacote em uma única passada.
+
+    Na construção, cada padrão é decomposto em literais obrigatórios (palavras
+    como "MULTA", "FORO", "REAJUSTE"); o primeiro deles, quando o padrão começa
+    por um literal, é a sua âncora. Todos os literais são reunidos numa única
+    expressão em forma de trie, com um grupo nomeado vazio marcando o fim de
+    cada literal; ela percorre o texto uma vez e informa onde cada literal
+    aparece (o grupo que casou identifica o literal mais longo naquela posição
+    e, por prefixo, todos os menores que também casam ali).
+
+    Com isso:
+    - padrões com algum literal obrigatório ausente do documento são
+      descartados sem executar a regex (pré-filtro);
+    - os demais só são testados com `match` nas posições da sua âncora, o que
+      reproduz exatamente o resultado de `search`/`finditer`.
+    Padrões sem âncora literal, se passarem no pré-filtro, são executados com
+    `search`/`finditer` normais.
+    """
+    
+    def __init__(self, padroes: Iterable[re.Pattern], todas: Iterable[re.Pattern] = ()):
+        self.padroes = tuple(dict.fromkeys(padroes))
+        self.todas = frozenset(todas)
+        self.flags = 0
+        for padrao in self.padroes:
+            self.flags |= padrao.flags & re.IGNORECASE
+        
+        self.ancoras: Dict[re.Pattern, str] = {}
+        self.requisitos: Dict[re.Pattern, frozenset] = {}
+        self.larguras: Dict[re.Pattern, Optional[int]] = {}
+        literais = set()
+        for padrao in self.padroes:
+            prefixo, obrigatorios, self.larguras[padrao] = _literais_obrigatorios(padrao)
+            if prefixo:
+                self.ancoras[padrao] = self._chave(prefixo)
+            self.requisitos[padrao] = frozenset(
+                self._chave(literal) for literal in obrigatorios
+                if len(literal) >= TAMANHO_MINIMO_LITERAL
+            )
+            literais.update(self.requisitos[padrao])
+            if prefixo:
+                literais.add(self.ancoras[padrao])
+        
+        nomes = {literal: f'a{i}' for i, literal in enumerate(sorted(literais))}
+        self.grupos: Dict[str, Tuple[str, ...]] = {
+            nomes[literal]: tuple(outro for outro in literais if literal.startswith(outro))
+            for literal in literais
+        }
+        
+        trie: Dict[str, Any] = {}
+        for literal in literais:
+            no = trie
+            for caractere in literal:
+                no = no.setdefault(caractere, {})
+            no[''] = nomes[literal]
+        self.varredor = re.compile(f'(?={self._gerar_regex(trie)})', self.flags) if trie else None
+    
+    def _chave(self, literal: str) -> str:
+        return literal.upper() if self.flags & re.IGNORECASE else literal
+    
+    @classmethod
+    def _gerar_regex(cls, no: Dict[str, Any]) -> str:
+        """Gera a alternância de um nó da trie (ramos mais longos primeiro)"""
+        ramos = [re.escape(c) + cls._gerar_regex(filho) for c, filho in no.items() if c]
+        if '' in no:
+            ramos.append(f'(?P<{no[""]}>)')
+        return ramos[0] if len(ramos) == 1 else '(?:' + '|'.join(ramos) + ')'
+    
+    def localizar_literais(self, texto: str) -> Dict[str, List[int]]:
+        """Posições (em ordem) de cada literal indexado que aparece no texto"""
+        posicoes: Dict[str, List[int]] = {}
+        if self.varredor is None:
+            return posicoes
+        
+        por_grupo: Dict[str, List[int]] = {}
+        for candidato in self.varredor.finditer(texto):
+            por_grupo.setdefault(candidato.lastgroup, []).append(candidato.start())
+        
+        for grupo, lista in por_grupo.items():
+            for literal in self.grupos[grupo]:
+                if literal in posicoes:
+                    posicoes[literal] = sorted(posicoes[literal] + lista)
+                else:
+                    posicoes[literal] = lista
+        return posicoes
+    
+    def _candidatos(self, padrao: re.Pattern, posicoes: Dict[str, List[int]]) -> List[int]:
+        """
+        Posições da âncora onde vale a pena testar o padrão.
+
+        Se a largura máxima do padrão é limitada, qualquer ocorrência começa no
+        máximo `largura` caracteres antes do seu literal obrigatório mais raro;
+        basta testar as âncoras próximas das ocorrências desse literal.
+        """
+        ancora = self.ancoras[padrao]
+        ancoras = posicoes.get(ancora, [])
+        largura = self.larguras[padrao]
+        outros = self.requisitos[padrao] - {ancora}
+        if largura is None or not outros:
+            return ancoras
+        raro = min(outros, key=lambda literal: len(posicoes[literal]))
+        if len(posicoes[raro]) >= len(ancoras):
+            return ancoras
+        
+        candidatos = []
+        inicio = 0
+        for pos_raro in posicoes[raro]:
+            i = max(inicio, bisect_left(ancoras, pos_raro - largura))
+            j = bisect_right(ancoras, pos_raro)
+            candidatos.extend(ancoras[i:j])
+            inicio = max(inicio, j)
+        return candidatos
+    
+    def varrer(self, texto: str) -> Tuple[Dict[re.Pattern, List[re.Match]], int]:
+        """
+        Retorna (ocorrencias, executados): para cada padrão, a lista de
+        ocorrências no texto — todas as não sobrepostas (como `finditer`) para
+        os padrões marcados em `todas` e no máximo a primeira (como `search`)
+        para os demais — e quantos padrões passaram pelo pré-filtro.
+        """
+        posicoes = self.localizar_literais(texto)
+        ocorrencias: Dict[re.Pattern, List[re.Match]] = {}
+        executados = 0
+        
+        for padrao in self.padroes:
+            ocorrencias[padrao] = []
+            if not self.requisitos[padrao].issubset(posicoes):
+                continue
+            executados += 1
+            
+            ancora = self.ancoras.get(padrao)
+            if ancora is None:
+                if padrao in self.todas:
+                    ocorrencias[padrao] = list(padrao.finditer(texto))
+                else:
+                    match = padrao.search(texto)
+                    ocorrencias[padrao] = [match] if match else []
+                continue
+            
+            retomar = 0
+            for pos in self._candidatos(padrao, posicoes):
+                if pos < retomar:
+                    continue
+                match = padrao.match(texto, pos)
+                if match:
+                    ocorrencias[padrao].append(match)
+                    if padrao not in self.todas:
+                        break
+                    retomar = max(match.end(), pos + 1)
+        
+        return ocorrencias, executados
+
+
+# --------------------------------------------------
+# PACOTE DE REGRAS COMPILADO (UM POR PROCESSO)
+# --------------------------------------------------
+
+# Incrementar ao mudar a lógica de análise (pesos, métricas, formato do
+# resultado); mudanças nas regras já alteram a versão do pacote sozinhas
+VERSAO_MOTOR = '3'
+
+
+def _congelar(valor: Any) -> Any:
+    """Converte dicts/listas em estruturas somente leitura (MappingProxyType/tuple)"""
+    if isinstance(valor, dict):
+        return MappingProxyType({chave: _congelar(v) for chave, v in valor.items()})
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+class PacoteRegras:
+    """
+    Regras jurídicas compiladas uma única vez por processo.
+
+    Todos os padrões são armazenados como `re.Pattern` já compilados e todas as
+    coleções são somente leitura, de modo que uma única instância pode ser
+    compartilhada sem locks entre threads do Flask/gunicorn, o Streamlit e
+    scripts de processamento em lote.
+    """
+    
+    __slots__ = (
+        'base_legal', 'palavras_ambiguas', 'omissoes_criticas',
+        'violacoes', 'padroes_leoninos', 'total_padroes', 'motor', 'versao'
+    )
+    
+    def __init__(self):
+        print("⚖️ Compilando pacote de regras do CoreEngineJuridico...")
+        compilados: Dict[str, re.Pattern] = {}
+        
+        def compilar(padroes: List[str]) -> List[re.Pattern]:
+            resultado = []
+            for padrao in padroes:
+                if padrao not in compilados:
+                    try:
+                        compilados[padrao] = re.compile(_limitar_lacunas(_normalizar_padrao(padrao)))
+                    except re.error as e:
+                        print(f"⚠️ Padrão inválido ignorado '{padrao}': {e}")
+                        continue
+                resultado.append(compilados[padrao])
+            return resultado
+        
+        termos = CoreEngineJuridico._carregar_termos_ambiguos()
+        omissoes = CoreEngineJuridico._carregar_omissoes()
+        violacoes = CoreEngineJuridico._carregar_violacoes_especialista(termos)
+        
+        for config in violacoes.values():
+            config['padroes'] = compilar(config.get('padroes', []))
+        
+        leoninos = []
+        for padrao, descricao in CoreEngineJuridico._carregar_padroes_leoninos():
+            for compilado in compilar([padrao]):
+                leoninos.append((compilado, descricao))
+        
+        definir = super().__setattr__
+        # Impressão digital das regras: muda sempre que um padrão, texto de
+        # violação ou parâmetro do motor muda, invalidando resultados em cache
+        assinatura = json.dumps(
+            [VERSAO_MOTOR, JANELA_PROXIMIDADE, TAMANHO_CONTEXTO, LIMITE_CONTEXTO,
+             violacoes, omissoes, CoreEngineJuridico._carregar_padroes_leoninos()],
+            sort_keys=True, ensure_ascii=False, default=lambda valor: valor.pattern
+        )
+        definir('versao', hashlib.sha256(assinatura.encode('utf-8')).hexdigest()[:16])
+        definir('base_legal', _congelar(CoreEngineJuridico._carregar_base_legal_completa()))
+        definir('palavras_ambiguas', _congelar({
+            nome: compilar(padroes) for nome, padroes in termos.items()
+        }))
+        definir('omissoes_criticas', _congelar({
+            tipo: {clausula: compilar(padroes) for clausula, padroes in clausulas.items()}
+            for tipo, clausulas in omissoes.items()
+        }))
+        definir('violacoes', _congelar(violacoes))
+        definir('padroes_leoninos', tuple(leoninos))
+        definir('total_padroes', len(compilados))
+        # Termos ambíguos são reportados a cada ocorrência; os demais padrões
+        # só precisam da primeira
+        definir('motor', MotorVarredura(
+            compilados.values(),
+            todas=[p for padroes in self.palavras_ambiguas.values() for p in padroes]
+        ))
+        print(f"✅ Pacote de regras compilado: {len(self.violacoes)} violações, "
+              f"{self.total_padroes} padrões (versão {self.versao})")
+    
+    def __setattr__(self, nome, valor):
+        raise AttributeError("PacoteRegras é imutável")
+    
+    def __delattr__(self, nome):
+        raise AttributeError("PacoteRegras é imutável")
+
+
+_pacote_regras: Optional[PacoteRegras] = None
+_pacote_regras_lock = threading.Lock()
+
+def get_pacote_regras() -> PacoteRegras:
+    """Retorna o pacote de regras do processo, compilando-o na primeira chamada"""
+    global _pacote_regras
+    if _pacote_regras is None:
+        with _pacote_regras_lock:
+            if _pacote_regras is None:
+                _pacote_regras = PacoteRegras()
+    return _pacote_regras
@@ -0,0 +1,273 @@
+"""
+Reserva e débito atômicos de burocréditos para as análises.
+
+Ler o saldo e depois gravar o débito perde para uploads simultâneos (dois
+leem 1 crédito e ambos analisam). Aqui cada passo é um único comando:
+
+    - `reservar_creditos`: `UPDATE subscriptions ... WHERE burocreditos >= n
+      RETURNING` debita na hora ou não debita nada; o bloqueio da linha
+      dura só esse comando, nunca a análise inteira;
+    - `confirmar_reserva`: a análise deu certo, o débito fica;
+    - `devolver_creditos`: análise falhou ou veio do cache (reserva ainda
+      aberta: liberação) ou estorno posterior de um débito confirmado;
+    - `expirar_reservas`: devolve reservas abertas de processos que caíram
+      no meio da análise (após CREDITOS_RESERVA_VALIDADE segundos).
+
+Toda mudança de saldo (inclusive as compras do webhook) é anotada em
+`creditos_movimentos`, que só recebe inserções. `compactar_movimentos`
+soma periodicamente os movimentos antigos em `creditos_saldos` e os
+remove, mantendo a tabela pequena; `conferir_saldos` compara saldo
+compactado + movimentos com `subscriptions.burocreditos`. Cada comando
+avisa o cache de status (NOTIFY status_usuario) na mesma transação.
+
+O saldo que vale continua sendo a linha do usuário em `subscriptions`, e
+reservas, liberações e estornos do mesmo usuário disputam essa linha. É
+de propósito: conferir o saldo e debitar precisa ser serializado por
+usuário para não deixar o saldo negativo, e derivar o saldo de
+`creditos_saldos` + movimentos só trocaria a linha por uma trava por
+usuário, com uma soma a mais em cada reserva. A disputa fica limitada a
+um comando curto por análise (nunca a análise inteira) e entre usuários
+diferentes não há nenhuma; o livro-razão serve ao histórico e à
+conferência, não para dividir essa linha.
+
+Uso:
+    python creditos.py --expirar                # devolve reservas vencidas
+    python creditos.py --compactar [--dias 30]  # rodar como dono das tabelas
+    python creditos.py --conferir               # divergências do livro-razão
+"""
+
+import argparse
+import os
+from typing import Dict, List, Optional
+
+from database import conexao, registrar_consulta
+
+# O mesmo custo que a interface confere e debita (index.html)
+CUSTO_ANALISE = int(os.getenv('CUSTO_ANALISE_CREDITOS', '10'))
+# Cobrança das análises no servidor: desligada por padrão enquanto o saldo
+# exibido é controlado pela interface (COBRAR_ANALISES=1 liga)
+COBRAR_ANALISES = os.getenv('COBRAR_ANALISES', '0') == '1'
+# Conta com créditos ilimitados, que nunca é cobrada: pelo e-mail (conta no
+# banco) ou pelo id fixo da conta local da interface
+CONTA_ESPECIAL = os.getenv('CONTA_ESPECIAL_EMAIL', 'pedrohenriquemarques720@gmail.com')
+ID_CONTA_ESPECIAL = '550e8400-e29b-41d4-a716-446655440000'
+CREDITOS_RESERVA_VALIDADE = int(os.getenv('CREDITOS_RESERVA_VALIDADE', '600'))  # segundos
+COMPACTAR_APOS_DIAS = int(os.getenv('CREDITOS_COMPACTAR_APOS_DIAS', '30'))
+LOTE_COMPACTACAO = 5000
+
+SQL_RESERVAR = registrar_consulta('creditos_reservar', """
+    WITH debito AS (
+        UPDATE subscriptions
+        SET burocreditos = burocreditos - CAST(:quantidade AS INTEGER)
+        WHERE user_id = CAST(:usuario_id AS UUID)
+          AND status = 'active'
+          AND burocreditos >= CAST(:quantidade AS INTEGER)
+        RETURNING user_id, burocreditos
+    ),
+    reserva AS (
+        INSERT INTO creditos_reservas (user_id, quantidade, documento, expira_em)
+        SELECT user_id, CAST(:quantidade AS INTEGER), :documento,
+               NOW() + make_interval(secs => CAST(:validade AS DOUBLE PRECISION))
+        FROM debito
+        RETURNING reserva_id, user_id
+    ),
+    movimento AS (
+        INSERT INTO creditos_movimentos (user_id, delta, motivo, reserva_id)
+        SELECT user_id, -CAST(:quantidade AS INTEGER), 'reserva', reserva_id
+        FROM reserva
+    )
+    SELECT reserva.reserva_id, debito.burocreditos,
+           pg_notify('status_usuario', CAST(debito.user_id AS TEXT))
+    FROM reserva, debito
+""")
+
+SQL_CONTA_ESPECIAL = registrar_consulta('creditos_conta_especial', """
+    SELECT email = :conta_especial FROM users WHERE user_id = CAST(:usuario_id AS UUID)
+""")
+
+SQL_CONFIRMAR = registrar_consulta('creditos_confirmar', """
+    UPDATE creditos_reservas
+    SET estado = 'confirmada', finalizada_em = NOW()
+    WHERE reserva_id = :reserva_id AND estado = 'reservada'
+    RETURNING reserva_id
+""")
+
+# Reserva aberta -> liberada; débito já confirmado -> estornado
+SQL_DEVOLVER = registrar_consulta('creditos_devolver', """
+    WITH reserva AS (
+        UPDATE creditos_reservas
+        SET estado = CASE estado WHEN 'reservada' THEN 'liberada' ELSE 'estornada' END,
+            motivo = :motivo,
+            finalizada_em = NOW()
+        WHERE reserva_id = :reserva_id AND estado IN ('reservada', 'confirmada')
+        RETURNING reserva_id, user_id, quantidade, estado
+    ),
+    credito AS (
+        UPDATE subscriptions s
+        SET burocreditos = s.burocreditos + reserva.quantidade
+        FROM reserva
+        WHERE s.user_id = reserva.user_id
+        RETURNING s.burocreditos
+    ),
+    movimento AS (
+        INSERT INTO creditos_movimentos (user_id, delta, motivo, reserva_id, referencia)
+        SELECT user_id, quantidade,
+               CASE estado WHEN 'liberada' THEN 'liberacao' ELSE 'estorno' END,
+               reserva_id, :motivo
+        FROM reserva
+    )
+    SELECT reserva.estado, (SELECT burocreditos FROM credito),
+           pg_notify('status_usuario', CAST(reserva.user_id AS TEXT))
+    FROM reserva
+""")
+
+
+class Reserva:
+    """Créditos reservados para uma análise e o saldo que sobrou"""
+
+    __slots__ = ('reserva_id', 'usuario_id', 'quantidade', 'saldo')
+
+    def __init__(self, reserva_id: int, usuario_id: str, quantidade: int, saldo: int):
+        self.reserva_id = reserva_id
+        self.usuario_id = usuario_id
+        self.quantidade = quantidade
+        self.saldo = saldo
+
+
+def analise_cobrada(usuario_id: Optional[str]) -> bool:
+    """Se a análise deve reservar créditos: cobrança ligada e conta não ilimitada"""
+    if not (COBRAR_ANALISES and usuario_id) or usuario_id == ID_CONTA_ESPECIAL:
+        return False
+    with conexao() as conn:
+        linhas = conn.executar(SQL_CONTA_ESPECIAL, usuario_id=usuario_id, conta_especial=CONTA_ESPECIAL)
+    return not (linhas and linhas[0][0])
+
+
+def reservar_creditos(usuario_id: str, quantidade: int = CUSTO_ANALISE,
+                      documento: Optional[str] = None) -> Optional[Reserva]:
+    """Debita `quantidade` créditos de uma vez; None se o saldo não basta"""
+    with conexao() as conn:
+        linhas = conn.executar(SQL_RESERVAR,
+            usuario_id=usuario_id,
+            quantidade=quantidade,
+            documento=documento,
+            validade=CREDITOS_RESERVA_VALIDADE
+        )
+    if not linhas:
+        return None
+    return Reserva(linhas[0][0], str(usuario_id), quantidade, linhas[0][1])
+
+
+def confirmar_reserva(reserva_id: int) -> bool:
+    """Efetiva o débito; False se a reserva já tinha sido devolvida ou expirada"""
+    with conexao() as conn:
+        return bool(conn.executar(SQL_CONFIRMAR, reserva_id=reserva_id))
+
+
+def devolver_creditos(reserva_id: int, motivo: str) -> Optional[str]:
+    """
+    Devolve os créditos da reserva ('falha', 'cache', 'expirada', 'suporte'...).
+    Retorna o novo estado ('liberada' ou 'estornada') ou None se já devolvida.
+    """
+    with conexao() as conn:
+        linhas = conn.executar(SQL_DEVOLVER, reserva_id=reserva_id, motivo=motivo)
+    return linhas[0][0] if linhas else None
+
+
+# ===== MANUTENÇÃO =====
+
+def expirar_reservas(limite: int = 500) -> int:
+    """Devolve as reservas abertas cujo prazo passou"""
+    with conexao() as conn:
+        vencidas = conn.run("""
+            SELECT reserva_id FROM creditos_reservas
+            WHERE estado = 'reservada' AND expira_em < NOW()
+            ORDER BY expira_em
+            LIMIT :limite
+        """, limite=limite)
+    return sum(1 for (reserva_id,) in vencidas if devolver_creditos(reserva_id, 'expirada'))
+
+
+def compactar_movimentos(dias: int = COMPACTAR_APOS_DIAS, lote: int = LOTE_COMPACTACAO) -> int:
+    """
+    Soma em `creditos_saldos` os movimentos com mais de `dias` dias e os
+    remove, em lotes (cada lote é um comando). Retorna quantos compactou.
+    """
+    total = 0
+    with conexao() as conn:
+        while True:
+            linhas = conn.run("""
+                WITH removidos AS (
+                    DELETE FROM creditos_movimentos
+                    WHERE movimento_id IN (
+                        SELECT movimento_id FROM creditos_movimentos
+                        WHERE criado_em < NOW() - make_interval(days => CAST(:dias AS INTEGER))
+                        ORDER BY movimento_id
+                        LIMIT :lote
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING user_id, delta, movimento_id
+                ),
+                resumo AS (
+                    INSERT INTO creditos_saldos (user_id, saldo, movimentos, ate_movimento_id)
+                    SELECT user_id, SUM(delta), COUNT(*), MAX(movimento_id)
+                    FROM removidos
+                    GROUP BY user_id
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        saldo = creditos_saldos.saldo + EXCLUDED.saldo,
+                        movimentos = creditos_saldos.movimentos + EXCLUDED.movimentos,
+                        ate_movimento_id = GREATEST(creditos_saldos.ate_movimento_id, EXCLUDED.ate_movimento_id),
+                        compactado_em = NOW()
+                )
+                SELECT COUNT(*) FROM removidos
+            """, dias=dias, lote=lote)
+            compactados = linhas[0][0]
+            total += compactados
+            if compactados < lote:
+                return total
+
+
+def conferir_saldos(limite: int = 100) -> List[Dict]:
+    """Usuários cujo saldo pelo livro-razão difere de subscriptions.burocreditos"""
+    with conexao() as conn:
+        linhas = conn.run("""
+            WITH livro AS (
+                SELECT user_id, SUM(saldo) AS saldo FROM (
+                    SELECT user_id, saldo FROM creditos_saldos
+                    UNION ALL
+                    SELECT user_id, delta FROM creditos_movimentos
+                ) partes
+                GROUP BY user_id
+            )
+            SELECT COALESCE(s.user_id, livro.user_id), s.burocreditos, livro.saldo
+            FROM subscriptions s
+            FULL JOIN livro ON livro.user_id = s.user_id
+            WHERE COALESCE(s.burocreditos, 0) <> COALESCE(livro.saldo, 0)
+            LIMIT :limite
+        """, limite=limite)
+    return [{'user_id': str(user_id), 'burocreditos': saldo, 'livro_razao': livro}
+            for user_id, saldo, livro in linhas]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--expirar', action='store_true', help='devolve reservas vencidas')
+    parser.add_argument('--compactar', action='store_true', help='soma movimentos antigos nos saldos')
+    parser.add_argument('--dias', type=int, default=COMPACTAR_APOS_DIAS)
+    parser.add_argument('--conferir', action='store_true', help='lista divergências do livro-razão')
+    args = parser.parse_args()
+
+    if args.expirar:
+        print(f"⏰ {expirar_reservas()} reservas vencidas devolvidas")
+    if args.compactar:
+        print(f"🗜️ {compactar_movimentos(args.dias)} movimentos compactados")
+    if args.conferir:
+        divergencias = conferir_saldos()
+        for item in divergencias:
+            print(f"⚠️ {item['user_id']}: burocreditos={item['burocreditos']} livro-razão={item['livro_razao']}")
+        if not divergencias:
+            print("✅ Livro-razão confere com os saldos")
+
+
+if __name__ == '__main__':
+    main()
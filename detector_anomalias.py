@@ -0,0 +1,274 @@
+"""
+Detecção incremental de anomalias de login, em memória.
+
+`detect_anomalies()` (auditoria.sql) agrupava todo o login_history dos
+últimos 5 minutos e 1 hora a cada execução, e o trigger
+`check_suspicious_login` fazia duas consultas a cada login gravado: custo
+que cresce com a tabela e com o volume de logins. Aqui a rota de login
+alimenta contadores em janelas deslizantes e cada tentativa é avaliada em
+tempo constante, sem consultar o banco:
+
+    - por usuário: falhas nos últimos 5 minutos (`multiple_failed_logins`,
+      acima de LIMITE_FALHAS_USUARIO), IPs distintos na última hora
+      (acima de LIMITE_IPS_USUARIO: "Múltiplos IPs em curto período") e
+      países distintos nas últimas 2 horas ("Viagem impossível entre
+      países"); estes dois marcam o login como suspeito
+      (`suspicious_location`), com a mesma pontuação do trigger;
+    - por IP: falhas nos últimos 5 minutos, de qualquer usuário
+      (`multiple_failed_logins_ip`, acima de LIMITE_FALHAS_IP: um IP
+      testando senhas de várias contas);
+    - cada anomalia é emitida uma vez por janela, não a cada tentativa.
+
+As janelas de falhas são anéis de baldes de 10 s (memória e custo fixos
+mesmo sob ataque); IPs e países guardam só os últimos vistos. Usuários e
+IPs sem atividade há mais de 2 horas saem da memória, que também é limitada
+a DETECTOR_MAX_CHAVES chaves de cada tipo (as menos recentes saem primeiro).
+
+Os contadores são do processo: com vários workers, cada um vê os logins que
+atendeu (prefira poucos workers com threads, `--worker-class gthread`).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+JANELA_FALHAS = 300          # segundos (5 minutos)
+JANELA_IPS = 3600            # 1 hora
+JANELA_PAISES = 7200         # 2 horas
+LARGURA_BALDE = 10           # segundos por balde das janelas de falhas
+
+LIMITE_FALHAS_USUARIO = int(os.getenv('LIMITE_FALHAS_USUARIO', '5'))
+LIMITE_FALHAS_IP = int(os.getenv('LIMITE_FALHAS_IP', '20'))
+LIMITE_IPS_USUARIO = int(os.getenv('LIMITE_IPS_USUARIO', '3'))
+DETECTOR_MAX_CHAVES = int(os.getenv('DETECTOR_MAX_CHAVES', '100000'))
+
+# Pontuação e motivo gravados em login_history (os mesmos do antigo trigger)
+SUSPEITA_IPS = (70, 'Múltiplos IPs em curto período')
+SUSPEITA_PAIS = (90, 'Viagem impossível entre países')
+
+
+class JanelaDeslizante:
+    """Contagem de eventos nos últimos `duracao` segundos, em baldes fixos"""
+
+    __slots__ = ('largura', 'baldes', 'contagens')
+
+    def __init__(self, duracao: float = JANELA_FALHAS, largura: float = LARGURA_BALDE):
+        self.largura = largura
+        quantidade = max(1, int(duracao // largura))
+        # Índice absoluto do balde guardado em cada posição do anel e sua contagem
+        self.baldes = [-1] * quantidade
+        self.contagens = [0] * quantidade
+
+    def adicionar(self, agora: float) -> int:
+        """Conta um evento e devolve o total da janela"""
+        indice = int(agora // self.largura)
+        posicao = indice % len(self.baldes)
+        if self.baldes[posicao] != indice:
+            self.baldes[posicao] = indice
+            self.contagens[posicao] = 0
+        self.contagens[posicao] += 1
+        return self.total(agora)
+
+    def total(self, agora: float) -> int:
+        inicio = int(agora // self.largura) - len(self.baldes)
+        return sum(contagem for balde, contagem in zip(self.baldes, self.contagens) if balde > inicio)
+
+
+class _Recentes:
+    """Últimos valores distintos vistos (no máximo `limite`), com o horário"""
+
+    __slots__ = ('limite', 'vistos')
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.vistos: 'OrderedDict[str, float]' = OrderedDict()
+
+    def adicionar(self, valor: str, agora: float) -> None:
+        self.vistos[valor] = agora
+        self.vistos.move_to_end(valor)
+        if len(self.vistos) > self.limite:
+            self.vistos.popitem(last=False)
+
+    def outros_desde(self, valor: str, desde: float) -> List[str]:
+        """Valores diferentes de `valor` vistos depois de `desde`"""
+        return [outro for outro, visto in self.vistos.items() if outro != valor and visto > desde]
+
+
+class _EstadoUsuario:
+    __slots__ = ('falhas', 'ips', 'paises', 'visto_em', 'alertado_em')
+
+    def __init__(self):
+        self.falhas = JanelaDeslizante()
+        # Basta saber se passou do limite: o IP atual e mais limite + 1 outros
+        self.ips = _Recentes(LIMITE_IPS_USUARIO + 2)
+        self.paises = _Recentes(2)
+        self.visto_em = 0.0
+        self.alertado_em: Dict[str, float] = {}
+
+
+class _EstadoIP:
+    __slots__ = ('falhas', 'visto_em', 'alertado_em')
+
+    def __init__(self):
+        self.falhas = JanelaDeslizante()
+        self.visto_em = 0.0
+        self.alertado_em: Dict[str, float] = {}
+
+
+class Anomalia:
+    """Anomalia detectada (mesmos tipos e severidades de detect_anomalies)"""
+
+    __slots__ = ('tipo', 'usuario_id', 'ip', 'descricao', 'severidade')
+
+    def __init__(self, tipo: str, usuario_id: Optional[str], ip: Optional[str],
+                 descricao: str, severidade: str):
+        self.tipo = tipo
+        self.usuario_id = usuario_id
+        self.ip = ip
+        self.descricao = descricao
+        self.severidade = severidade
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            'anomaly_type': self.tipo,
+            'user_id': self.usuario_id,
+            'ip_address': self.ip,
+            'description': self.descricao,
+            'severity': self.severidade
+        }
+
+
+class Avaliacao:
+    """Resultado de uma tentativa: classificação para login_history e anomalias novas"""
+
+    __slots__ = ('suspeito', 'pontuacao', 'motivo', 'anomalias')
+
+    def __init__(self):
+        self.suspeito = False
+        self.pontuacao = 0
+        self.motivo: Optional[str] = None
+        self.anomalias: List[Anomalia] = []
+
+    def marcar(self, pontuacao: int, motivo: str) -> None:
+        if pontuacao > self.pontuacao:
+            self.suspeito, self.pontuacao, self.motivo = True, pontuacao, motivo
+
+
+class DetectorAnomalias:
+    """Janelas por usuário e por IP, atualizadas a cada tentativa de login"""
+
+    def __init__(self, max_chaves: int = DETECTOR_MAX_CHAVES):
+        self.max_chaves = max_chaves
+        self._usuarios: 'OrderedDict[str, _EstadoUsuario]' = OrderedDict()
+        self._ips: 'OrderedDict[str, _EstadoIP]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._contadores = {
+            'tentativas': 0,
+            'falhas': 0,
+            'suspeitas': 0,
+            'anomalias': 0,
+            'despejos': 0
+        }
+
+    def _estado(self, tabela: OrderedDict, chave: str, classe, agora: float):
+        estado = tabela.get(chave)
+        if estado is None:
+            estado = tabela[chave] = classe()
+        else:
+            tabela.move_to_end(chave)
+        estado.visto_em = agora
+        # Remove no máximo duas chaves por chamada: custo constante
+        for _ in range(2):
+            chave_antiga, antigo = next(iter(tabela.items()))
+            if len(tabela) > self.max_chaves or antigo.visto_em < agora - JANELA_PAISES:
+                del tabela[chave_antiga]
+                self._contadores['despejos'] += 1
+            else:
+                break
+        return estado
+
+    @staticmethod
+    def _alertar(estado, tipo: str, agora: float, janela: float) -> bool:
+        """Uma anomalia de cada tipo por janela"""
+        if estado.alertado_em.get(tipo, float('-inf')) > agora - janela:
+            return False
+        estado.alertado_em[tipo] = agora
+        return True
+
+    def registrar_login(self, usuario_id: Optional[str], ip: Optional[str], sucesso: bool,
+                        pais: Optional[str] = None, agora: Optional[float] = None) -> Avaliacao:
+        """
+        Avalia uma tentativa de login (usuario_id None se o e-mail não
+        existe) e atualiza as janelas. `agora` em segundos desde a época.
+        """
+        agora = time.time() if agora is None else agora
+        avaliacao = Avaliacao()
+        usuario_id = str(usuario_id) if usuario_id is not None else None
+
+        with self._lock:
+            self._contadores['tentativas'] += 1
+            if not sucesso:
+                self._contadores['falhas'] += 1
+
+            if usuario_id is not None:
+                usuario = self._estado(self._usuarios, usuario_id, _EstadoUsuario, agora)
+
+                if not sucesso:
+                    falhas = usuario.falhas.adicionar(agora)
+                    if falhas > LIMITE_FALHAS_USUARIO and self._alertar(
+                            usuario, 'multiple_failed_logins', agora, JANELA_FALHAS):
+                        avaliacao.anomalias.append(Anomalia(
+                            'multiple_failed_logins', usuario_id, ip,
+                            f"{falhas} tentativas em 5 minutos", 'high'))
+
+                if ip:
+                    if len(usuario.ips.outros_desde(ip, agora - JANELA_IPS)) > LIMITE_IPS_USUARIO:
+                        avaliacao.marcar(*SUSPEITA_IPS)
+                    usuario.ips.adicionar(ip, agora)
+                if pais:
+                    outros = usuario.paises.outros_desde(pais, agora - JANELA_PAISES)
+                    if outros:
+                        avaliacao.marcar(*SUSPEITA_PAIS)
+                    usuario.paises.adicionar(pais, agora)
+
+                if avaliacao.suspeito:
+                    self._contadores['suspeitas'] += 1
+                    if self._alertar(usuario, 'suspicious_location', agora, JANELA_IPS):
+                        avaliacao.anomalias.append(Anomalia(
+                            'suspicious_location', usuario_id, ip,
+                            f"Acesso de {pais}: {avaliacao.motivo}" if pais else avaliacao.motivo,
+                            'medium'))
+
+            if ip and not sucesso:
+                estado_ip = self._estado(self._ips, ip, _EstadoIP, agora)
+                falhas = estado_ip.falhas.adicionar(agora)
+                if falhas > LIMITE_FALHAS_IP and self._alertar(
+                        estado_ip, 'multiple_failed_logins_ip', agora, JANELA_FALHAS):
+                    avaliacao.anomalias.append(Anomalia(
+                        'multiple_failed_logins_ip', None, ip,
+                        f"{falhas} tentativas do IP {ip} em 5 minutos", 'high'))
+
+            self._contadores['anomalias'] += len(avaliacao.anomalias)
+        return avaliacao
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas['usuarios_em_memoria'] = len(self._usuarios)
+            estatisticas['ips_em_memoria'] = len(self._ips)
+        return estatisticas
+
+
+_detector: Optional[DetectorAnomalias] = None
+_detector_lock = threading.Lock()
+
+def get_detector_anomalias() -> DetectorAnomalias:
+    """Detector do processo, criado na primeira chamada"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = DetectorAnomalias()
+    return _detector
@@ -0,0 +1,385 @@
+"""
+Extração de texto de PDFs fora do processo web.
+
+O pdfplumber é Python puro e pesado em CPU: um contrato de 150 páginas ocupa
+um worker do Flask por vários segundos e um PDF malformado pode travá-lo.
+Aqui a extração roda num pool de processos trabalhadores dedicados:
+
+    - número de trabalhadores configurável (EXTRACAO_PDF_WORKERS);
+    - tempo máximo por documento (EXTRACAO_PDF_TIMEOUT): o trabalhador que
+      estoura é morto e substituído;
+    - limite de memória por trabalhador (EXTRACAO_PDF_MEMORIA_MB, RLIMIT_AS);
+    - reciclagem do trabalhador após N tarefas
+      (EXTRACAO_PDF_TAREFAS_POR_WORKER), contendo vazamentos do pdfplumber;
+    - documentos longos divididos em intervalos de páginas extraídos em
+      paralelo por vários trabalhadores (EXTRACAO_PDF_PAGINAS_POR_PARTE),
+      e em tarefas de no máximo EXTRACAO_PDF_PAGINAS_POR_TAREFA páginas;
+    - as páginas são descartadas assim que extraídas: o pico de memória do
+      trabalhador não depende do tamanho do documento.
+
+A thread da requisição só espera o resultado (sem segurar o GIL), então
+/login e /ping não disputam CPU com as extrações.
+
+Os trabalhadores são subprocessos deste mesmo arquivo (`--trabalhador`),
+conversando com o processo web por pipes; não importam o backend.
+"""
+
+import atexit
+import io
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EXTRACAO_PDF_WORKERS = int(os.getenv('EXTRACAO_PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+EXTRACAO_PDF_TIMEOUT = float(os.getenv('EXTRACAO_PDF_TIMEOUT', '60'))
+# Pico medido (benchmark_extracao.py): ~80 MB de memória virtual por
+# trabalhador, de 10 a 1000 páginas; o limite deixa folga para páginas densas
+EXTRACAO_PDF_MEMORIA_MB = int(os.getenv('EXTRACAO_PDF_MEMORIA_MB', '512'))
+EXTRACAO_PDF_TAREFAS_POR_WORKER = int(os.getenv('EXTRACAO_PDF_TAREFAS_POR_WORKER', '50'))
+
+# Tempo máximo esperando um trabalhador livre antes de desistir
+EXTRACAO_PDF_ESPERA = float(os.getenv('EXTRACAO_PDF_ESPERA', '120'))
+
+# Documentos com pelo menos 2x esse número de páginas são divididos em
+# intervalos extraídos em paralelo; abaixo disso reabrir o PDF em cada
+# trabalhador custa mais do que se ganha
+EXTRACAO_PDF_PAGINAS_POR_PARTE = int(os.getenv('EXTRACAO_PDF_PAGINAS_POR_PARTE', '8'))
+# Máximo de páginas numa única tarefa: documentos maiores são divididos
+# mesmo com um só trabalhador (intervalos extraídos em sequência), e cada
+# tarefa reabre o PDF com os caches do pdfminer vazios
+EXTRACAO_PDF_PAGINAS_POR_TAREFA = int(os.getenv('EXTRACAO_PDF_PAGINAS_POR_TAREFA', '100'))
+
+
+class ErroExtracao(Exception):
+    """Falha ao extrair o texto de um documento"""
+
+
+class TempoExtracaoEsgotado(ErroExtracao):
+    """O documento não foi extraído dentro do tempo limite"""
+
+
+class MemoriaExtracaoEsgotada(ErroExtracao):
+    """O documento estourou o limite de memória do trabalhador"""
+
+
+# --------------------------------------------------
+# LADO DO TRABALHADOR (subprocesso)
+# --------------------------------------------------
+
+def juntar_paginas(textos: Iterable[Optional[str]]) -> Optional[str]:
+    """Junta os textos das páginas, em ordem, numa única operação"""
+    texto = "".join(f"{texto_pagina}\n" for texto_pagina in textos if texto_pagina)
+    return texto if texto.strip() else None
+
+
+def contar_paginas(conteudo: bytes) -> int:
+    """Número de páginas do PDF (executado dentro do trabalhador)"""
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+        return len(pdf.pages)
+
+
+def extrair_paginas(conteudo: bytes, inicio: int = 0, fim: Optional[int] = None) -> List[Optional[str]]:
+    """Texto de cada página no intervalo [inicio, fim) (executado dentro do trabalhador)"""
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+        # O pdfplumber mantém cada página lida (caracteres, layout) até o PDF
+        # ser fechado: ~7 MB por página de contrato. As páginas saem da lista
+        # do PDF e cada uma é descartada logo depois de extraída, e o pico de
+        # memória não cresce com o número de páginas.
+        paginas = pdf.pages[inicio:fim]
+        pdf.pages.clear()
+        paginas.reverse()
+        textos = []
+        while paginas:
+            pagina = paginas.pop()
+            textos.append(pagina.extract_text())
+            pagina.flush_cache()
+        return textos
+
+
+def extrair_texto(conteudo: bytes) -> Optional[str]:
+    """Extrai o texto de todas as páginas (executado dentro do trabalhador)"""
+    return juntar_paginas(extrair_paginas(conteudo))
+
+
+# Tarefas que o processo web pode pedir ao trabalhador, por nome
+_TAREFAS = {
+    'contar_paginas': contar_paginas,
+    'extrair_paginas': extrair_paginas,
+    'extrair_texto': extrair_texto,
+}
+
+
+def _limitar_memoria(memoria_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:
+        print("⚠️ Limite de memória da extração indisponível nesta plataforma")
+        return
+    limite = memoria_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+
+
+def _executar_trabalhador(fd_tarefas: int, fd_resultados: int, memoria_mb: int) -> None:
+    """Laço do subprocesso: recebe (tarefa, argumentos), devolve (status, valor)"""
+    _limitar_memoria(memoria_mb)
+    tarefas = Connection(fd_tarefas, writable=False)
+    resultados = Connection(fd_resultados, readable=False)
+    while True:
+        try:
+            nome, argumentos = tarefas.recv()
+        except (EOFError, OSError):
+            return  # processo web encerrou
+        try:
+            resposta = ('ok', _TAREFAS[nome](*argumentos))
+        except MemoryError:
+            resposta = ('memoria', f'limite de {memoria_mb} MB excedido')
+        except Exception as e:
+            resposta = ('erro', f'{type(e).__name__}: {e}')
+        resultados.send(resposta)
+        if resposta[0] == 'memoria':
+            return  # estado do interpretador não é mais confiável
+
+
+# --------------------------------------------------
+# LADO DO PROCESSO WEB
+# --------------------------------------------------
+
+class _Trabalhador:
+    """Um subprocesso de extração e os pipes para conversar com ele"""
+
+    def __init__(self, memoria_mb: int):
+        leitura_tarefas, escrita_tarefas = os.pipe()
+        leitura_resultados, escrita_resultados = os.pipe()
+        try:
+            self.processo = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--trabalhador',
+                 str(leitura_tarefas), str(escrita_resultados), str(memoria_mb)],
+                pass_fds=(leitura_tarefas, escrita_resultados),
+                stdin=subprocess.DEVNULL
+            )
+        finally:
+            os.close(leitura_tarefas)
+            os.close(escrita_resultados)
+        self.tarefas = Connection(escrita_tarefas, readable=False)
+        self.resultados = Connection(leitura_resultados, writable=False)
+        self.concluidas = 0
+
+    def executar(self, nome: str, argumentos: tuple, timeout: float) -> Any:
+        try:
+            self.tarefas.send((nome, argumentos))
+            if not self.resultados.poll(timeout):
+                raise TempoExtracaoEsgotado(f'extração excedeu {timeout:g}s')
+            status, valor = self.resultados.recv()
+        except (EOFError, OSError) as e:
+            raise ErroExtracao(f'trabalhador de extração encerrado inesperadamente: {e}')
+        if status == 'memoria':
+            raise MemoriaExtracaoEsgotada(valor)
+        if status == 'erro':
+            raise ErroExtracao(valor)
+        self.concluidas += 1
+        return valor
+
+    def encerrar(self) -> None:
+        """Fecha os pipes (o trabalhador sai sozinho) e mata se não sair"""
+        for conexao in (self.tarefas, self.resultados):
+            try:
+                conexao.close()
+            except OSError:
+                pass
+        try:
+            self.processo.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.matar()
+
+    def matar(self) -> None:
+        self.processo.kill()
+        self.processo.wait()
+        for conexao in (self.tarefas, self.resultados):
+            try:
+                conexao.close()
+            except OSError:
+                pass
+
+
+class PoolExtracao:
+    """Pool de trabalhadores de extração com timeout, limite de memória e reciclagem"""
+
+    def __init__(self, workers: int = EXTRACAO_PDF_WORKERS,
+                 timeout: float = EXTRACAO_PDF_TIMEOUT,
+                 memoria_mb: int = EXTRACAO_PDF_MEMORIA_MB,
+                 tarefas_por_trabalhador: int = EXTRACAO_PDF_TAREFAS_POR_WORKER):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memoria_mb = memoria_mb
+        self.tarefas_por_trabalhador = max(1, tarefas_por_trabalhador)
+        self.pid = os.getpid()
+
+        # Uma vaga por trabalhador; None = vaga cujo processo ainda não existe
+        # (criado sob demanda) ou foi descartado
+        self._vagas: 'queue.Queue[Optional[_Trabalhador]]' = queue.Queue()
+        for _ in range(self.workers):
+            self._vagas.put(None)
+        self._todos = set()
+        # Threads que despacham os intervalos de páginas de um documento
+        self._despacho = ThreadPoolExecutor(max_workers=self.workers * 2,
+                                            thread_name_prefix='extracao-pdf')
+        self._lock = threading.Lock()
+        self._contadores = {
+            'tarefas': 0,
+            'erros': 0,
+            'timeouts': 0,
+            'memoria_excedida': 0,
+            'trabalhadores_iniciados': 0,
+            'reciclagens': 0,
+            'espera_total_s': 0.0
+        }
+
+    def _contar(self, contador: str, valor: float = 1) -> None:
+        with self._lock:
+            self._contadores[contador] += valor
+
+    def _descartar(self, trabalhador: _Trabalhador, matar: bool) -> None:
+        with self._lock:
+            self._todos.discard(trabalhador)
+        if matar:
+            trabalhador.matar()
+        else:
+            trabalhador.encerrar()
+
+    def executar(self, nome: str, *argumentos, prazo: Optional[float] = None) -> Any:
+        """
+        Executa a tarefa `nome` num trabalhador livre, esperando por uma vaga.
+        Com `prazo` (em time.monotonic()), a espera e a tarefa terminam até
+        ele; sem, a tarefa tem o tempo limite do pool.
+        """
+        inicio_espera = time.monotonic()
+        espera = EXTRACAO_PDF_ESPERA if prazo is None else min(EXTRACAO_PDF_ESPERA, prazo - inicio_espera)
+        try:
+            trabalhador = self._vagas.get(timeout=max(0.0, espera))
+        except queue.Empty:
+            if prazo is not None and time.monotonic() >= prazo:
+                self._contar('timeouts')
+                raise TempoExtracaoEsgotado(f'extração excedeu {self.timeout:g}s')
+            raise ErroExtracao('nenhum trabalhador de extração livre')
+        self._contar('espera_total_s', time.monotonic() - inicio_espera)
+
+        try:
+            if trabalhador is None or trabalhador.processo.poll() is not None:
+                trabalhador = _Trabalhador(self.memoria_mb)
+                with self._lock:
+                    self._todos.add(trabalhador)
+                self._contar('trabalhadores_iniciados')
+
+            try:
+                restante = self.timeout if prazo is None else max(0.1, prazo - time.monotonic())
+                resultado = trabalhador.executar(nome, argumentos, restante)
+            except TempoExtracaoEsgotado:
+                self._contar('timeouts')
+                self._descartar(trabalhador, matar=True)
+                trabalhador = None
+                raise
+            except MemoriaExtracaoEsgotada:
+                self._contar('memoria_excedida')
+                self._descartar(trabalhador, matar=True)
+                trabalhador = None
+                raise
+            except ErroExtracao:
+                self._contar('erros')
+                if trabalhador.processo.poll() is not None:
+                    self._descartar(trabalhador, matar=True)
+                    trabalhador = None
+                raise
+
+            self._contar('tarefas')
+            if trabalhador.concluidas >= self.tarefas_por_trabalhador:
+                self._contar('reciclagens')
+                self._descartar(trabalhador, matar=False)
+                trabalhador = None
+            return resultado
+        finally:
+            self._vagas.put(trabalhador)
+
+    def _dividir_paginas(self, total: int) -> List[Tuple[int, int]]:
+        """Intervalos contíguos de páginas, um por trabalhador (mais, se passarem do máximo por tarefa)"""
+        partes = max(min(self.workers, total // EXTRACAO_PDF_PAGINAS_POR_PARTE),
+                     -(-total // max(1, EXTRACAO_PDF_PAGINAS_POR_TAREFA)))
+        tamanho, resto = divmod(total, max(1, partes))
+        intervalos, inicio = [], 0
+        for i in range(partes):
+            fim = inicio + tamanho + (1 if i < resto else 0)
+            intervalos.append((inicio, fim))
+            inicio = fim
+        return intervalos
+
+    def extrair_texto(self, conteudo: bytes) -> Optional[str]:
+        """
+        Texto do PDF (None se não houver texto). Documentos longos são
+        divididos em intervalos de páginas extraídos em paralelo (em
+        sequência, com um só trabalhador) e remontados em ordem; o tempo
+        limite vale para o documento inteiro, incluindo a espera por
+        trabalhadores livres.
+        """
+        prazo = time.monotonic() + self.timeout
+        total = self.executar('contar_paginas', conteudo, prazo=prazo)
+        intervalos = self._dividir_paginas(total)
+        if len(intervalos) < 2:
+            return self.executar('extrair_texto', conteudo, prazo=prazo)
+
+        def extrair_intervalo(intervalo: Tuple[int, int]) -> List[Optional[str]]:
+            return self.executar('extrair_paginas', conteudo, *intervalo, prazo=prazo)
+
+        futuros = [self._despacho.submit(extrair_intervalo, intervalo) for intervalo in intervalos]
+        try:
+            partes = [futuro.result() for futuro in futuros]
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+        return juntar_paginas(texto for parte in partes for texto in parte)
+
+    def encerrar(self) -> None:
+        """Encerra todos os trabalhadores deste processo"""
+        if os.getpid() != self.pid:
+            return
+        with self._lock:
+            trabalhadores = list(self._todos)
+            self._todos.clear()
+        for trabalhador in trabalhadores:
+            trabalhador.matar()
+        self._despacho.shutdown(wait=False, cancel_futures=True)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas['trabalhadores_ativos'] = len(self._todos)
+        estatisticas['vagas_livres'] = self._vagas.qsize()
+        estatisticas['espera_total_s'] = round(estatisticas['espera_total_s'], 3)
+        return estatisticas
+
+
+_pool_extracao: Optional[PoolExtracao] = None
+_pool_extracao_lock = threading.Lock()
+
+def get_pool_extracao() -> PoolExtracao:
+    """Retorna o pool de extração do processo, criando-o na primeira chamada"""
+    global _pool_extracao
+    # Após um fork (gunicorn --preload) o pool herdado pertence ao pai
+    if _pool_extracao is None or _pool_extracao.pid != os.getpid():
+        with _pool_extracao_lock:
+            if _pool_extracao is None or _pool_extracao.pid != os.getpid():
+                _pool_extracao = PoolExtracao()
+                atexit.register(_pool_extracao.encerrar)
+    return _pool_extracao
+
+
+if __name__ == '__main__' and len(sys.argv) == 5 and sys.argv[1] == '--trabalhador':
+    _executar_trabalhador(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
@@ -0,0 +1,342 @@
+"""
+Gravação da auditoria (audit_logs e login_history) em lotes, fora do caminho das requisições.
+
+Um INSERT por evento de auditoria põe uma ida ao banco em cada login e em
+cada análise. Aqui as rotas só chamam `auditar(...)` (ou
+`registrar_login(...)` para o login_history), que coloca o evento numa
+fila em memória e volta na hora; uma thread por processo grava:
+
+    - em lotes de até AUDITORIA_LOTE eventos, num único comando por tabela
+      (`INSERT ... SELECT FROM jsonb_to_recordset`, preparado uma vez por
+      conexão qualquer que seja o tamanho do lote);
+    - assim que o lote enche ou AUDITORIA_INTERVALO segundos depois do
+      primeiro evento pendente, o que vier antes;
+    - o horário do evento é o da requisição, não o da gravação;
+    - se um lote for recusado pelo banco (ex.: user_id já removido), os
+      eventos são gravados um a um e só os inválidos são descartados;
+      sem acesso ao banco, ou num erro que não é do evento (timeout,
+      deadlock, failover), o lote é mantido e tentado de novo;
+    - ao encerrar o processo (atexit) a fila é drenada.
+
+Fila cheia (AUDITORIA_FILA_MAX eventos, banco lento ou fora do ar): eventos
+'info' e logins não suspeitos são descartados na hora; 'warning',
+'critical' e logins suspeitos esperam até
+AUDITORIA_ESPERA_FILA_CHEIA segundos por uma vaga antes de serem
+descartados. A requisição nunca falha por causa da auditoria; os descartes
+são contados em `estatisticas()`.
+
+Eventos que precisam ser atômicos com a alteração que registram (ex.: o
+crédito de um pagamento no webhook_abacate.py) continuam sendo gravados na
+mesma transação.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pg8000.exceptions import DatabaseError
+
+from database import conexao, registrar_consulta
+
+AUDITORIA_LOTE = int(os.getenv('AUDITORIA_LOTE', '200'))
+AUDITORIA_INTERVALO = float(os.getenv('AUDITORIA_INTERVALO', '1'))          # segundos
+AUDITORIA_FILA_MAX = int(os.getenv('AUDITORIA_FILA_MAX', '10000'))
+AUDITORIA_ESPERA_FILA_CHEIA = float(os.getenv('AUDITORIA_ESPERA_FILA_CHEIA', '0.05'))
+RECONEXAO_MAXIMA = 30
+
+SEVERIDADES = ('info', 'warning', 'critical')
+
+# Colunas preenchidas pela aplicação (log_id vem da sequência)
+COLUNAS = (
+    'event_time', 'user_id', 'session_id', 'ip_address', 'user_agent',
+    'event_type', 'event_action', 'resource_type', 'resource_id',
+    'old_data', 'new_data', 'changes', 'http_method', 'endpoint',
+    'status_code', 'severity', 'audit_metadata'
+)
+
+SQL_GRAVAR_LOTE = registrar_consulta('auditoria_gravar_lote', """
+    INSERT INTO audit_logs (
+        event_time, user_id, session_id, ip_address, user_agent,
+        event_type, event_action, resource_type, resource_id,
+        old_data, new_data, changes, http_method, endpoint,
+        status_code, severity, audit_metadata
+    )
+    SELECT event_time, user_id, session_id, ip_address, user_agent,
+           event_type, event_action, resource_type, resource_id,
+           old_data, new_data, changes, http_method, endpoint,
+           status_code, severity, COALESCE(audit_metadata, '{}'::jsonb)
+    FROM jsonb_to_recordset(CAST(:eventos AS JSONB)) AS e(
+        event_time TIMESTAMPTZ, user_id UUID, session_id UUID, ip_address INET, user_agent TEXT,
+        event_type VARCHAR(50), event_action VARCHAR(100), resource_type VARCHAR(50), resource_id UUID,
+        old_data JSONB, new_data JSONB, changes JSONB, http_method VARCHAR(10), endpoint VARCHAR(255),
+        status_code INTEGER, severity VARCHAR(20), audit_metadata JSONB
+    )
+""")
+
+COLUNAS_LOGIN = (
+    'user_id', 'login_time', 'ip_address', 'user_agent', 'device_fingerprint',
+    'geo_location', 'login_success', 'failure_reason',
+    'is_suspicious', 'suspicion_score', 'suspicion_reason'
+)
+
+# Sem o trigger de suspeita (migração 0007): a classificação vem do
+# detector_anomalias.py, já preenchida no evento
+SQL_GRAVAR_LOGINS = registrar_consulta('auditoria_gravar_logins', """
+    INSERT INTO login_history (
+        user_id, login_time, ip_address, user_agent, device_fingerprint,
+        geo_location, login_success, failure_reason,
+        is_suspicious, suspicion_score, suspicion_reason
+    )
+    SELECT user_id, login_time, ip_address, user_agent, device_fingerprint,
+           geo_location, login_success, failure_reason,
+           COALESCE(is_suspicious, false), COALESCE(suspicion_score, 0), suspicion_reason
+    FROM jsonb_to_recordset(CAST(:eventos AS JSONB)) AS e(
+        user_id UUID, login_time TIMESTAMPTZ, ip_address INET, user_agent TEXT,
+        device_fingerprint VARCHAR(255), geo_location JSONB, login_success BOOLEAN,
+        failure_reason VARCHAR(100), is_suspicious BOOLEAN, suspicion_score INTEGER,
+        suspicion_reason TEXT
+    )
+""")
+
+
+def _erro_transitorio(erro: Exception) -> bool:
+    """
+    Queda de conexão, deadlock, timeout, réplica somente leitura após um
+    failover...: o erro não é do evento, então o lote fica e é tentado de novo
+    """
+    codigo = erro.args[0].get('C', '') if erro.args and isinstance(erro.args[0], dict) else ''
+    return codigo[:2] in ('08', '25', '40', '53', '55', '57', '58')
+
+
+class EscritorAuditoria:
+    """Fila limitada de eventos de auditoria e a thread que os grava em lotes"""
+
+    def __init__(self, lote: int = AUDITORIA_LOTE, intervalo: float = AUDITORIA_INTERVALO,
+                 fila_max: int = AUDITORIA_FILA_MAX, espera_fila_cheia: float = AUDITORIA_ESPERA_FILA_CHEIA):
+        self.pid = os.getpid()
+        self.lote = max(1, lote)
+        self.intervalo = intervalo
+        self.espera_fila_cheia = espera_fila_cheia
+        # (consulta de gravação, evento); None acorda a thread no encerramento
+        self._fila: 'queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]' = queue.Queue(maxsize=fila_max)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._contadores = {
+            'enfileirados': 0,
+            'gravados': 0,
+            'lotes': 0,
+            'descartados_fila_cheia': 0,
+            'rejeitados': 0,
+            'falhas_banco': 0,
+            'maior_lote': 0
+        }
+
+    def _contar(self, contador: str, quantidade: int = 1) -> None:
+        with self._lock:
+            self._contadores[contador] += quantidade
+
+    # ----- enfileiramento (threads das requisições) -----
+
+    def registrar(self, event_type: str, event_action: str, severity: str = 'info', **campos) -> bool:
+        """
+        Enfileira um evento (colunas de audit_logs como argumentos nomeados).
+        Retorna False se ele foi descartado pela política de fila cheia.
+        """
+        if severity not in SEVERIDADES:
+            raise ValueError(f"severidade inválida: {severity}")
+        desconhecidas = set(campos) - set(COLUNAS)
+        if desconhecidas:
+            raise ValueError(f"colunas desconhecidas em audit_logs: {', '.join(sorted(desconhecidas))}")
+
+        evento = {chave: valor for chave, valor in campos.items() if valor is not None}
+        evento.setdefault('event_time', datetime.now(timezone.utc).isoformat())
+        evento.update(event_type=event_type, event_action=event_action, severity=severity)
+        for coluna in ('user_id', 'session_id', 'resource_id'):
+            if coluna in evento:
+                evento[coluna] = str(evento[coluna])
+        return self._enfileirar(SQL_GRAVAR_LOTE, evento, severity != 'info',
+                                f"evento {severity} {event_type}/{event_action}")
+
+    def registrar_login(self, user_id: str, ip_address: str, login_success: bool, **campos) -> bool:
+        """Enfileira uma tentativa de login (colunas de login_history como argumentos nomeados)"""
+        desconhecidas = set(campos) - set(COLUNAS_LOGIN)
+        if desconhecidas:
+            raise ValueError(f"colunas desconhecidas em login_history: {', '.join(sorted(desconhecidas))}")
+
+        evento = {chave: valor for chave, valor in campos.items() if valor is not None}
+        evento.setdefault('login_time', datetime.now(timezone.utc).isoformat())
+        evento.update(user_id=str(user_id), ip_address=ip_address, login_success=login_success)
+        return self._enfileirar(SQL_GRAVAR_LOGINS, evento, bool(evento.get('is_suspicious')),
+                                f"login {'suspeito ' if evento.get('is_suspicious') else ''}de {user_id}")
+
+    def _enfileirar(self, consulta: str, evento: Dict[str, Any], prioritario: bool, descricao: str) -> bool:
+        """Aplica a política de fila cheia: só eventos prioritários esperam por vaga"""
+        try:
+            if prioritario:
+                self._fila.put((consulta, evento), timeout=self.espera_fila_cheia)
+            else:
+                self._fila.put_nowait((consulta, evento))
+        except queue.Full:
+            self._contar('descartados_fila_cheia')
+            if prioritario:
+                print(f"⚠️ Fila de auditoria cheia: {descricao} descartado")
+            return False
+        self._contar('enfileirados')
+        return True
+
+    # ----- gravação (thread de fundo) -----
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._executar, name='fila-auditoria', daemon=True)
+            self._thread.start()
+
+    def _executar(self) -> None:
+        pendentes: List[Tuple[str, Dict[str, Any]]] = []
+        falhas = 0
+        while True:
+            if not pendentes:
+                pendentes = self._coletar()
+                if not pendentes:
+                    if self._parar.is_set():
+                        return
+                    continue
+            try:
+                self._gravar(pendentes)
+                pendentes = []
+                falhas = 0
+            except Exception as e:
+                # Sem acesso ao banco: o lote fica e novos eventos esperam na
+                # fila (onde vale a política de fila cheia)
+                falhas += 1
+                self._contar('falhas_banco')
+                print(f"⚠️ Auditoria sem acesso ao banco ({len(pendentes)} eventos aguardando): {e}")
+                if self._parar.is_set():
+                    print(f"❌ {len(pendentes) + self._fila.qsize()} eventos de auditoria perdidos no encerramento")
+                    return
+                self._parar.wait(min(2 ** falhas, RECONEXAO_MAXIMA))
+
+    def _coletar(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Próximo lote: cheio, ou o que chegou até `intervalo` após o primeiro evento"""
+        try:
+            primeiro = self._fila.get(timeout=self.intervalo)
+        except queue.Empty:
+            return []
+        lote = [primeiro] if primeiro is not None else []
+        prazo = time.monotonic() + self.intervalo
+        while len(lote) < self.lote:
+            # Encerrando: grava o que já está na fila sem esperar o prazo
+            restante = 0 if self._parar.is_set() else prazo - time.monotonic()
+            try:
+                evento = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if evento is not None:
+                lote.append(evento)
+        return lote
+
+    def _gravar(self, itens: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Grava o lote, um comando por tabela; o que foi gravado sai de `itens`"""
+        tamanho = len(itens)
+        por_consulta: Dict[str, List[Dict[str, Any]]] = {}
+        for consulta, evento in itens:
+            por_consulta.setdefault(consulta, []).append(evento)
+
+        with conexao() as conn:
+            for consulta, eventos in por_consulta.items():
+                try:
+                    conn.executar(consulta, eventos=json.dumps(eventos, default=str))
+                    self._contar('gravados', len(eventos))
+                except DatabaseError as e:
+                    if _erro_transitorio(e):
+                        raise
+                    # Um evento inválido não derruba o lote: grava um a um
+                    print(f"⚠️ Lote de auditoria recusado, gravando um a um: {e}")
+                    self._gravar_um_a_um(conn, consulta, eventos, itens)
+                # Se a conexão cair na próxima tabela, esta não é gravada de novo
+                itens[:] = [item for item in itens if item[0] != consulta]
+        with self._lock:
+            self._contadores['lotes'] += 1
+            self._contadores['maior_lote'] = max(self._contadores['maior_lote'], tamanho)
+
+    def _gravar_um_a_um(self, conn: Any, consulta: str, eventos: List[Dict[str, Any]],
+                        itens: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Isola os eventos que o banco recusa: só eles são descartados. Cada
+        evento resolvido sai de `itens` na hora, para que uma queda no meio
+        não grave de novo os anteriores nem descarte os seguintes.
+        """
+        for evento in eventos:
+            try:
+                conn.executar(consulta, eventos=json.dumps([evento], default=str))
+                self._contar('gravados')
+            except DatabaseError as erro:
+                if _erro_transitorio(erro):
+                    raise
+                self._contar('rejeitados')
+                print(f"❌ Evento de auditoria rejeitado ({consulta}): {erro}")
+            itens.remove((consulta, evento))
+
+    def encerrar(self, espera: float = 5) -> None:
+        """Grava os eventos que ainda estão na fila e para a thread"""
+        if os.getpid() != self.pid:
+            return
+        self._parar.set()
+        try:
+            self._fila.put_nowait(None)  # acorda a thread se estiver ociosa
+        except queue.Full:
+            pass
+        if self._thread:
+            self._thread.join(espera)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            estatisticas = dict(self._contadores)
+        estatisticas['na_fila'] = self._fila.qsize()
+        estatisticas['fila_max'] = self._fila.maxsize
+        estatisticas['eventos_por_lote'] = (round(estatisticas['gravados'] / estatisticas['lotes'], 1)
+                                            if estatisticas['lotes'] else 0.0)
+        estatisticas['gravando'] = bool(self._thread and self._thread.is_alive())
+        return estatisticas
+
+
+_escritor_auditoria: Optional[EscritorAuditoria] = None
+_escritor_auditoria_lock = threading.Lock()
+
+def get_escritor_auditoria() -> Optional[EscritorAuditoria]:
+    """Escritor do processo com a thread rodando; None sem DATABASE_URL"""
+    global _escritor_auditoria
+    if not os.getenv('DATABASE_URL'):
+        return None
+    # A thread não sobrevive a um fork (gunicorn --preload): cada worker sobe a sua
+    if _escritor_auditoria is None or _escritor_auditoria.pid != os.getpid():
+        with _escritor_auditoria_lock:
+            if _escritor_auditoria is None or _escritor_auditoria.pid != os.getpid():
+                _escritor_auditoria = EscritorAuditoria()
+                _escritor_auditoria.iniciar()
+                atexit.register(_escritor_auditoria.encerrar)
+    return _escritor_auditoria
+
+
+def auditar(event_type: str, event_action: str, severity: str = 'info', **campos) -> bool:
+    """Enfileira um evento de auditoria; sem banco configurado não faz nada"""
+    escritor = get_escritor_auditoria()
+    if escritor is None:
+        return False
+    return escritor.registrar(event_type, event_action, severity, **campos)
+
+
+def registrar_login(user_id: str, ip_address: str, login_success: bool, **campos) -> bool:
+    """Enfileira uma linha do login_history; sem banco configurado não faz nada"""
+    escritor = get_escritor_auditoria()
+    if escritor is None:
+        return False
+    return escritor.registrar_login(user_id, ip_address, login_success, **campos)
@@ -0,0 +1,293 @@
+"""
+Caixa de entrada durável dos webhooks do AbacatePay.
+
+O endpoint só valida a assinatura, grava o evento bruto em `webhook_eventos`
+e responde 200; o crédito acontece aqui, em segundo plano:
+
+    - a chave única (id do evento, ou bill_id + cliente + horário do
+      pagamento, ou hash do corpo) faz entregas
+      repetidas virarem no-op, então um pagamento nunca é creditado duas
+      vezes;
+    - workers (threads) drenam a caixa em lotes com `FOR UPDATE SKIP LOCKED`,
+      podendo rodar em vários processos ao mesmo tempo;
+    - cada evento é processado e marcado na mesma transação (savepoint por
+      evento): se o processo cair no meio, o lote volta a ficar pendente;
+    - falhas são repetidas com backoff exponencial e, após
+      WEBHOOK_MAX_TENTATIVAS, o evento fica no estado 'morto' para análise.
+
+Uso:
+    python fila_webhook.py                        # eventos por estado
+    python fila_webhook.py --reprocessar-mortos   # devolve os mortos à fila
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from database import conexao, registrar_consulta
+
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '2'))
+WEBHOOK_LOTE = int(os.getenv('WEBHOOK_LOTE', '20'))
+WEBHOOK_MAX_TENTATIVAS = int(os.getenv('WEBHOOK_MAX_TENTATIVAS', '8'))
+WEBHOOK_BACKOFF_BASE = float(os.getenv('WEBHOOK_BACKOFF_BASE', '2'))        # segundos
+WEBHOOK_BACKOFF_MAXIMO = float(os.getenv('WEBHOOK_BACKOFF_MAXIMO', '3600'))
+# Sem aviso de evento novo (ex.: recebido por outro processo), a caixa é
+# consultada a cada WEBHOOK_INTERVALO segundos
+WEBHOOK_INTERVALO = float(os.getenv('WEBHOOK_INTERVALO', '2'))
+
+SQL_ENFILEIRAR = registrar_consulta('webhook_enfileirar', """
+    INSERT INTO webhook_eventos (chave, evento, bill_id, payload)
+    VALUES (:chave, :evento, :bill_id, CAST(:payload AS JSONB))
+    ON CONFLICT (chave) DO NOTHING
+    RETURNING evento_id
+""")
+
+SQL_RESERVAR_LOTE = registrar_consulta('webhook_reservar_lote', """
+    SELECT evento_id, payload, tentativas
+    FROM webhook_eventos
+    WHERE estado = 'pendente' AND proxima_tentativa <= NOW()
+    ORDER BY proxima_tentativa
+    LIMIT :lote
+    FOR UPDATE SKIP LOCKED
+""")
+
+SQL_CONCLUIR = registrar_consulta('webhook_concluir', """
+    UPDATE webhook_eventos
+    SET estado = :estado, tentativas = tentativas + 1,
+        processado_em = NOW(), ultimo_erro = NULL
+    WHERE evento_id = :evento_id
+""")
+
+SQL_FALHAR = registrar_consulta('webhook_falhar', """
+    UPDATE webhook_eventos
+    SET tentativas = tentativas + 1,
+        ultimo_erro = :erro,
+        estado = CASE WHEN tentativas + 1 >= :max_tentativas THEN 'morto' ELSE 'pendente' END,
+        proxima_tentativa = NOW() + make_interval(secs => CAST(:espera AS DOUBLE PRECISION))
+    WHERE evento_id = :evento_id
+    RETURNING estado
+""")
+
+
+def chave_evento(payload: Dict, corpo: bytes) -> str:
+    """
+    Chave de deduplicação. Os links fixos (bronze/prata/pro) usam o mesmo
+    bill_id para todos os clientes, então o id da cobrança sozinho não
+    identifica um pagamento:
+
+        1. id do evento (`payload['id']`, o mesmo em cada reentrega);
+        2. sem ele, bill_id + usuario_id do metadata ou e-mail do cliente +
+           horário do pagamento: o mesmo cliente pode comprar o mesmo
+           pacote de novo pelo mesmo link;
+        3. em último caso, hash do corpo (reentregas trazem o mesmo corpo).
+    """
+    evento = payload.get('event', 'billing.paid')
+    if payload.get('id'):
+        return f"{evento}:{payload['id']}"
+    data = payload.get('data') or {}
+    metadata = data.get('metadata') or {}
+    cliente = metadata.get('usuario_id') or (data.get('customer') or {}).get('email')
+    pagamento = data.get('paidAt') or data.get('updatedAt')
+    if data.get('id') and cliente and pagamento:
+        return f"{evento}:{data['id']}:{cliente}:{pagamento}"
+    return f"{evento}:sha256:{hashlib.sha256(corpo).hexdigest()}"
+
+
+def _mensagem_erro(erro: Exception) -> str:
+    # Erros do servidor vêm do pg8000 como dict com a mensagem em 'M'
+    detalhe = erro.args[0] if erro.args else erro
+    if isinstance(detalhe, dict):
+        return str(detalhe.get('M', detalhe))
+    return str(detalhe)
+
+
+def espera_retentativa(tentativas: int) -> float:
+    """Backoff exponencial com jitter de ±20% (segundos até a próxima tentativa)"""
+    espera = min(WEBHOOK_BACKOFF_BASE * 2 ** tentativas, WEBHOOK_BACKOFF_MAXIMO)
+    return espera * random.uniform(0.8, 1.2)
+
+
+class FilaWebhook:
+    """Workers que drenam a caixa de entrada de webhooks deste processo"""
+
+    def __init__(self, processar: Callable[[Any, Dict], str],
+                 workers: int = WEBHOOK_WORKERS, lote: int = WEBHOOK_LOTE,
+                 max_tentativas: int = WEBHOOK_MAX_TENTATIVAS,
+                 intervalo: float = WEBHOOK_INTERVALO):
+        # `processar(conn, payload)` roda dentro da transação do lote e devolve
+        # o estado final ('processado' ou 'ignorado'); exceção = nova tentativa
+        self.processar = processar
+        self.workers = max(1, workers)
+        self.lote = lote
+        self.max_tentativas = max_tentativas
+        self.intervalo = intervalo
+        self.pid = os.getpid()
+
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._contadores = {
+            'recebidos': 0,
+            'duplicados': 0,
+            'processados': 0,
+            'ignorados': 0,
+            'falhas': 0,
+            'mortos': 0,
+            'lotes': 0
+        }
+
+    def _contar(self, contador: str, quantidade: int = 1) -> None:
+        with self._lock:
+            self._contadores[contador] += quantidade
+
+    # ----- recepção (thread da requisição) -----
+
+    def enfileirar(self, payload: Dict, corpo: bytes) -> bool:
+        """Grava o evento na caixa de entrada; False se já tinha sido recebido"""
+        data = payload.get('data') or {}
+        with conexao() as conn:
+            novo = conn.executar(SQL_ENFILEIRAR,
+                chave=chave_evento(payload, corpo),
+                evento=payload.get('event', 'billing.paid'),
+                bill_id=data.get('id'),
+                payload=json.dumps(payload, ensure_ascii=False)
+            )
+        if not novo:
+            self._contar('duplicados')
+            return False
+        self._contar('recebidos')
+        self._acordar.set()
+        return True
+
+    # ----- processamento (threads de fundo) -----
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for numero in range(self.workers):
+                thread = threading.Thread(target=self._executar, name=f'fila-webhook-{numero}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"📬 Fila de webhooks: {self.workers} workers, lotes de {self.lote}")
+
+    def _executar(self) -> None:
+        while not self._parar.is_set():
+            # Limpo antes de drenar: um aviso que chegar durante o lote não se perde
+            self._acordar.clear()
+            try:
+                # Drena enquanto houver lotes cheios; depois espera aviso ou intervalo
+                while not self._parar.is_set() and self.drenar_lote() >= self.lote:
+                    pass
+            except Exception as e:
+                print(f"⚠️ Fila de webhooks sem acesso ao banco: {e}")
+            self._acordar.wait(self.intervalo)
+
+    def drenar_lote(self) -> int:
+        """Processa um lote de eventos pendentes; devolve quantos foram reservados"""
+        with conexao() as conn:
+            conn.run("BEGIN")
+            eventos = conn.executar(SQL_RESERVAR_LOTE, lote=self.lote)
+            for evento_id, payload, tentativas in eventos:
+                if isinstance(payload, str):
+                    payload = json.loads(payload)
+                conn.run("SAVEPOINT evento")
+                try:
+                    estado = self.processar(conn, payload)
+                    conn.executar(SQL_CONCLUIR, evento_id=evento_id, estado=estado)
+                    conn.run("RELEASE SAVEPOINT evento")
+                    self._contar('processados' if estado == 'processado' else 'ignorados')
+                except Exception as e:
+                    # Desfaz só este evento; os demais do lote seguem
+                    conn.run("ROLLBACK TO SAVEPOINT evento")
+                    estado = conn.executar(SQL_FALHAR,
+                        evento_id=evento_id,
+                        erro=_mensagem_erro(e)[:1000],
+                        max_tentativas=self.max_tentativas,
+                        espera=espera_retentativa(tentativas)
+                    )[0][0]
+                    self._contar('mortos' if estado == 'morto' else 'falhas')
+                    print(f"❌ Evento {evento_id} falhou (tentativa {tentativas + 1}): {_mensagem_erro(e)}"
+                          + (" - movido para mortos" if estado == 'morto' else ""))
+            conn.run("COMMIT")
+        if eventos:
+            self._contar('lotes')
+        return len(eventos)
+
+    def encerrar(self, espera: float = 5) -> None:
+        """Para os workers depois do lote em andamento"""
+        if os.getpid() != self.pid:
+            return
+        self._parar.set()
+        self._acordar.set()
+        for thread in self._threads:
+            thread.join(espera)
+
+    def estatisticas(self, incluir_banco: bool = True) -> Dict[str, Any]:
+        """Contadores deste processo e, opcionalmente, eventos por estado no banco"""
+        with self._lock:
+            estatisticas = dict(self._contadores)
+        estatisticas['workers'] = self.workers
+        if incluir_banco:
+            try:
+                estatisticas['eventos_por_estado'] = eventos_por_estado()
+            except Exception as e:
+                estatisticas['eventos_por_estado'] = {'erro': str(e)}
+        return estatisticas
+
+
+def eventos_por_estado() -> Dict[str, int]:
+    """Total de eventos da caixa de entrada em cada estado"""
+    with conexao() as conn:
+        return {estado: total for estado, total in conn.run(
+            "SELECT estado, COUNT(*) FROM webhook_eventos GROUP BY estado"
+        )}
+
+
+def reprocessar_mortos() -> int:
+    """Devolve os eventos mortos à fila, com as tentativas zeradas"""
+    with conexao() as conn:
+        return len(conn.run("""
+            UPDATE webhook_eventos
+            SET estado = 'pendente', tentativas = 0, proxima_tentativa = NOW()
+            WHERE estado = 'morto'
+            RETURNING evento_id
+        """))
+
+
+_fila_webhook: Optional[FilaWebhook] = None
+_fila_webhook_lock = threading.Lock()
+
+def get_fila_webhook(processar: Callable[[Any, Dict], str]) -> FilaWebhook:
+    """Retorna a fila do processo com os workers rodando, criando-a se preciso"""
+    global _fila_webhook
+    # Threads não sobrevivem a um fork (gunicorn --preload): cada worker
+    # do gunicorn sobe os seus
+    if _fila_webhook is None or _fila_webhook.pid != os.getpid():
+        with _fila_webhook_lock:
+            if _fila_webhook is None or _fila_webhook.pid != os.getpid():
+                _fila_webhook = FilaWebhook(processar)
+                _fila_webhook.iniciar()
+                atexit.register(_fila_webhook.encerrar)
+    return _fila_webhook
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reprocessar-mortos', action='store_true', help='devolve os mortos à fila')
+    args = parser.parse_args()
+
+    if args.reprocessar_mortos:
+        print(f"🔁 {reprocessar_mortos()} eventos devolvidos à fila")
+    for estado, total in sorted(eventos_por_estado().items()):
+        print(f"{estado:<12} {total}")
+
+
+if __name__ == '__main__':
+    main()
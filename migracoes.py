@@ -0,0 +1,226 @@
+"""
+Migrações versionadas do esquema PostgreSQL.
+
+Aplica, uma única vez e em ordem, os arquivos `migracoes/NNNN_nome.sql` e
+registra cada versão na tabela `schema_migracoes`. Roda no deploy
+(`python migracoes.py`) e na inicialização do backend e do webhook; com as
+versões registradas, as inicializações seguintes custam uma consulta.
+
+    - banco vazio: aplica antes o esquema base (bancodedados.sql +
+      auditoria.sql), registrado como versão 0;
+    - banco já existente: a versão 0 só é registrada;
+    - cada migração roda na sua própria transação;
+    - um advisory lock impede que vários workers migrem ao mesmo tempo;
+    - migração já aplicada cujo arquivo mudou gera aviso (o conteúdo
+      aplicado não é alterado: mudanças vão numa migração nova).
+
+vazamentodedado.sql (criptografia in-place e RLS dependente de variáveis de
+sessão) continua sendo aplicado manualmente.
+
+Uso:
+    python migracoes.py            # aplica as pendentes
+    python migracoes.py --status   # lista aplicadas e pendentes
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import time
+from typing import Dict, List
+
+from database import conexao, get_pool
+
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_MIGRACOES = os.path.join(DIRETORIO_BASE, 'migracoes')
+ESQUEMA_BASE = ('bancodedados.sql', 'auditoria.sql')
+
+# Chave do pg_advisory_lock que serializa as migrações entre processos
+CHAVE_BLOQUEIO = 7260412
+
+_ARQUIVO_MIGRACAO = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+class ErroMigracao(Exception):
+    """Falha ao aplicar uma migração (a transação dela é desfeita)"""
+
+
+class Migracao:
+    """Arquivo de migração: versão, nome, SQL e checksum"""
+
+    __slots__ = ('versao', 'nome', 'sql', 'checksum')
+
+    def __init__(self, versao: int, nome: str, sql: str):
+        self.versao = versao
+        self.nome = nome
+        self.sql = sql
+        # Independente de CRLF/LF do checkout
+        self.checksum = hashlib.sha256(sql.replace('\r\n', '\n').encode('utf-8')).hexdigest()
+
+
+def _ler(caminho: str) -> str:
+    with open(caminho, encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+def esquema_base() -> Migracao:
+    """Versão 0: esquema canônico aplicado em bancos vazios"""
+    sql = '\n'.join(_ler(os.path.join(DIRETORIO_BASE, nome)) for nome in ESQUEMA_BASE)
+    return Migracao(0, 'esquema_base', sql)
+
+
+def listar_migracoes() -> List[Migracao]:
+    """Migrações do diretório `migracoes/`, em ordem de versão"""
+    migracoes = []
+    for arquivo in sorted(os.listdir(DIRETORIO_MIGRACOES)):
+        encontrado = _ARQUIVO_MIGRACAO.match(arquivo)
+        if encontrado:
+            sql = _ler(os.path.join(DIRETORIO_MIGRACOES, arquivo))
+            migracoes.append(Migracao(int(encontrado.group(1)), encontrado.group(2), sql))
+
+    versoes = [migracao.versao for migracao in migracoes]
+    if len(set(versoes)) != len(versoes):
+        raise ErroMigracao(f"versões de migração repetidas em {DIRETORIO_MIGRACOES}")
+    return migracoes
+
+
+def _criar_tabela_versoes(conn) -> None:
+    conn.run("""
+        CREATE TABLE IF NOT EXISTS schema_migracoes (
+            versao INTEGER PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            aplicada_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            duracao_ms INTEGER
+        )
+    """)
+
+
+def _versoes_aplicadas(conn) -> Dict[int, str]:
+    return {versao: checksum for versao, checksum in conn.run(
+        "SELECT versao, checksum FROM schema_migracoes"
+    )}
+
+
+def _registrar(conn, migracao: Migracao, duracao_ms) -> None:
+    conn.run("""
+        INSERT INTO schema_migracoes (versao, nome, checksum, duracao_ms)
+        VALUES (:versao, :nome, :checksum, :duracao_ms)
+    """, versao=migracao.versao, nome=migracao.nome,
+        checksum=migracao.checksum, duracao_ms=duracao_ms)
+
+
+def _aplicar(conn, migracao: Migracao) -> None:
+    """Executa a migração e registra a versão na mesma transação"""
+    inicio = time.perf_counter()
+    try:
+        conn.run("BEGIN")
+        conn.run(migracao.sql)
+        _registrar(conn, migracao, int((time.perf_counter() - inicio) * 1000))
+        conn.run("COMMIT")
+    except Exception as e:
+        conn.run("ROLLBACK")
+        raise ErroMigracao(f"migração {migracao.versao:04d}_{migracao.nome} falhou: {e}") from e
+    print(f"🗄️ Migração {migracao.versao:04d}_{migracao.nome} aplicada "
+          f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+
+def aplicar_migracoes() -> List[str]:
+    """Aplica as migrações pendentes; devolve os nomes das aplicadas"""
+    migracoes = listar_migracoes()
+    aplicadas_agora = []
+
+    with conexao() as conn:
+        conn.run("SELECT pg_advisory_lock(:chave)", chave=CHAVE_BLOQUEIO)
+        try:
+            _criar_tabela_versoes(conn)
+            # Lidas depois do lock: outro processo pode ter acabado de migrar
+            aplicadas = _versoes_aplicadas(conn)
+
+            if 0 not in aplicadas:
+                base = esquema_base()
+                if conn.run("SELECT to_regclass('public.users') IS NOT NULL")[0][0]:
+                    _registrar(conn, base, None)
+                    print("📌 Esquema base já existente registrado como versão 0")
+                else:
+                    _aplicar(conn, base)
+                    aplicadas_agora.append(base.nome)
+
+            for migracao in migracoes:
+                checksum = aplicadas.get(migracao.versao)
+                if checksum is None:
+                    _aplicar(conn, migracao)
+                    aplicadas_agora.append(f"{migracao.versao:04d}_{migracao.nome}")
+                elif checksum != migracao.checksum:
+                    print(f"⚠️ Migração {migracao.versao:04d}_{migracao.nome} foi alterada "
+                          f"depois de aplicada; crie uma nova migração para a mudança")
+        finally:
+            conn.run("SELECT pg_advisory_unlock(:chave)", chave=CHAVE_BLOQUEIO)
+
+    if not aplicadas_agora:
+        print("✅ Esquema do banco atualizado (nenhuma migração pendente)")
+    return aplicadas_agora
+
+
+def status_migracoes() -> List[Dict]:
+    """Situação de cada migração: aplicada (e quando), alterada ou pendente"""
+    with conexao() as conn:
+        _criar_tabela_versoes(conn)
+        registradas = {linha[0]: linha for linha in conn.run(
+            "SELECT versao, nome, checksum, aplicada_em FROM schema_migracoes"
+        )}
+
+    situacao = []
+    for migracao in [esquema_base()] + listar_migracoes():
+        registrada = registradas.get(migracao.versao)
+        if registrada is None:
+            estado = 'pendente'
+        elif migracao.versao and registrada[2] != migracao.checksum:
+            estado = 'alterada'
+        else:
+            estado = 'aplicada'
+        situacao.append({
+            'versao': migracao.versao,
+            'nome': migracao.nome,
+            'estado': estado,
+            'aplicada_em': registrada[3].isoformat() if registrada else None
+        })
+    return situacao
+
+
+def migrar_na_inicializacao() -> bool:
+    """
+    Aplica as migrações pendentes na subida do servidor. Desligável com
+    MIGRAR_NA_INICIALIZACAO=0 (quando o deploy já roda `python migracoes.py`).
+    Falhas são registradas sem impedir a subida.
+    """
+    if not os.getenv('DATABASE_URL') or os.getenv('MIGRAR_NA_INICIALIZACAO', '1') == '0':
+        return False
+    try:
+        aplicar_migracoes()
+        return True
+    except Exception as e:
+        print(f"❌ Migrações não aplicadas: {e}")
+        return False
+    finally:
+        # No gunicorn --preload isto roda no master: nenhuma conexão ociosa
+        # fica para ser herdada pelos workers
+        pool = get_pool()
+        if pool:
+            pool.fechar_ociosas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--status', action='store_true', help='lista aplicadas e pendentes')
+    args = parser.parse_args()
+
+    if args.status:
+        for item in status_migracoes():
+            print(f"{item['versao']:04d}_{item['nome']:<28} {item['estado']:<9} {item['aplicada_em'] or ''}")
+    else:
+        aplicar_migracoes()
+
+
+if __name__ == '__main__':
+    main()
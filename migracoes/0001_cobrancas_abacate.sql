@@ -0,0 +1,28 @@
+-- =====================================================
+-- 0001. COBRANÇAS ABACATEPAY
+-- =====================================================
+-- Antes criada com CREATE TABLE IF NOT EXISTS a cada chamada de
+-- salvar_cobranca (backend) e registrar_pagamento (webhook)
+
+CREATE TABLE IF NOT EXISTS cobrancas_abacate (
+    id SERIAL PRIMARY KEY,
+    bill_id TEXT UNIQUE,
+    usuario_id UUID,
+    pacote TEXT,
+    valor REAL,
+    creditos TEXT,
+    url_pagamento TEXT,
+    status TEXT DEFAULT 'PENDENTE',
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_pagamento TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cobrancas_usuario ON cobrancas_abacate(usuario_id);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_user') THEN
+        GRANT SELECT, INSERT, UPDATE ON cobrancas_abacate TO app_user;
+        GRANT USAGE ON SEQUENCE cobrancas_abacate_id_seq TO app_user;
+    END IF;
+END $$;
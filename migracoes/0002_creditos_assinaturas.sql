@@ -0,0 +1,28 @@
+-- =====================================================
+-- 0002. CRÉDITOS E PLANO PRO
+-- =====================================================
+-- Colunas e chaves usadas pelo login, pelo status e pelo webhook
+
+-- Saldo de BuroCréditos da assinatura
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS burocreditos INTEGER NOT NULL DEFAULT 0;
+
+-- Uma assinatura por usuário: alvo do INSERT ... ON CONFLICT (user_id)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'subscriptions'::regclass AND conname = 'subscriptions_user_id_key'
+    ) THEN
+        ALTER TABLE subscriptions ADD CONSTRAINT subscriptions_user_id_key UNIQUE (user_id);
+    END IF;
+END $$;
+
+-- Coberto pelo índice da chave única
+DROP INDEX IF EXISTS idx_subscriptions_user;
+
+-- Plano exibido após a compra do pacote PRO
+ALTER TABLE users ADD COLUMN IF NOT EXISTS plano VARCHAR(20) DEFAULT 'FREE';
+
+INSERT INTO plans (plan_code, plan_name, plan_type, billing_cycle, features, max_users, max_contracts)
+VALUES ('pro', 'Burocrata PRO', 'paid', 'one_time', '{"analises": "ilimitado", "suporte": "prioritario"}', 1, 1000)
+ON CONFLICT (plan_code) DO NOTHING;
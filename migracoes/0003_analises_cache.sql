@@ -0,0 +1,25 @@
+-- =====================================================
+-- 0003. CACHE DE ANÁLISES
+-- =====================================================
+-- Mesma definição da seção 5.1 de bancodedados.sql, para bancos criados
+-- antes dela
+
+CREATE TABLE IF NOT EXISTS analises_cache (
+    documento_sha256 CHAR(64) NOT NULL,
+    versao_regras VARCHAR(32) NOT NULL,
+    resultado JSONB NOT NULL,
+    tamanho_bytes INTEGER NOT NULL,
+    criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    acessado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    acessos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (documento_sha256, versao_regras)
+);
+
+CREATE INDEX IF NOT EXISTS idx_analises_cache_acesso ON analises_cache(acessado_em DESC);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_user') THEN
+        GRANT SELECT, INSERT, UPDATE, DELETE ON analises_cache TO app_user;
+    END IF;
+END $$;
@@ -0,0 +1,36 @@
+-- =====================================================
+-- 0004. CAIXA DE ENTRADA DOS WEBHOOKS
+-- =====================================================
+-- Eventos do AbacatePay gravados na chegada (antes do 200) e processados
+-- em segundo plano. A chave única descarta entregas repetidas do mesmo
+-- evento (fila_webhook.chave_evento).
+
+CREATE TABLE IF NOT EXISTS webhook_eventos (
+    evento_id BIGSERIAL PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,           -- '<evento>:<id do evento>' (ou bill_id + cliente + pagamento, ou hash do corpo)
+    evento VARCHAR(100) NOT NULL,
+    bill_id TEXT,
+    payload JSONB NOT NULL,
+
+    -- pendente -> processado | ignorado; após o limite de tentativas, morto
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (estado IN ('pendente', 'processado', 'ignorado', 'morto')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    ultimo_erro TEXT,
+
+    recebido_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    processado_em TIMESTAMP WITH TIME ZONE
+);
+
+-- Só os pendentes são varridos pelos workers
+CREATE INDEX IF NOT EXISTS idx_webhook_eventos_pendentes
+    ON webhook_eventos(proxima_tentativa) WHERE estado = 'pendente';
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_user') THEN
+        GRANT SELECT, INSERT, UPDATE ON webhook_eventos TO app_user;
+        GRANT USAGE ON SEQUENCE webhook_eventos_evento_id_seq TO app_user;
+    END IF;
+END $$;
@@ -0,0 +1,65 @@
+-- =====================================================
+-- 0005. RESERVAS E LIVRO-RAZÃO DE BUROCRÉDITOS
+-- =====================================================
+-- Usado por creditos.py: reserva atômica antes da análise, confirmação ou
+-- devolução depois, e o histórico de movimentos (só inserção) compactado
+-- periodicamente em saldos por usuário
+
+CREATE TABLE IF NOT EXISTS creditos_reservas (
+    reserva_id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    quantidade INTEGER NOT NULL CHECK (quantidade > 0),
+    estado VARCHAR(20) NOT NULL DEFAULT 'reservada'
+        CHECK (estado IN ('reservada', 'confirmada', 'liberada', 'estornada')),
+    documento CHAR(64),
+    motivo VARCHAR(50),
+    criada_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    expira_em TIMESTAMP WITH TIME ZONE NOT NULL,
+    finalizada_em TIMESTAMP WITH TIME ZONE
+);
+
+-- Reservas abertas, varridas por expirar_reservas()
+CREATE INDEX IF NOT EXISTS idx_creditos_reservas_abertas
+    ON creditos_reservas (expira_em) WHERE estado = 'reservada';
+
+-- Cada mudança de saldo: reserva (-), liberação/estorno (+), compra (+)
+CREATE TABLE IF NOT EXISTS creditos_movimentos (
+    movimento_id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    delta INTEGER NOT NULL,
+    motivo VARCHAR(30) NOT NULL,
+    reserva_id BIGINT,
+    referencia TEXT,
+    criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_creditos_movimentos_usuario
+    ON creditos_movimentos (user_id, movimento_id);
+CREATE INDEX IF NOT EXISTS idx_creditos_movimentos_criado
+    ON creditos_movimentos (criado_em);
+
+-- Soma dos movimentos já compactados de cada usuário
+CREATE TABLE IF NOT EXISTS creditos_saldos (
+    user_id UUID PRIMARY KEY,
+    saldo BIGINT NOT NULL,
+    movimentos BIGINT NOT NULL DEFAULT 0,
+    ate_movimento_id BIGINT NOT NULL DEFAULT 0,
+    compactado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Ponto de partida: o saldo atual de cada assinatura
+INSERT INTO creditos_saldos (user_id, saldo)
+SELECT user_id, burocreditos FROM subscriptions
+ON CONFLICT (user_id) DO NOTHING;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_user') THEN
+        GRANT SELECT, INSERT, UPDATE ON creditos_reservas TO app_user;
+        GRANT USAGE ON SEQUENCE creditos_reservas_reserva_id_seq TO app_user;
+        -- Só inserção para a aplicação; a compactação roda como dono
+        GRANT SELECT, INSERT ON creditos_movimentos TO app_user;
+        GRANT USAGE ON SEQUENCE creditos_movimentos_movimento_id_seq TO app_user;
+        GRANT SELECT ON creditos_saldos TO app_user;
+    END IF;
+END $$;
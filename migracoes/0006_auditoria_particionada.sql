@@ -0,0 +1,239 @@
+-- =====================================================
+-- 0006. AUDITORIA E LOGINS PARTICIONADOS POR MÊS
+-- =====================================================
+-- audit_logs e login_history passam a ser particionadas por mês (RANGE no
+-- horário do evento). Cada inserção só mantém os índices da partição do
+-- mês corrente, e a retenção remove meses inteiros (DETACH + DROP) em vez
+-- de DELETEs. Partições futuras e retenção: particoes_auditoria.py.
+--
+-- Índices enxutos:
+--   - BRIN no horário (as linhas chegam em ordem de tempo): consultas por
+--     período custam poucas páginas de índice;
+--   - B-tree só onde a busca é seletiva: histórico por usuário (LGPD,
+--     trigger de login suspeito) e recurso auditado;
+--   - removidos event_type, severity e ip_address (poucos valores
+--     distintos ou consulta rara: filtram depois do recorte por período).
+--
+-- A chave primária inclui a coluna de partição. Os dados existentes são
+-- copiados para as partições dentro desta migração.
+
+-- Cria a partição mensal de `tabela` que contém `mes` (limites em UTC).
+-- Linhas do mês que tenham caído na partição padrão são movidas para ela.
+-- A partição é criada fora da tabela e depois anexada (ATTACH): na tabela
+-- principal o ATTACH não bloqueia leituras nem inserções, mas a partição
+-- padrão fica travada (ACCESS EXCLUSIVE) enquanto é varrida para conferir
+-- que nenhuma linha sua pertence ao novo mês, e inserções que cairiam nela
+-- esperam. Por isso particoes_auditoria.py cria os meses com antecedência:
+-- a padrão fica vazia e a varredura é instantânea.
+CREATE OR REPLACE FUNCTION criar_particao_mensal(tabela TEXT, coluna TEXT, mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    inicio TIMESTAMPTZ := date_trunc('month', mes)::timestamp AT TIME ZONE 'UTC';
+    fim TIMESTAMPTZ := (date_trunc('month', mes) + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+    particao TEXT := tabela || '_' || to_char(mes, 'YYYY_MM');
+    padrao TEXT := tabela || '_padrao';
+    colunas TEXT;
+BEGIN
+    IF to_regclass(particao) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)',
+                   particao, tabela);
+
+    IF to_regclass(padrao) IS NOT NULL THEN
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO colunas
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(tabela) AND attnum > 0
+          AND NOT attisdropped AND attgenerated = '';
+        EXECUTE format('WITH movidas AS (DELETE FROM %I WHERE %I >= $1 AND %I < $2 RETURNING %s) '
+                       'INSERT INTO %I (%s) SELECT %s FROM movidas',
+                       padrao, coluna, coluna, colunas, particao, colunas, colunas)
+            USING inicio, fim;
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   tabela, particao, inicio, fim);
+    RETURN particao;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A view de relatórios depende de login_history; recriada no fim
+DROP VIEW IF EXISTS user_security_summary;
+
+-- ----- audit_logs -----
+
+ALTER TABLE audit_logs RENAME TO audit_logs_legado;
+ALTER TABLE audit_logs_legado RENAME CONSTRAINT audit_logs_pkey TO audit_logs_legado_pkey;
+DROP INDEX IF EXISTS idx_audit_user_time, idx_audit_event_time, idx_audit_event_type,
+                     idx_audit_resource, idx_audit_ip, idx_audit_severity;
+
+CREATE TABLE audit_logs (
+    log_id BIGINT NOT NULL DEFAULT nextval('audit_logs_log_id_seq'),
+    event_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+
+    -- Quem
+    user_id UUID CONSTRAINT audit_logs_user_id_fkey REFERENCES users(user_id) ON DELETE SET NULL,
+    session_id UUID,
+    ip_address INET,
+    user_agent TEXT,
+
+    -- O que
+    event_type VARCHAR(50) NOT NULL,
+    event_action VARCHAR(100) NOT NULL,
+
+    -- Onde
+    resource_type VARCHAR(50),
+    resource_id UUID,
+
+    -- Detalhes
+    old_data JSONB,
+    new_data JSONB,
+    changes JSONB,
+    http_method VARCHAR(10),
+    endpoint VARCHAR(255),
+    status_code INTEGER,
+
+    -- Metadados
+    severity VARCHAR(20) DEFAULT 'info'
+        CONSTRAINT audit_logs_severity_check CHECK (severity IN ('info', 'warning', 'critical')),
+    audit_metadata JSONB DEFAULT '{}'::jsonb,
+
+    PRIMARY KEY (log_id, event_time)
+) PARTITION BY RANGE (event_time);
+
+ALTER SEQUENCE audit_logs_log_id_seq OWNED BY audit_logs.log_id;
+
+CREATE INDEX idx_audit_event_time_brin ON audit_logs USING BRIN (event_time);
+CREATE INDEX idx_audit_user_time ON audit_logs (user_id, event_time DESC) WHERE user_id IS NOT NULL;
+CREATE INDEX idx_audit_resource ON audit_logs (resource_type, resource_id) WHERE resource_id IS NOT NULL;
+
+-- Eventos fora das partições mensais (ex.: relógio adiantado) não se perdem
+CREATE TABLE audit_logs_padrao PARTITION OF audit_logs DEFAULT;
+
+-- ----- login_history -----
+
+ALTER TABLE login_history RENAME TO login_history_legado;
+ALTER TABLE login_history_legado RENAME CONSTRAINT login_history_pkey TO login_history_legado_pkey;
+DROP TRIGGER IF EXISTS trigger_check_suspicious_login ON login_history_legado;
+DROP INDEX IF EXISTS idx_login_user_time, idx_login_ip, idx_login_suspicious;
+
+CREATE TABLE login_history (
+    login_id BIGINT NOT NULL DEFAULT nextval('login_history_login_id_seq'),
+    user_id UUID NOT NULL CONSTRAINT login_history_user_id_fkey REFERENCES users(user_id) ON DELETE CASCADE,
+    login_time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    logout_time TIMESTAMP WITH TIME ZONE,
+    ip_address INET NOT NULL,
+    user_agent TEXT,
+    device_fingerprint VARCHAR(255),
+    geo_location JSONB,
+    login_success BOOLEAN NOT NULL DEFAULT true,
+    failure_reason VARCHAR(100),
+    session_duration INTERVAL GENERATED ALWAYS AS (logout_time - login_time) STORED,
+
+    -- Detecção de anomalias
+    is_suspicious BOOLEAN DEFAULT false,
+    suspicion_score INTEGER DEFAULT 0,
+    suspicion_reason TEXT,
+
+    PRIMARY KEY (login_id, login_time)
+) PARTITION BY RANGE (login_time);
+
+ALTER SEQUENCE login_history_login_id_seq OWNED BY login_history.login_id;
+
+CREATE INDEX idx_login_time_brin ON login_history USING BRIN (login_time);
+CREATE INDEX idx_login_user_time ON login_history (user_id, login_time DESC);
+CREATE INDEX idx_login_suspicious ON login_history (login_time) WHERE is_suspicious;
+
+CREATE TABLE login_history_padrao PARTITION OF login_history DEFAULT;
+
+CREATE TRIGGER trigger_check_suspicious_login
+    BEFORE INSERT ON login_history
+    FOR EACH ROW
+    EXECUTE FUNCTION check_suspicious_login();
+
+-- ----- partições: do mês mais antigo existente até 3 meses à frente -----
+
+DO $$
+DECLARE
+    mes DATE;
+BEGIN
+    SELECT date_trunc('month', LEAST(COALESCE(MIN(event_time), NOW()), NOW()) AT TIME ZONE 'UTC')::date
+    INTO mes FROM audit_logs_legado;
+    WHILE mes <= (date_trunc('month', NOW() AT TIME ZONE 'UTC') + INTERVAL '3 months')::date LOOP
+        PERFORM criar_particao_mensal('audit_logs', 'event_time', mes);
+        mes := (mes + INTERVAL '1 month')::date;
+    END LOOP;
+
+    SELECT date_trunc('month', LEAST(COALESCE(MIN(login_time), NOW()), NOW()) AT TIME ZONE 'UTC')::date
+    INTO mes FROM login_history_legado;
+    WHILE mes <= (date_trunc('month', NOW() AT TIME ZONE 'UTC') + INTERVAL '3 months')::date LOOP
+        PERFORM criar_particao_mensal('login_history', 'login_time', mes);
+        mes := (mes + INTERVAL '1 month')::date;
+    END LOOP;
+END $$;
+
+-- ----- dados existentes -----
+
+INSERT INTO audit_logs (
+    log_id, event_time, user_id, session_id, ip_address, user_agent,
+    event_type, event_action, resource_type, resource_id,
+    old_data, new_data, changes, http_method, endpoint,
+    status_code, severity, audit_metadata
+)
+SELECT log_id, event_time, user_id, session_id, ip_address, user_agent,
+       event_type, event_action, resource_type, resource_id,
+       old_data, new_data, changes, http_method, endpoint,
+       status_code, severity, audit_metadata
+FROM audit_logs_legado;
+
+-- Sem o trigger: as linhas já trazem a classificação de suspeita
+INSERT INTO login_history (
+    login_id, user_id, login_time, logout_time, ip_address, user_agent,
+    device_fingerprint, geo_location, login_success, failure_reason,
+    is_suspicious, suspicion_score, suspicion_reason
+)
+SELECT login_id, user_id, login_time, logout_time, ip_address, user_agent,
+       device_fingerprint, geo_location, login_success, failure_reason,
+       is_suspicious, suspicion_score, suspicion_reason
+FROM login_history_legado;
+
+DROP TABLE audit_logs_legado;
+DROP TABLE login_history_legado;
+
+-- ----- view de relatórios (mesma definição de bancodedados.sql) -----
+
+CREATE VIEW user_security_summary AS
+SELECT
+    u.user_id,
+    u.email,
+    u.account_status,
+    COUNT(DISTINCT lh.login_id) as total_logins,
+    MAX(lh.login_time) as last_login,
+    COUNT(DISTINCT CASE WHEN lh.is_suspicious THEN lh.login_id END) as suspicious_logins,
+    ARRAY_AGG(DISTINCT r.role_name) as roles,
+    uc.consent_active
+FROM users u
+LEFT JOIN login_history lh ON u.user_id = lh.user_id
+LEFT JOIN user_roles ur ON u.user_id = ur.user_id
+LEFT JOIN roles r ON ur.role_id = r.role_id
+LEFT JOIN LATERAL (
+    SELECT bool_and(revoked_at IS NULL) as consent_active
+    FROM user_consents
+    WHERE user_id = u.user_id
+) uc ON true
+GROUP BY u.user_id, u.email, u.account_status, uc.consent_active;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_user') THEN
+        GRANT SELECT, INSERT ON audit_logs, login_history TO app_user;
+        GRANT USAGE ON SEQUENCE audit_logs_log_id_seq, login_history_login_id_seq TO app_user;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_admin') THEN
+        GRANT ALL ON audit_logs, login_history, user_security_summary TO app_admin;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'audit_viewer') THEN
+        GRANT SELECT ON audit_logs, login_history TO audit_viewer;
+    END IF;
+END $$;
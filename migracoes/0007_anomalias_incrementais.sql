@@ -0,0 +1,33 @@
+-- =====================================================
+-- 0007. DETECÇÃO DE ANOMALIAS INCREMENTAL
+-- =====================================================
+-- A classificação de suspeita passa a ser feita na rota de login por
+-- detector_anomalias.py (janelas deslizantes em memória, tempo constante
+-- por tentativa) e chega pronta nas linhas do login_history. O trigger,
+-- que consultava o histórico do usuário a cada login gravado, sai.
+
+DROP TRIGGER IF EXISTS trigger_check_suspicious_login ON login_history;
+DROP FUNCTION IF EXISTS check_suspicious_login();
+
+-- As anomalias detectadas são gravadas em audit_logs
+-- (event_type 'security_anomaly'). A função mantém a interface antiga,
+-- mas só lê os eventos da última hora (BRIN no horário) em vez de agrupar
+-- o login_history.
+CREATE OR REPLACE FUNCTION detect_anomalies()
+RETURNS TABLE (
+    anomaly_type TEXT,
+    user_id UUID,
+    description TEXT,
+    severity TEXT
+) AS $$
+    SELECT a.event_action::TEXT,
+           a.user_id,
+           a.audit_metadata->>'description',
+           a.audit_metadata->>'severity'
+    FROM audit_logs a
+    WHERE a.event_type = 'security_anomaly'
+      AND a.event_time > NOW() - INTERVAL '1 hour'
+      -- Falhas seguidas valem pela janela de 5 minutos, como antes
+      AND (a.event_action = 'suspicious_location' OR a.event_time > NOW() - INTERVAL '5 minutes')
+    ORDER BY a.event_time DESC;
+$$ LANGUAGE sql STABLE;
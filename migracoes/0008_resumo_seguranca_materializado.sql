@@ -0,0 +1,97 @@
+-- =====================================================
+-- 0008. USER_SECURITY_SUMMARY MATERIALIZADA
+-- =====================================================
+-- A view agregava users, login_history, papéis e consentimentos a cada
+-- leitura. Agora é materializada: os painéis leem linhas prontas (por
+-- user_id ou pelos suspeitos, via índice), e o resumo_seguranca.py a
+-- atualiza com REFRESH ... CONCURRENTLY (sem bloquear leituras), por
+-- agenda ou quando as tabelas de origem mudam.
+
+DROP VIEW IF EXISTS user_security_summary;
+
+-- Mesmas colunas da view; os logins são agregados uma vez por usuário em
+-- vez de multiplicados pelos papéis antes do COUNT(DISTINCT)
+CREATE MATERIALIZED VIEW user_security_summary AS
+SELECT
+    u.user_id,
+    u.email,
+    u.account_status,
+    COALESCE(lh.total_logins, 0) as total_logins,
+    lh.last_login,
+    COALESCE(lh.suspicious_logins, 0) as suspicious_logins,
+    r.roles,
+    uc.consent_active
+FROM users u
+LEFT JOIN (
+    SELECT user_id,
+           COUNT(*) as total_logins,
+           MAX(login_time) as last_login,
+           COUNT(*) FILTER (WHERE is_suspicious) as suspicious_logins
+    FROM login_history
+    GROUP BY user_id
+) lh ON lh.user_id = u.user_id
+LEFT JOIN LATERAL (
+    SELECT ARRAY_AGG(DISTINCT r.role_name) as roles
+    FROM user_roles ur
+    JOIN roles r ON r.role_id = ur.role_id
+    WHERE ur.user_id = u.user_id
+) r ON true
+LEFT JOIN LATERAL (
+    SELECT bool_and(revoked_at IS NULL) as consent_active
+    FROM user_consents
+    WHERE user_id = u.user_id
+) uc ON true
+WITH DATA;
+
+-- Obrigatório para REFRESH CONCURRENTLY; também atende a busca por usuário
+CREATE UNIQUE INDEX idx_user_security_summary_user ON user_security_summary (user_id);
+-- Painel de usuários com logins suspeitos
+CREATE INDEX idx_user_security_summary_suspeitos
+    ON user_security_summary (suspicious_logins DESC) WHERE suspicious_logins > 0;
+
+-- Quando cada visão materializada foi atualizada pela última vez
+CREATE TABLE IF NOT EXISTS visoes_atualizacoes (
+    visao VARCHAR(100) PRIMARY KEY,
+    atualizada_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    duracao_ms INTEGER,
+    linhas BIGINT
+);
+
+INSERT INTO visoes_atualizacoes (visao, linhas)
+SELECT 'user_security_summary', COUNT(*) FROM user_security_summary
+ON CONFLICT (visao) DO UPDATE SET
+    atualizada_em = NOW(), duracao_ms = NULL, linhas = EXCLUDED.linhas;
+
+-- Mudanças nas tabelas de origem avisam o resumo_seguranca.py --vigiar.
+-- Um aviso por comando (não por linha); avisos iguais na mesma transação
+-- são entregues uma vez só.
+CREATE OR REPLACE FUNCTION notificar_resumo_seguranca()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('resumo_seguranca', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_resumo_seguranca_users
+    AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_resumo_seguranca();
+CREATE TRIGGER trigger_resumo_seguranca_login_history
+    AFTER INSERT OR UPDATE OR DELETE ON login_history
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_resumo_seguranca();
+CREATE TRIGGER trigger_resumo_seguranca_user_roles
+    AFTER INSERT OR UPDATE OR DELETE ON user_roles
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_resumo_seguranca();
+CREATE TRIGGER trigger_resumo_seguranca_user_consents
+    AFTER INSERT OR UPDATE OR DELETE ON user_consents
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_resumo_seguranca();
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_admin') THEN
+        GRANT ALL ON user_security_summary, visoes_atualizacoes TO app_admin;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'audit_viewer') THEN
+        GRANT SELECT ON user_security_summary, visoes_atualizacoes TO audit_viewer;
+    END IF;
+END $$;
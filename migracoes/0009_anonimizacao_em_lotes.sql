@@ -0,0 +1,98 @@
+-- =====================================================
+-- 0009. ANONIMIZAÇÃO LGPD EM LOTES
+-- =====================================================
+-- anonimize_user() tratava um usuário por chamada. Para pedidos de
+-- exclusão em massa e varreduras de retenção, anonimizar_usuarios()
+-- recebe um lote e faz um UPDATE por tabela para o lote inteiro. O job
+-- (anonimizacao_lgpd.py) percorre a fila de um pedido em lotes, cada um
+-- na sua transação, marcando os usuários concluídos: interrompido, ele
+-- retoma do primeiro usuário não marcado.
+
+-- Anonimiza os usuários de `usuarios` e devolve as linhas alteradas em
+-- cada tabela. login_history.user_id e ip_address são NOT NULL: o
+-- histórico continua ligado à conta (já anonimizada) e o IP vira 0.0.0.0.
+-- A senha vira um valor aleatório que não é hash válido (sem bcrypt por
+-- linha: nenhuma senha corresponde a ele, e a conta fica bloqueada).
+CREATE OR REPLACE FUNCTION anonimizar_usuarios(usuarios UUID[])
+RETURNS TABLE (linhas_users BIGINT, linhas_login BIGINT, linhas_auditoria BIGINT) AS $$
+BEGIN
+    UPDATE users SET
+        email = 'deleted_' || user_id || '@anon.burocrata',
+        full_name = '[DELETED]',
+        document_number = NULL,
+        phone = NULL,
+        password_hash = 'DELETED_' || gen_random_uuid()::text,
+        account_status = 'blocked',
+        deleted_at = COALESCE(deleted_at, NOW()),
+        user_metadata = jsonb_build_object('deleted', true, 'deleted_at', NOW()::text)
+    WHERE user_id = ANY(usuarios);
+    GET DIAGNOSTICS linhas_users = ROW_COUNT;
+
+    UPDATE login_history SET
+        ip_address = '0.0.0.0',
+        user_agent = NULL,
+        device_fingerprint = NULL,
+        geo_location = NULL
+    WHERE user_id = ANY(usuarios);
+    GET DIAGNOSTICS linhas_login = ROW_COUNT;
+
+    UPDATE audit_logs SET
+        user_id = NULL,
+        ip_address = NULL,
+        user_agent = NULL
+    WHERE user_id = ANY(usuarios);
+    GET DIAGNOSTICS linhas_auditoria = ROW_COUNT;
+
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Mesma interface de antes, agora sobre a versão em lote
+CREATE OR REPLACE FUNCTION anonimize_user(user_uuid UUID)
+RETURNS VOID AS $$
+BEGIN
+    PERFORM anonimizar_usuarios(ARRAY[user_uuid]);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Um pedido de anonimização (exclusão em massa ou varredura de retenção)
+CREATE TABLE IF NOT EXISTS anonimizacao_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    motivo VARCHAR(100) NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (estado IN ('pendente', 'executando', 'concluido', 'falhou')),
+    total_usuarios INTEGER NOT NULL DEFAULT 0,
+    usuarios_processados INTEGER NOT NULL DEFAULT 0,
+    linhas_users BIGINT NOT NULL DEFAULT 0,
+    linhas_login BIGINT NOT NULL DEFAULT 0,
+    linhas_auditoria BIGINT NOT NULL DEFAULT 0,
+    -- Tempo efetivo de processamento (sem pausas nem interrupções)
+    segundos_processando DOUBLE PRECISION NOT NULL DEFAULT 0,
+    erro TEXT,
+    criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    atualizado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    concluido_em TIMESTAMP WITH TIME ZONE
+);
+
+-- Usuários de cada pedido; processado_em é o checkpoint
+CREATE TABLE IF NOT EXISTS anonimizacao_fila (
+    job_id BIGINT NOT NULL REFERENCES anonimizacao_jobs(job_id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    processado_em TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (job_id, user_id)
+);
+
+-- Próximo lote: só os pendentes, em ordem de user_id
+CREATE INDEX IF NOT EXISTS idx_anonimizacao_fila_pendentes
+    ON anonimizacao_fila (job_id, user_id) WHERE processado_em IS NULL;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'app_admin') THEN
+        GRANT ALL ON anonimizacao_jobs, anonimizacao_fila TO app_admin;
+        GRANT USAGE ON SEQUENCE anonimizacao_jobs_job_id_seq TO app_admin;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'audit_viewer') THEN
+        GRANT SELECT ON anonimizacao_jobs TO audit_viewer;
+    END IF;
+END $$;
@@ -0,0 +1,217 @@
+"""
+Confirmação de pagamento por push (LISTEN/NOTIFY), sem polling.
+
+Ao creditar um pagamento, o webhook_abacate.py emite
+`pg_notify('pagamento_confirmado', {usuario_id, bill_id, burocreditos})` na
+transação da fila, entregue só no COMMIT. Cada processo do backend mantém
+uma conexão dedicada (fora do pool: o LISTEN vale para a sessão) escutando o
+canal e acorda as requisições estacionadas em /aguardar-pagamento:
+
+    - o cliente espera até PAGAMENTO_ESPERA_MAXIMA segundos numa única
+      requisição, em vez de consultar /status-pagamento repetidamente;
+    - as esperas ficam num dicionário por usuário: uma notificação custa
+      uma busca, e não uma consulta ao banco por cliente;
+    - se a conexão cair, ela é refeita e todas as esperas são acordadas
+      para reconsultar o banco (uma notificação pode ter se perdido).
+
+A mesma conexão atende outros canais: `assinar(canal, funcao)` chama
+`funcao(payload)` a cada notificação do canal, e `funcao(None)` sempre que
+a escuta (re)começa, pois o que aconteceu antes dela não foi notificado
+(usado pelo cache de status para se invalidar).
+
+Cada espera ocupa uma thread do servidor: com gunicorn, use workers com
+threads (`--worker-class gthread --threads N`).
+"""
+
+import json
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pg8000.native
+
+from database import parametros_conexao
+
+CANAL = 'pagamento_confirmado'
+PAGAMENTO_ESPERA_MAXIMA = float(os.getenv('PAGAMENTO_ESPERA_MAXIMA', '25'))
+# Sem tráfego, a conexão de escuta é testada a cada INTERVALO_VERIFICACAO segundos
+INTERVALO_VERIFICACAO = 5
+RECONEXAO_MAXIMA = 30
+
+
+class Espera:
+    """Cliente estacionado aguardando a confirmação de um pagamento"""
+
+    __slots__ = ('usuario_id', 'bill_id', 'evento', 'confirmacao')
+
+    def __init__(self, usuario_id: str, bill_id: Optional[str]):
+        self.usuario_id = usuario_id
+        self.bill_id = bill_id
+        self.evento = threading.Event()
+        # Notificação recebida; None se acordada sem ela (reconexão)
+        self.confirmacao: Optional[Dict[str, Any]] = None
+
+    def aguardar(self, timeout: float) -> bool:
+        """True se foi acordada antes do timeout"""
+        return self.evento.wait(timeout)
+
+
+class OuvintePagamentos:
+    """Conexão LISTEN do processo e as esperas por usuário"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pid = os.getpid()
+        self._esperas: Dict[str, List[Espera]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # canal -> funções chamadas com o payload (None após reconexão)
+        self._assinaturas: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+        self._parar = threading.Event()
+        self._contadores = {
+            'esperas': 0,
+            'confirmadas': 0,
+            'notificacoes': 0,
+            'reconexoes': 0
+        }
+
+    # ----- esperas (threads das requisições) -----
+
+    def registrar(self, usuario_id: str, bill_id: Optional[str] = None) -> Espera:
+        """
+        Registra a espera antes de o chamador consultar o banco: uma
+        confirmação que chegue entre a consulta e o `aguardar` não se perde.
+        """
+        espera = Espera(str(usuario_id), bill_id)
+        with self._lock:
+            self._esperas.setdefault(espera.usuario_id, []).append(espera)
+            self._contadores['esperas'] += 1
+        return espera
+
+    def cancelar(self, espera: Espera) -> None:
+        with self._lock:
+            esperas = self._esperas.get(espera.usuario_id)
+            if esperas and espera in esperas:
+                esperas.remove(espera)
+                if not esperas:
+                    del self._esperas[espera.usuario_id]
+
+    def _entregar(self, confirmacao: Dict[str, Any]) -> None:
+        usuario_id = str(confirmacao.get('usuario_id'))
+        with self._lock:
+            self._contadores['notificacoes'] += 1
+            for espera in self._esperas.get(usuario_id, ()):
+                if espera.bill_id in (None, confirmacao.get('bill_id')):
+                    espera.confirmacao = confirmacao
+                    espera.evento.set()
+                    self._contadores['confirmadas'] += 1
+
+    def _acordar_todas(self) -> None:
+        with self._lock:
+            for esperas in self._esperas.values():
+                for espera in esperas:
+                    espera.evento.set()
+
+    # ----- outros canais -----
+
+    def assinar(self, canal: str, funcao: Callable[[Optional[str]], None]) -> None:
+        """Chama `funcao(payload)` a cada notificação de `canal`"""
+        with self._lock:
+            self._assinaturas.setdefault(canal, []).append(funcao)
+
+    def _repassar(self, canal: str, payload: Optional[str]) -> None:
+        with self._lock:
+            funcoes = list(self._assinaturas.get(canal, ()))
+        for funcao in funcoes:
+            try:
+                funcao(payload)
+            except Exception as e:
+                print(f"⚠️ Erro ao tratar notificação de {canal}: {e}")
+
+    # ----- escuta (thread de fundo) -----
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._executar, name='ouvinte-pagamentos', daemon=True)
+            self._thread.start()
+
+    def _executar(self) -> None:
+        falhas = 0
+        while not self._parar.is_set():
+            conn = None
+            try:
+                conn = pg8000.native.Connection(**parametros_conexao(self.url))
+                conn.run(f"LISTEN {CANAL}")
+                escutando = {CANAL}
+                if falhas:
+                    print("🔔 Escuta de pagamentos restabelecida")
+                    # Notificações emitidas durante a queda se perderam
+                    self._acordar_todas()
+                falhas = 0
+                while not self._parar.is_set():
+                    # Canais assinados (inclusive depois da conexão)
+                    with self._lock:
+                        novos = set(self._assinaturas) - escutando
+                    for canal in novos:
+                        conn.run(f"LISTEN {canal}")
+                        escutando.add(canal)
+                        self._repassar(canal, None)
+
+                    # O pg8000 não tem espera por notificações: aguarda o
+                    # socket ficar legível e uma consulta vazia as recebe
+                    select.select([conn._usock], [], [], INTERVALO_VERIFICACAO)
+                    conn.run("SELECT 1")
+                    while conn.notifications:
+                        _, canal, payload = conn.notifications.popleft()
+                        if canal != CANAL:
+                            self._repassar(canal, payload)
+                            continue
+                        try:
+                            self._entregar(json.loads(payload))
+                        except ValueError:
+                            print(f"⚠️ Notificação de pagamento inválida: {payload}")
+            except Exception as e:
+                falhas += 1
+                with self._lock:
+                    self._contadores['reconexoes'] += 1
+                print(f"⚠️ Escuta de pagamentos sem acesso ao banco: {e}")
+                self._parar.wait(min(2 ** falhas, RECONEXAO_MAXIMA))
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def encerrar(self) -> None:
+        self._parar.set()
+        self._acordar_todas()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas['aguardando'] = sum(len(esperas) for esperas in self._esperas.values())
+        estatisticas['escutando'] = bool(self._thread and self._thread.is_alive())
+        return estatisticas
+
+
+_ouvinte: Optional[OuvintePagamentos] = None
+_ouvinte_lock = threading.Lock()
+
+def get_ouvinte_pagamentos() -> Optional[OuvintePagamentos]:
+    """Ouvinte do processo com a escuta rodando; None sem DATABASE_URL"""
+    global _ouvinte
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return None
+    # A thread de escuta não sobrevive a um fork: cada worker sobe a sua
+    if _ouvinte is None or _ouvinte.pid != os.getpid():
+        with _ouvinte_lock:
+            if _ouvinte is None or _ouvinte.pid != os.getpid():
+                _ouvinte = OuvintePagamentos(url)
+                _ouvinte.iniciar()
+    return _ouvinte
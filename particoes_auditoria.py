@@ -0,0 +1,161 @@
+"""
+Partições mensais de audit_logs e login_history: criação e retenção.
+
+As duas tabelas são particionadas por mês (migração 0006). Este job, rodado
+diariamente pelo agendador como dono das tabelas:
+
+    - cria com antecedência as partições dos próximos
+      PARTICOES_MESES_A_FRENTE meses (`criar_particao_mensal` no banco;
+      eventos que tenham caído na partição padrão são movidos para ela).
+      O ATTACH não bloqueia a tabela principal, mas trava a partição padrão
+      enquanto a varre; criando os meses antes de chegarem, a padrão fica
+      vazia e as inserções não esperam;
+    - aplica a retenção: meses mais antigos que AUDITORIA_RETENCAO_MESES
+      (audit_logs) e LOGIN_HISTORICO_RETENCAO_MESES (login_history) são
+      opcionalmente exportados para `<diretório>/<partição>.csv.gz`, depois
+      desanexados e removidos, cada um na sua transação e com lock_timeout
+      curto (se a tabela estiver ocupada, fica para a próxima execução).
+
+Remover uma partição inteira custa o mesmo que remover um arquivo: não há
+DELETE linha a linha, inchaço nem VACUUM posterior.
+
+Uso:
+    python particoes_auditoria.py                               # cria e lista as partições
+    python particoes_auditoria.py --retencao [--arquivar DIR]   # remove meses antigos
+"""
+
+import argparse
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import conexao
+
+# Tabela particionada -> coluna de partição
+TABELAS = {
+    'audit_logs': 'event_time',
+    'login_history': 'login_time'
+}
+
+PARTICOES_MESES_A_FRENTE = int(os.getenv('PARTICOES_MESES_A_FRENTE', '3'))
+RETENCAO_MESES = {
+    'audit_logs': int(os.getenv('AUDITORIA_RETENCAO_MESES', '12')),
+    'login_history': int(os.getenv('LOGIN_HISTORICO_RETENCAO_MESES', '6'))
+}
+# Espera máxima pelo lock da tabela principal ao desanexar uma partição
+RETENCAO_LOCK_TIMEOUT = os.getenv('RETENCAO_LOCK_TIMEOUT', '5s')
+
+_PARTICAO_MENSAL = re.compile(r'^(\w+)_(\d{4})_(\d{2})$')
+
+
+def _somar_meses(mes: date, meses: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _mes_atual() -> date:
+    hoje = datetime.now(timezone.utc).date()
+    return date(hoje.year, hoje.month, 1)
+
+
+def criar_particoes(meses_a_frente: int = PARTICOES_MESES_A_FRENTE) -> List[str]:
+    """Garante as partições do mês atual e dos próximos meses; devolve as criadas"""
+    criadas = []
+    with conexao() as conn:
+        for tabela, coluna in TABELAS.items():
+            for meses in range(meses_a_frente + 1):
+                particao = conn.run("SELECT criar_particao_mensal(:tabela, :coluna, :mes)",
+                                    tabela=tabela, coluna=coluna,
+                                    mes=_somar_meses(_mes_atual(), meses))[0][0]
+                if particao:
+                    criadas.append(particao)
+    return criadas
+
+
+def listar_particoes(tabela: str) -> List[Tuple[str, Optional[date], int, int]]:
+    """(partição, mês, linhas estimadas, bytes) de `tabela`; mês None para a padrão"""
+    with conexao() as conn:
+        linhas = conn.run("""
+            SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT, pg_total_relation_size(c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:tabela)
+            ORDER BY c.relname
+        """, tabela=tabela)
+    particoes = []
+    for nome, estimativa, tamanho in linhas:
+        encontrado = _PARTICAO_MENSAL.match(nome)
+        mes = date(int(encontrado.group(2)), int(encontrado.group(3)), 1) if encontrado else None
+        particoes.append((nome, mes, estimativa, tamanho))
+    return particoes
+
+
+def arquivar_particao(particao: str, diretorio: str) -> str:
+    """Exporta a partição para `<diretorio>/<particao>.csv.gz` (CSV com cabeçalho)"""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{particao}.csv.gz")
+    temporario = caminho + '.parcial'
+    with conexao() as conn, gzip.open(temporario, 'wt', encoding='utf-8') as arquivo:
+        conn.run(f'COPY "{particao}" TO STDOUT WITH (FORMAT csv, HEADER)', stream=arquivo)
+    # Só aparece com o nome final quando completo
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def aplicar_retencao(retencao: Optional[Dict[str, int]] = None,
+                     arquivar_em: Optional[str] = None) -> List[str]:
+    """
+    Desanexa e remove as partições mensais além da retenção (exportando-as
+    antes se `arquivar_em`). Devolve as partições removidas.
+    """
+    retencao = dict(RETENCAO_MESES, **(retencao or {}))
+    removidas = []
+    for tabela, coluna in TABELAS.items():
+        limite = _somar_meses(_mes_atual(), -retencao[tabela])
+        for particao, mes, _, _ in listar_particoes(tabela):
+            if mes is None or mes >= limite:
+                continue
+            if arquivar_em:
+                print(f"📦 {particao} exportada para {arquivar_particao(particao, arquivar_em)}")
+            with conexao() as conn:
+                try:
+                    conn.run("BEGIN")
+                    conn.run(f"SET LOCAL lock_timeout = '{RETENCAO_LOCK_TIMEOUT}'")
+                    conn.run(f'ALTER TABLE {tabela} DETACH PARTITION "{particao}"')
+                    conn.run(f'DROP TABLE "{particao}"')
+                    conn.run("COMMIT")
+                    removidas.append(particao)
+                except Exception as e:
+                    conn.run("ROLLBACK")
+                    print(f"⚠️ {particao} não removida (fica para a próxima execução): {e}")
+
+        # Linhas antigas que tenham caído na partição padrão
+        with conexao() as conn:
+            conn.run(f"DELETE FROM {tabela}_padrao WHERE {coluna} < :limite",
+                     limite=datetime(limite.year, limite.month, 1, tzinfo=timezone.utc))
+    return removidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--meses-a-frente', type=int, default=PARTICOES_MESES_A_FRENTE)
+    parser.add_argument('--retencao', action='store_true', help='remove as partições além da retenção')
+    parser.add_argument('--arquivar', metavar='DIR', help='exporta as partições antes de removê-las')
+    args = parser.parse_args()
+
+    for particao in criar_particoes(args.meses_a_frente):
+        print(f"🗓️ Partição {particao} criada")
+    if args.retencao:
+        removidas = aplicar_retencao(arquivar_em=args.arquivar)
+        print(f"🧹 {len(removidas)} partições removidas pela retenção")
+
+    for tabela in TABELAS:
+        print(f"\n{tabela} (retenção: {RETENCAO_MESES[tabela]} meses)")
+        for particao, _, estimativa, tamanho in listar_particoes(tabela):
+            print(f"   {particao:<28} {estimativa:>12} linhas {tamanho / 1024 / 1024:>10.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Atualização da visão materializada user_security_summary.
+
+A view agregava users, login_history, papéis e consentimentos a cada
+leitura, com custo proporcional à base de usuários e ao histórico de
+logins. Desde a migração 0008 ela é materializada (índice único em
+user_id): os painéis leem linhas prontas, e este job a recalcula com
+`REFRESH MATERIALIZED VIEW CONCURRENTLY`, que não bloqueia as leituras
+enquanto roda. Cada atualização fica registrada em `visoes_atualizacoes`
+(horário, duração e linhas), para o painel mostrar a idade dos dados.
+
+Dois modos:
+
+    - uma atualização e sai (agendador, ex.: a cada 15 minutos);
+    - `--vigiar`: fica escutando o canal `resumo_seguranca`, notificado
+      por triggers em users, login_history, user_roles e user_consents, e
+      atualiza quando houve mudança, no máximo uma vez a cada
+      RESUMO_INTERVALO_MINIMO segundos (logins chegam o tempo todo) e pelo
+      menos a cada RESUMO_INTERVALO_MAXIMO segundos.
+
+Duas execuções simultâneas não se atropelam: um advisory lock faz a
+segunda desistir em vez de esperar.
+
+Uso:
+    python resumo_seguranca.py             # atualiza uma vez
+    python resumo_seguranca.py --vigiar    # atualiza conforme as mudanças
+    python resumo_seguranca.py --status    # última atualização
+"""
+
+import argparse
+import os
+import select
+import time
+from typing import Any, Dict, Optional
+
+import pg8000.native
+
+from database import conexao, parametros_conexao
+
+VISAO = 'user_security_summary'
+CANAL = 'resumo_seguranca'
+RESUMO_INTERVALO_MINIMO = float(os.getenv('RESUMO_INTERVALO_MINIMO', '60'))
+RESUMO_INTERVALO_MAXIMO = float(os.getenv('RESUMO_INTERVALO_MAXIMO', '900'))
+# Chave do pg_try_advisory_lock que serializa as atualizações
+TRAVA_ATUALIZACAO = 824001
+RECONEXAO_MAXIMA = 60
+
+
+def atualizar_resumo_seguranca() -> Optional[Dict[str, Any]]:
+    """
+    Recalcula a visão sem bloquear leituras e registra a atualização.
+    Devolve None se outra atualização já estiver em andamento.
+    """
+    with conexao() as conn:
+        if not conn.run("SELECT pg_try_advisory_lock(:chave)", chave=TRAVA_ATUALIZACAO)[0][0]:
+            return None
+        try:
+            inicio = time.perf_counter()
+            conn.run(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {VISAO}")
+            duracao_ms = int((time.perf_counter() - inicio) * 1000)
+            atualizada_em, linhas = conn.run(f"""
+                INSERT INTO visoes_atualizacoes (visao, atualizada_em, duracao_ms, linhas)
+                SELECT :visao, NOW(), :duracao_ms, COUNT(*) FROM {VISAO}
+                ON CONFLICT (visao) DO UPDATE SET
+                    atualizada_em = EXCLUDED.atualizada_em,
+                    duracao_ms = EXCLUDED.duracao_ms,
+                    linhas = EXCLUDED.linhas
+                RETURNING atualizada_em, linhas
+            """, visao=VISAO, duracao_ms=duracao_ms)[0]
+        finally:
+            conn.run("SELECT pg_advisory_unlock(:chave)", chave=TRAVA_ATUALIZACAO)
+    return {'atualizada_em': atualizada_em, 'duracao_ms': duracao_ms, 'linhas': linhas}
+
+
+def ultima_atualizacao() -> Optional[Dict[str, Any]]:
+    """Horário, duração e linhas da última atualização (None se nunca atualizada)"""
+    with conexao() as conn:
+        linhas = conn.run("""
+            SELECT atualizada_em, duracao_ms, linhas, EXTRACT(EPOCH FROM NOW() - atualizada_em)
+            FROM visoes_atualizacoes WHERE visao = :visao
+        """, visao=VISAO)
+    if not linhas:
+        return None
+    atualizada_em, duracao_ms, total, idade = linhas[0]
+    return {'atualizada_em': atualizada_em, 'duracao_ms': duracao_ms,
+            'linhas': total, 'idade_segundos': int(idade)}
+
+
+def _atualizar_e_informar(motivo: str) -> None:
+    resultado = atualizar_resumo_seguranca()
+    if resultado is None:
+        print("⏳ Atualização do resumo de segurança já em andamento em outro processo")
+    else:
+        print(f"🔄 {VISAO} atualizada ({motivo}): {resultado['linhas']} usuários "
+              f"em {resultado['duracao_ms']} ms")
+
+
+def vigiar(intervalo_minimo: float = RESUMO_INTERVALO_MINIMO,
+           intervalo_maximo: float = RESUMO_INTERVALO_MAXIMO) -> None:
+    """Atualiza a visão conforme as notificações de mudança, até ser interrompido"""
+    url = os.getenv('DATABASE_URL')
+    falhas = 0
+    while True:
+        conn = None
+        try:
+            conn = pg8000.native.Connection(**parametros_conexao(url))
+            conn.run(f"LISTEN {CANAL}")
+            print(f"👀 Escutando mudanças em '{CANAL}' (mínimo {intervalo_minimo:.0f} s, "
+                  f"máximo {intervalo_maximo:.0f} s entre atualizações)")
+            # O que mudou antes da escuta não foi notificado
+            _atualizar_e_informar('início da escuta')
+            falhas = 0
+            ultima = time.monotonic()
+            pendente = False
+            while True:
+                agora = time.monotonic()
+                if pendente and agora - ultima >= intervalo_minimo:
+                    _atualizar_e_informar('mudanças')
+                    ultima, pendente = time.monotonic(), False
+                elif agora - ultima >= intervalo_maximo:
+                    _atualizar_e_informar('agenda')
+                    ultima, pendente = time.monotonic(), False
+
+                proxima = ultima + (intervalo_minimo if pendente else intervalo_maximo)
+                # Mesmo padrão do ouvinte de pagamentos: espera o socket e
+                # uma consulta vazia recebe as notificações
+                select.select([conn._usock], [], [], max(0.0, proxima - time.monotonic()))
+                conn.run("SELECT 1")
+                while conn.notifications:
+                    conn.notifications.popleft()
+                    pendente = True
+        except KeyboardInterrupt:
+            return
+        except Exception as e:
+            falhas += 1
+            print(f"⚠️ Vigia do resumo de segurança sem acesso ao banco: {e}")
+            time.sleep(min(2 ** falhas, RECONEXAO_MAXIMA))
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--vigiar', action='store_true', help='atualiza conforme as mudanças nas tabelas')
+    parser.add_argument('--status', action='store_true', help='mostra a última atualização')
+    parser.add_argument('--intervalo-minimo', type=float, default=RESUMO_INTERVALO_MINIMO)
+    parser.add_argument('--intervalo-maximo', type=float, default=RESUMO_INTERVALO_MAXIMO)
+    args = parser.parse_args()
+
+    if args.status:
+        status = ultima_atualizacao()
+        if status is None:
+            print(f"❔ {VISAO} nunca foi atualizada")
+        else:
+            print(f"🕒 {VISAO}: atualizada em {status['atualizada_em']} "
+                  f"(há {status['idade_segundos']} s), {status['linhas']} usuários, "
+                  f"{status['duracao_ms']} ms")
+    elif args.vigiar:
+        vigiar(args.intervalo_minimo, args.intervalo_maximo)
+    else:
+        _atualizar_e_informar('manual')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Servidor local que imita a API de cobranças do AbacatePay.
+
+Responde POST /v1/billing/create como a API real e permite injetar latência
+e erros, para exercitar timeouts, novas tentativas e o disjuntor do
+AbacatePayClient sem depender do provedor:
+
+    - `--latencia`: segundos de espera antes de cada resposta;
+    - `--taxa-erro` / `--status-erro`: fração das respostas que falham e com
+      qual status;
+    - POST /stub/config muda essas opções com o servidor rodando (inclusive
+      `falhas_seguidas`: as próximas N respostas falham); GET /stub/config
+      mostra as opções e quantas requisições e conexões TCP chegaram.
+
+Também faz o papel do AbacatePay na confirmação: envia ao webhook_abacate.py
+o evento `billing.paid` de uma cobrança criada aqui, assinado (X-Signature,
+HMAC-SHA256 do corpo com ABACATE_WEBHOOK_SECRET) como `validar_assinatura`
+espera:
+
+    - POST /stub/pagar {"bill_id": ...} envia na hora e devolve o status e a
+      latência da resposta do webhook;
+    - `--webhook-automatico` envia sozinho `--atraso-webhook` segundos depois
+      de cada cobrança criada.
+
+Uso:
+    python stub_abacatepay.py [--porta 5002] [--latencia 0.2] [--taxa-erro 0.1]
+    ABACATE_API_URL=http://127.0.0.1:5002/v1 python backend.py
+
+    python stub_abacatepay.py --verificar   # cenários de keep-alive, timeout,
+                                            # retentativa e disjuntor
+"""
+
+import argparse
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from abacatepay import AbacatePayClient, Disjuntor
+
+# Mesmo segredo padrão do webhook_abacate.py
+WEBHOOK_SECRET = os.getenv('ABACATE_WEBHOOK_SECRET', 'burocrata_webhook_secret_2026')
+
+_lock = threading.Lock()
+_config = {
+    'latencia': 0.0,
+    'taxa_erro': 0.0,
+    'status_erro': 503,
+    'falhas_seguidas': 0,
+    'webhook_url': os.getenv('STUB_WEBHOOK_URL', 'http://127.0.0.1:5001/webhook/abacate'),
+    'webhook_automatico': False,
+    'atraso_webhook': 0.5
+}
+_contadores = {'requisicoes': 0, 'cobrancas': 0, 'webhooks_enviados': 0, 'webhooks_falhos': 0}
+_conexoes = set()
+_cobrancas = {}
+_sessao_webhook = requests.Session()
+
+
+def assinar(corpo: bytes, segredo: str = WEBHOOK_SECRET) -> str:
+    """Assinatura X-Signature do corpo, no formato de `validar_assinatura`"""
+    return hmac.new(segredo.encode('utf-8'), corpo, hashlib.sha256).hexdigest()
+
+
+def evento_pago(bill_id: str, cobranca: dict) -> dict:
+    """Evento `billing.paid` de uma cobrança, como o AbacatePay envia"""
+    return {
+        # Id do evento: o mesmo em cada reentrega da mesma cobrança
+        "id": f"log_{bill_id}",
+        "event": "billing.paid",
+        "data": {
+            "id": bill_id,
+            "status": "PAID",
+            "amount": cobranca.get('amount', 0),
+            "customer": cobranca.get('customer', {}),
+            "metadata": cobranca.get('metadata', {})
+        },
+        "devMode": True
+    }
+
+
+def enviar_webhook(bill_id: str):
+    """Envia o `billing.paid` assinado; devolve (status HTTP, latência em ms)"""
+    with _lock:
+        cobranca = _cobrancas.get(bill_id)
+        url = _config['webhook_url']
+    if cobranca is None:
+        return 404, 0.0
+
+    corpo = json.dumps(evento_pago(bill_id, cobranca)).encode('utf-8')
+    inicio = time.perf_counter()
+    try:
+        resposta = _sessao_webhook.post(url, data=corpo, timeout=10, headers={
+            'Content-Type': 'application/json',
+            'X-Signature': assinar(corpo)
+        })
+        status = resposta.status_code
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Webhook de {bill_id} não entregue: {e}")
+        status = 0
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+    with _lock:
+        _contadores['webhooks_enviados' if status == 200 else 'webhooks_falhos'] += 1
+    return status, latencia_ms
+
+
+def _criar_cobranca(dados, host):
+    """Resposta do /billing/create: (status, corpo)"""
+    with _lock:
+        _contadores['requisicoes'] += 1
+        latencia = _config['latencia']
+        falhar = _config['falhas_seguidas'] > 0 or random.random() < _config['taxa_erro']
+        if _config['falhas_seguidas'] > 0:
+            _config['falhas_seguidas'] -= 1
+        status_erro = _config['status_erro']
+        webhook_automatico = _config['webhook_automatico']
+        atraso_webhook = _config['atraso_webhook']
+
+    if latencia:
+        time.sleep(latencia)
+    if falhar:
+        return status_erro, {"data": None, "error": "stub: falha injetada"}
+
+    bill_id = f"bill_stub_{uuid.uuid4().hex[:20]}"
+    cobranca = {
+        "amount": sum(p.get('price', 0) * p.get('quantity', 1) for p in dados.get('products', [])),
+        "customer": dados.get('customer', {}),
+        "metadata": dados.get('metadata', {})
+    }
+    with _lock:
+        _contadores['cobrancas'] += 1
+        _cobrancas[bill_id] = cobranca
+    if webhook_automatico:
+        temporizador = threading.Timer(atraso_webhook, enviar_webhook, (bill_id,))
+        temporizador.daemon = True
+        temporizador.start()
+
+    return 200, {
+        "data": {
+            "id": bill_id,
+            "url": f"http://{host}/pay/{bill_id}",
+            "status": "PENDING",
+            "amount": cobranca['amount'],
+            "metadata": cobranca['metadata'],
+            "devMode": True
+        },
+        "error": None
+    }
+
+
+def _pagar(dados):
+    """POST /stub/pagar: confirma a cobrança enviando o webhook"""
+    bill_id = dados.get('bill_id')
+    status, latencia_ms = enviar_webhook(bill_id)
+    if status == 404 and bill_id not in _cobrancas:
+        return 404, {"data": None, "error": f"cobrança {bill_id} não existe no stub"}
+    return 200, {"bill_id": bill_id, "status_webhook": status, "latencia_ms": round(latencia_ms, 2)}
+
+
+def _configurar_stub(dados):
+    with _lock:
+        for chave, valor in dados.items():
+            if chave in _config:
+                _config[chave] = type(_config[chave])(valor)
+        return 200, {**_config, **_contadores, 'conexoes_tcp': len(_conexoes)}
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    # HTTP/1.1 com Content-Length: a conexão fica aberta para a próxima
+    # requisição (o servidor de desenvolvimento do Flask sempre a fecha)
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalhos e corpo saem em escritas separadas; sem isto o Nagle somado
+    # ao ACK atrasado põe ~40 ms em cada resposta
+    disable_nagle_algorithm = True
+
+    def _responder(self, status, corpo):
+        conteudo = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.end_headers()
+        try:
+            self.wfile.write(conteudo)
+        except (BrokenPipeError, ConnectionResetError):
+            # O cliente desistiu antes (timeout de leitura simulado)
+            pass
+
+    def do_POST(self):
+        with _lock:
+            _conexoes.add(self.client_address)
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        try:
+            dados = json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError:
+            return self._responder(400, {"data": None, "error": "JSON inválido"})
+
+        if self.path == '/v1/billing/create':
+            self._responder(*_criar_cobranca(dados, self.headers.get('Host', '')))
+        elif self.path == '/stub/pagar':
+            self._responder(*_pagar(dados))
+        elif self.path == '/stub/config':
+            self._responder(*_configurar_stub(dados))
+        else:
+            self._responder(404, {"data": None, "error": "rota inexistente"})
+
+    def do_GET(self):
+        if self.path == '/stub/config':
+            self._responder(*_configurar_stub({}))
+        else:
+            self._responder(404, {"data": None, "error": "rota inexistente"})
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_servidor(porta: int = 0):
+    """Sobe o stub numa thread; devolve o servidor (server_port tem a porta)"""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), _Manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# ===== VERIFICAÇÃO DO CLIENTE =====
+
+def _configurar(**opcoes):
+    with _lock:
+        _config.update(opcoes)
+
+
+def _requisicoes():
+    with _lock:
+        return _contadores['requisicoes']
+
+
+def verificar():
+    """Roda o AbacatePayClient contra o stub e confere cada comportamento"""
+    servidor = iniciar_servidor()
+    base_url = f"http://127.0.0.1:{servidor.server_port}/v1"
+    cliente = AbacatePayClient('chave_teste', webhook_id='webh_teste', base_url=base_url,
+                               timeout_conexao=0.5, timeout_leitura=0.3, tentativas=3,
+                               disjuntor=Disjuntor(limite_falhas=3, espera=0.5))
+
+    def cobrar():
+        # O cliente imprime payload e resposta de cada cobrança
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            sucesso, _, _ = cliente.criar_cobranca(
+                'ana@exemplo.com', 'Ana', '00000000000', 'avulso', 9.90, 10, 'usuario_teste')
+            return sucesso, time.perf_counter() - inicio
+
+    def conferir(condicao, descricao):
+        if not condicao:
+            servidor.shutdown()
+            raise SystemExit(f"❌ {descricao}")
+        print(f"✅ {descricao}")
+
+    # 1. Keep-alive: várias cobranças numa só conexão TCP
+    resultados = [cobrar()[0] for _ in range(20)]
+    conferir(all(resultados) and len(_conexoes) == 1,
+             f"20 cobranças em {len(_conexoes)} conexão(ões) TCP")
+
+    # 2. Timeout de leitura: falha no prazo e não repete (a cobrança pode existir)
+    antes = _requisicoes()
+    _configurar(latencia=1.0)
+    sucesso, duracao = cobrar()
+    _configurar(latencia=0.0)
+    conferir(not sucesso and duracao < 0.6 and _requisicoes() - antes == 1,
+             f"timeout de leitura em {duracao * 1000:.0f} ms, sem nova tentativa")
+    # A próxima chamada bem-sucedida zera as falhas contadas pelo disjuntor
+    conferir(cobrar()[0], "cobrança seguinte ao timeout atendida")
+
+    # 3. 503 transitório: repetido com backoff até dar certo
+    antes = _requisicoes()
+    _configurar(falhas_seguidas=2, status_erro=503)
+    sucesso, duracao = cobrar()
+    conferir(sucesso and _requisicoes() - antes == 3,
+             f"503 x2 seguido de sucesso em {_requisicoes() - antes} requisições ({duracao * 1000:.0f} ms)")
+
+    # 4. Disjuntor: abre após 3 falhas seguidas e falha na hora
+    _configurar(falhas_seguidas=1000, status_erro=500)
+    for _ in range(3):
+        cobrar()
+    antes = _requisicoes()
+    sucesso, duracao = cobrar()
+    conferir(not sucesso and cliente.disjuntor.estado == 'aberto' and _requisicoes() == antes,
+             f"disjuntor aberto: chamada recusada em {duracao * 1000:.2f} ms sem tocar a API")
+
+    # 5. Meio-aberto: após a espera, uma chamada de teste fecha o disjuntor
+    _configurar(falhas_seguidas=0)
+    time.sleep(0.55)
+    sucesso, _ = cobrar()
+    conferir(sucesso and cliente.disjuntor.estado == 'fechado', "disjuntor fechado após chamada de teste")
+
+    # 6. Conexão recusada: repetida (nada chegou à API) e depois desiste
+    servidor.shutdown()
+    servidor.server_close()
+    recusado = AbacatePayClient('chave_teste', base_url=base_url, timeout_conexao=0.5,
+                                timeout_leitura=0.3, tentativas=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sucesso, _, _ = recusado.criar_cobranca('ana@exemplo.com', 'Ana', '0', 'avulso', 9.90, 10, 'u')
+    estatisticas = recusado.estatisticas()
+    conferir(not sucesso and estatisticas['erros_conexao'] == 3 and estatisticas['retentativas'] == 2,
+             "conexão recusada: 3 tentativas e falha")
+
+    print(f"\n📊 {cliente.estatisticas()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--porta', type=int, default=5002)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos antes de cada resposta')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='fração de respostas com erro')
+    parser.add_argument('--status-erro', type=int, default=503)
+    parser.add_argument('--webhook-url', default=_config['webhook_url'], help='destino dos eventos billing.paid')
+    parser.add_argument('--webhook-automatico', action='store_true', help='paga sozinho cada cobrança criada')
+    parser.add_argument('--atraso-webhook', type=float, default=0.5, help='segundos até o webhook automático')
+    parser.add_argument('--verificar', action='store_true', help='roda os cenários do cliente e sai')
+    args = parser.parse_args()
+
+    if args.verificar:
+        verificar()
+        return
+
+    _configurar(latencia=args.latencia, taxa_erro=args.taxa_erro, status_erro=args.status_erro,
+                webhook_url=args.webhook_url, webhook_automatico=args.webhook_automatico,
+                atraso_webhook=args.atraso_webhook)
+    print(f"🥑 Stub AbacatePay em http://127.0.0.1:{args.porta}/v1 (webhooks para {args.webhook_url})")
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.porta), _Manipulador)
+    servidor.daemon_threads = True
+    servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    main()